@@ -0,0 +1,97 @@
+'''
+Compares write time and file size of the submission formats supported by
+write_submission() on generated prediction frames.
+
+    python benchmarks/bench_write_submission.py --rows 1000 100000 1000000
+'''
+import argparse
+import os
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+
+from submitRAADC2.submit import SUBMISSION_FORMATS, write_submission
+from submitRAADC2.validation import patient_ids
+
+
+def generate_predictions(rows, seed=2018):
+    '''
+    Generates a prediction frame by repeating the test-set patient IDs
+
+    Args:
+        rows: Number of rows
+        seed: Random seed for the subgroup assignment
+
+    Returns:
+        DataFrame
+    '''
+    ids = np.asarray(patient_ids())
+    rng = np.random.RandomState(seed)
+    return pd.DataFrame({
+        'PatientID': np.resize(ids, rows),
+        'RespondingSubgroup': rng.choice(['Chemo', 'Tecentriq'], rows)
+    })
+
+
+def available_formats():
+    try:
+        import pyarrow  # noqa: F401
+    except ImportError:
+        return [fmt for fmt in SUBMISSION_FORMATS
+                if fmt not in ('parquet', 'feather')]
+    return list(SUBMISSION_FORMATS)
+
+
+def bench(rows, repeat=3):
+    '''
+    Times write_submission for each available format
+
+    Args:
+        rows: Number of rows in the generated frame
+        repeat: Writes per format, the fastest is kept
+
+    Returns:
+        list: dicts with rows, format, seconds, bytes and the time and
+              size relative to plain CSV
+    '''
+    predictiondf = generate_predictions(rows)
+    results = []
+    tmpdir = tempfile.mkdtemp()
+    for file_format in available_formats():
+        path = os.path.join(tmpdir, 'prediction.' + file_format)
+        timings = []
+        for _ in range(repeat):
+            start = time.time()
+            write_submission(predictiondf, path, file_format=file_format)
+            timings.append(time.time() - start)
+        results.append({
+            'rows': rows,
+            'format': file_format,
+            'seconds': min(timings),
+            'bytes': os.path.getsize(path)
+        })
+        os.remove(path)
+    os.rmdir(tmpdir)
+    csv_result = results[0]
+    for result in results:
+        result['time_vs_csv'] = result['seconds'] / csv_result['seconds']
+        result['size_vs_csv'] = float(result['bytes']) / csv_result['bytes']
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--rows', type=int, nargs='+',
+                        default=[1000, 100000, 1000000])
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+    results = []
+    for rows in args.rows:
+        results.extend(bench(rows, repeat=args.repeat))
+    print(pd.DataFrame(results).to_string(index=False))
+
+
+if __name__ == '__main__':
+    main()
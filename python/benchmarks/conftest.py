@@ -0,0 +1,145 @@
+'''
+Benchmarks for the stages of submit_raadc2, run with pytest-benchmark
+against generated prediction frames and in-process stand-ins for
+Synapse and the predictions gateway:
+
+    pytest benchmarks
+
+Saved runs go to benchmarks/results/<machine>/, which is kept out of git
+since timings only compare on the machine that made them.  To track
+regressions (e.g. on a dedicated CI runner), pass --track-regressions:
+the run is saved and compared with the last run saved on the same
+machine, failing when a benchmark's mean is more than
+REGRESSION_THRESHOLD slower.  Command line options such as
+--benchmark-storage, --benchmark-compare or --benchmark-compare-fail
+take precedence, and `pytest-benchmark compare` lists the saved runs.
+
+Frames go from 1k rows up to RAADC2_BENCH_MAX_ROWS (default 1M); set it
+to 10000000 to include the 10M-row frames.  Runs with different row
+counts aren't comparable, so they're best kept in separate storage.
+'''
+import glob
+import os
+
+import pytest
+
+from bench_write_submission import generate_predictions
+from submitRAADC2 import loadtest
+
+pytest.importorskip('pytest_benchmark')
+
+ROW_COUNTS = [1000, 10000, 100000, 1000000, 10000000]
+MAX_ROWS = int(os.environ.get('RAADC2_BENCH_MAX_ROWS', 1000000))
+RESULTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                           'results')
+# Slowdown of a benchmark's mean against the last saved run that fails
+# a --track-regressions run.  Means of unchanged code vary by up to ~20%
+# between runs on a shared machine.
+REGRESSION_THRESHOLD = 'mean:30%'
+# pytest-benchmark's default storage, replaced by RESULTS_DIR
+_DEFAULT_STORAGE = 'file://./.benchmarks'
+
+
+def pytest_addoption(parser):
+    parser.addoption(
+        '--track-regressions', action='store_true',
+        help="Save the benchmark run and fail on regressions of more than "
+             "{threshold} against the last saved run"
+             .format(threshold=REGRESSION_THRESHOLD)
+    )
+
+
+def pytest_configure(config):
+    '''
+    Keeps saved runs in RESULTS_DIR and, with --track-regressions, saves
+    the run and compares it with the previous one, unless the options
+    were given on the command line
+    '''
+    options = config.option
+    if getattr(options, 'benchmark_storage', None) == _DEFAULT_STORAGE:
+        options.benchmark_storage = 'file://' + RESULTS_DIR
+    if not options.track_regressions:
+        return
+    from pytest_benchmark import utils
+    if not (options.benchmark_save or options.benchmark_autosave):
+        options.benchmark_autosave = utils.get_tag()
+    # Comparing fails outright without an earlier run to compare with
+    previous = glob.glob(os.path.join(
+        options.benchmark_storage.replace('file://', '', 1),
+        utils.get_machine_id(), '*.json'
+    ))
+    if previous and not options.benchmark_compare:
+        options.benchmark_compare = True
+        if not options.benchmark_compare_fail:
+            options.benchmark_compare_fail = [
+                utils.parse_compare_fail(REGRESSION_THRESHOLD)
+            ]
+
+
+def pytest_generate_tests(metafunc):
+    if 'rows' in metafunc.fixturenames:
+        metafunc.parametrize(
+            'rows', [rows for rows in ROW_COUNTS if rows <= MAX_ROWS]
+        )
+
+
+@pytest.fixture(scope='session')
+def prediction_frames():
+    '''Generated prediction frames, shared across benchmarks by size'''
+    frames = {}
+
+    def get(rows):
+        if rows not in frames:
+            frames[rows] = generate_predictions(rows)
+        return frames[rows]
+    return get
+
+
+@pytest.fixture
+def predictiondf(prediction_frames, rows):
+    return prediction_frames(rows)
+
+
+@pytest.fixture(scope='session')
+def gateway_url():
+    with loadtest.StandInServer() as stand_in:
+        yield stand_in.url + '/v1/predictions'
+
+
+class SynapseStandIn(object):
+    '''Answers the submissionEligibility REST call from memory'''
+    def __init__(self, eligibility_data):
+        self.eligibility_data = eligibility_data
+
+    def restGET(self, uri):
+        return self.eligibility_data
+
+
+def generate_eligibility(members):
+    '''
+    Generates a submissionEligibility response
+
+    Args:
+        members: Number of team members
+
+    Returns:
+        dict: submissionEligibility response
+    '''
+    return {
+        'teamId': '123456',
+        'evaluationId': '9614112',
+        'teamEligibility': {'isEligible': True, 'isRegistered': True,
+                            'isQuotaFilled': False},
+        'membersEligibility': [
+            {'isEligible': True, 'isRegistered': True,
+             'isQuotaFilled': False, 'principalId': principalid,
+             'hasConflictingSubmission': False}
+            for principalid in range(members)
+        ],
+        'eligibilityStateHash': 32345
+    }
+
+
+@pytest.fixture
+def synapse_stand_in():
+    return SynapseStandIn
@@ -0,0 +1,95 @@
+'''
+Per-stage benchmarks of the submit_raadc2 pipeline
+'''
+import os
+import tempfile
+
+import pytest
+
+from conftest import generate_eligibility
+from submitRAADC2 import bridge, submit, validation
+
+
+@pytest.fixture
+def submission_file(predictiondf):
+    path = os.path.join(tempfile.mkdtemp(), 'prediction.csv')
+    submit.write_submission(predictiondf, path)
+    yield path
+    os.remove(path)
+    os.rmdir(os.path.dirname(path))
+
+
+def test_validate_predictions(benchmark, predictiondf):
+    benchmark.group = 'validate'
+    benchmark(validation.validate_predictions, predictiondf)
+
+
+def test_validate_prediction_file(benchmark, submission_file):
+    benchmark.group = 'validate'
+    benchmark(validation.validate_prediction_file, submission_file)
+
+
+def test_r_bridge(benchmark, predictiondf):
+    pandas2ri = pytest.importorskip('rpy2.robjects.pandas2ri')
+    benchmark.group = 'bridge'
+    pandas2ri.activate()
+    try:
+        benchmark(pandas2ri.py2ri, predictiondf)
+    finally:
+        pandas2ri.deactivate()
+
+
+@pytest.mark.parametrize('method', bridge.BRIDGE_METHODS)
+def test_r_bridge_to_r(benchmark, predictiondf, method):
+    pytest.importorskip('rpy2.robjects.pandas2ri')
+    if method == 'arrow' and not bridge.arrow_available():
+        pytest.skip('rpy2-arrow or the R arrow package is not installed')
+    benchmark.group = 'bridge'
+    benchmark(bridge.to_r, predictiondf, method=method)
+
+
+def test_r_bridge_as_factors(benchmark, predictiondf):
+    benchmark.group = 'bridge'
+    benchmark(bridge._as_factors, predictiondf)
+
+
+@pytest.mark.parametrize('file_format', ['csv', 'csv.gz'])
+def test_write_submission(benchmark, predictiondf, file_format, tmpdir):
+    benchmark.group = 'write'
+    path = str(tmpdir.join('prediction.' + file_format))
+    benchmark(submit.write_submission, predictiondf, path,
+              file_format=file_format)
+
+
+@pytest.mark.parametrize('stream, compression', [
+    (False, None), (True, None), (True, 'gzip')
+])
+def test_upload_predictions(benchmark, submission_file, gateway_url,
+                            stream, compression):
+    benchmark.group = 'upload'
+    benchmark(submit.upload_predictions, submission_file, 'syn1234',
+              stream=stream, compression=compression, url=gateway_url)
+
+
+@pytest.mark.parametrize('members', [10, 1000])
+def test_check_eligibility(benchmark, synapse_stand_in, members, capsys):
+    benchmark.group = 'eligibility'
+    syn = synapse_stand_in(generate_eligibility(members))
+    team_info = {'team_id': '123456', 'team_name': 'RAAD2 First',
+                 'folder_id': 'syn1234', 'advanced_compute': False}
+    result = benchmark(submit.check_eligibility, syn, team_info, members - 1)
+    assert result
+
+
+def test_incremental_revalidation(benchmark, predictiondf):
+    benchmark.group = 'validate'
+    predictiondf = predictiondf.copy()
+    validator = validation.IncrementalValidator()
+    validator.validate(predictiondf)
+
+    def edit_and_validate():
+        predictiondf.iloc[0, 1] = (
+            'Chemo' if predictiondf.iloc[0, 1] == 'Tecentriq' else 'Tecentriq'
+        )
+        validator.validate(predictiondf)
+    benchmark(edit_and_validate)
@@ -14,10 +14,18 @@ setup(name='submitRAADC2',
         ]
     },
       zip_safe=False,
+      python_requires='>=3.7',
       entry_points = {
-        'console_scripts': ['submitRAADC2 = submitRAADC2.submit:main']},
+        'console_scripts': [
+            'submitRAADC2 = submitRAADC2.submit:main',
+            'submitRAADC2-daemon = submitRAADC2.daemon:main',
+            'submitRAADC2-eligibility = submitRAADC2.eligibility:main',
+            'submitRAADC2-status = submitRAADC2.status:main']},
       install_requires=[
         'pandas>=0.20.0',
         'rpy2',
         'tzlocal',
-        'synapseclient'])
+        'synapseclient'],
+      extras_require={
+        'columnar': ['pyarrow'],
+        'r-arrow': ['pyarrow', 'rpy2-arrow']})
@@ -1 +1,13 @@
-from submitRAADC2.submit import submit_raadc2
\ No newline at end of file
+from submitRAADC2.submit import submit_raadc2
+from submitRAADC2.batch import submit_raadc2_batch
+
+
+def __getattr__(name):
+    # Imported on first use, so the command line doesn't load asyncio
+    if name == 'async_submit_raadc2':
+        from submitRAADC2.aio import async_submit_raadc2
+        return async_submit_raadc2
+    raise AttributeError(
+        "module {mod!r} has no attribute {name!r}"
+        .format(mod=__name__, name=name)
+    )
@@ -0,0 +1,313 @@
+'''
+Asyncio versions of the submission steps, for submitting from async
+services.  The blocking Synapse and gateway calls run in an executor so
+they don't hold up the event loop, and async_submit_raadc2 overlaps the
+team lookup and eligibility prefetch with validation and writing the
+submission file:
+
+    entity, submission = await async_submit_raadc2(predictiondf, syn=syn,
+                                                   confirm=False)
+
+Validation and the submission file always use the python engine; R is
+only started for the confirmation prompt when confirm is 'True'.
+'''
+import asyncio
+import functools
+import os
+import tempfile
+
+from submitRAADC2 import cache
+from submitRAADC2 import submit
+from submitRAADC2 import validation
+
+
+def _run_blocking(executor, func, *args, **kwargs):
+    '''
+    Runs a blocking call in an executor
+
+    Args:
+        executor: concurrent.futures.Executor, None for the loop's default
+        func: Blocking callable
+        *args, **kwargs: Arguments to func
+
+    Returns:
+        asyncio.Future with the result of func
+    '''
+    loop = asyncio.get_running_loop()
+    return loop.run_in_executor(
+        executor, functools.partial(func, *args, **kwargs)
+    )
+
+
+async def get_team_info(syn, ownerid, team_index=None, executor=None):
+    '''
+    Get team information.  The user's teams are resolved concurrently and
+    the scan stops at the first RAAD2 team found.
+
+    Args:
+        syn: Synapse object
+        ownerid: Synapse userid
+        team_index: cache.TeamIndex used for the folder lookup
+        executor: Executor for the blocking calls, None for the loop's
+            default
+
+    Returns:
+        dict: team id, team name, folder id, if advanced compute
+    '''
+    owner_teams = await _run_blocking(
+        executor, syn.restGET, '/user/{id}/team/id'.format(id=ownerid)
+    )
+    team_order = {
+        asyncio.ensure_future(_run_blocking(executor, syn.getTeam, teamid)):
+            order
+        for order, teamid in enumerate(owner_teams['teamIds'])
+    }
+    raad2_team = None
+    pending = set(team_order)
+    try:
+        while pending and raad2_team is None:
+            done, pending = await asyncio.wait(
+                pending, return_when=asyncio.FIRST_COMPLETED
+            )
+            # Keep the original team order when several finish together
+            for task in sorted(done, key=team_order.get):
+                team_object = task.result()
+                if submit._is_raad2_team(team_object['name']):
+                    raad2_team = team_object
+                    break
+    finally:
+        for task in pending:
+            task.cancel()
+
+    if raad2_team is None:
+        raise submit._no_raad2_team_error()
+    team_folder_id, advanced_compute = await _run_blocking(
+        executor, submit._lookup_team_info, syn, raad2_team['name'],
+        team_index=team_index
+    )
+    return {
+        'team_id': raad2_team['id'],
+        'team_name': raad2_team['name'],
+        'folder_id': team_folder_id,
+        'advanced_compute': advanced_compute
+    }
+
+
+async def check_eligibility(syn, team_info, ownerid, eligibility_cache=None,
+                            executor=None):
+    '''
+    Check eligibility of the team and user submitting for the team
+
+    Args:
+        syn: Synapse object
+        team_info: Response from get_team_info()
+        ownerid: Synapse user id
+        eligibility_cache: cache.EligibilityCache to serve the
+                           eligibility response from
+        executor: Executor for the blocking calls, None for the loop's
+            default
+
+    Returns:
+        bool: If user and team is eligible for submission
+    '''
+    return await _run_blocking(
+        executor, submit.check_eligibility, syn, team_info, ownerid,
+        eligibility_cache=eligibility_cache
+    )
+
+
+async def upload_predictions(submission_filepath, folder_id, stream=True,
+                             compression=None, compression_level=None,
+                             executor=None):
+    '''
+    Upload prediction file to the predictions gateway
+
+    Args:
+        submission_filepath: File path of submission
+        folder_id: Synapse id of Team submission folder
+        stream: If 'True', encode and send the file in chunks
+        compression: 'gzip' or 'zstd', see submit.upload_predictions()
+        compression_level: Compression level
+        executor: Executor for the blocking calls, None for the loop's
+            default
+
+    Returns:
+        Synapse File Entity
+    '''
+    return await _run_blocking(
+        executor, submit.upload_predictions, submission_filepath, folder_id,
+        stream=stream, compression=compression,
+        compression_level=compression_level
+    )
+
+
+def _discard(*tasks):
+    '''Cancels tasks that are no longer needed, retrieving any error'''
+    for task in tasks:
+        if task is None:
+            continue
+        if task.done() and not task.cancelled():
+            task.exception()
+        task.cancel()
+
+
+async def _prefetch(syn, eligibility_cache, executor):
+    '''
+    Resolves the owner and team and warms the eligibility cache
+
+    Returns:
+        tuple (str, dict): Owner id, response from get_team_info()
+    '''
+    ownerid = await _run_blocking(executor, submit._lookup_owner_id, syn)
+    team_info = await get_team_info(
+        syn, ownerid, team_index=cache.default_team_index(),
+        executor=executor
+    )
+    teamid = team_info['team_id']
+    await _run_blocking(
+        executor, eligibility_cache.get, teamid, submit.EVALUATION_ID,
+        lambda: submit._get_eligibility_data(syn, teamid)
+    )
+    return ownerid, team_info
+
+
+async def _confirmed(confirm, executor):
+    if callable(confirm):
+        confirmed = confirm()
+        if asyncio.iscoroutine(confirmed):
+            confirmed = await confirmed
+        return bool(confirmed)
+    if confirm:
+        selection = await _run_blocking(
+            executor, lambda: submit.r_package()._confirm_prompt()
+        )
+        return selection[0] not in [0, 2]
+    return True
+
+
+async def async_submit_raadc2(predictiondf, validate_only=False,
+                              dry_run=False, syn=None, confirm=True,
+                              file_format='csv', compression=None,
+                              executor=None):
+    '''
+    Submitting RAAD2 prediction files without blocking the event loop.
+    With a logged-in syn, the team lookup and eligibility check start
+    alongside validation; the submission file is written while they run.
+
+    Args:
+        predictiondf: Prediction dataframe
+        validate_only: If 'True', check data for any formatting errors
+            but don't submit to the challenge.
+        dry_run: If 'True', execute submission steps, but don't store
+            any data in Synapse.
+        syn: Synapse object, logs in with synapse_login() after
+            validation if not given
+        confirm: 'True' to ask with the R confirmation prompt, 'False'
+            to skip it, or a callable (or coroutine function) returning
+            whether to submit
+        file_format: Submission file format, see submit.write_submission();
+            formats other than submit.SCORED_FORMATS need dry_run
+        compression: Upload Content-Encoding, see submit.upload_predictions()
+        executor: Executor for the blocking calls, None for the loop's
+            default
+
+    Returns:
+        tuple (dict, dict): Synapse File Entity, Submission object, or
+        None with validate_only
+
+    Raises:
+        ValueError: If the predictions fail validation, or file_format
+            can't be submitted
+        SynapseError: If the team or user isn't eligible, or the
+            submission isn't confirmed
+    '''
+    if not validate_only:
+        submit.check_submission_format(file_format, dry_run=dry_run)
+    print("Running checks to validate date frame format...\n")
+    validating = asyncio.ensure_future(_run_blocking(
+        executor, validation.validate_predictions, predictiondf
+    ))
+    if validate_only:
+        await validating
+        print("All checks passed.")
+        return None
+
+    eligibility_cache = cache.default_eligibility_cache()
+    prefetch = None
+    if syn is not None:
+        prefetch = asyncio.ensure_future(
+            _prefetch(syn, eligibility_cache, executor)
+        )
+    # One directory per submission so concurrent submissions from the
+    # same process don't overwrite each other's file
+    submission_filepath = os.path.join(
+        tempfile.mkdtemp(dir=submit._get_submission_dir()),
+        'prediction.{ext}'.format(ext=file_format)
+    )
+    writing = asyncio.ensure_future(_run_blocking(
+        executor, submit.write_submission, predictiondf, submission_filepath,
+        file_format=file_format
+    ))
+    try:
+        await validating
+    except BaseException:
+        _discard(prefetch, writing)
+        raise
+    print("All checks passed.")
+
+    exceptions = submit._synapse_exceptions()
+    if prefetch is None:
+        syn = await _run_blocking(executor, submit.synapse_login)
+        prefetch = asyncio.ensure_future(
+            _prefetch(syn, eligibility_cache, executor)
+        )
+    try:
+        ownerid, team_info = await prefetch
+    except BaseException:
+        _discard(writing)
+        raise
+    print("\nChecking ability to submit...")
+    # Served from the cache warmed by the prefetch
+    is_eligible = await check_eligibility(
+        syn, team_info, ownerid, eligibility_cache=eligibility_cache,
+        executor=executor
+    )
+    if not is_eligible:
+        _discard(writing)
+        print("")
+        raise exceptions.SynapseError(
+            "\nExiting submission attempt.\n"
+            "Visit the RAAD2 Challenge page in Synapse "
+            "to track results in the leaderboard."
+        )
+    if not await _confirmed(confirm, executor):
+        _discard(writing)
+        print("")
+        raise exceptions.SynapseError(
+            "\nExiting submission attempt.\n"
+            "Run `async_submit_raadc2()` to try again when ready."
+        )
+
+    print("\nWriting data to local {fmt} file...".format(fmt=file_format))
+    submission_filepath = await writing
+    if dry_run:
+        prediction_ent = {
+            'id': '<pending; dry-run only>',
+            'versionNumber': 'TBD'
+        }
+        submission_object = {'id': '<pending; dry-run only>'}
+    else:
+        prediction_ent, submission_object = await _run_blocking(
+            executor, submit._store_submission, syn, team_info,
+            submission_filepath, eligibility_cache=eligibility_cache,
+            compression=compression
+        )
+
+    print("\nSuccessfully submitted file: '{filename}'"
+          .format(filename=submission_filepath))
+    print(" > stored as {entityid} [version: {version}]"
+          .format(entityid=prediction_ent['id'],
+                  version=prediction_ent['versionNumber']))
+    print(" > submission Id: {subid}"
+          .format(subid=submission_object['id']))
+    return prediction_ent, submission_object
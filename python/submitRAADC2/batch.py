@@ -0,0 +1,323 @@
+'''
+Batch submission of many RAAD2 prediction files.  Logs in, resolves the
+team and checks eligibility once, then validates every file and runs the
+uploads and submissions through a bounded thread pool.  Validating
+without submitting fans the files out across a process pool instead.
+'''
+import glob
+import importlib
+import os
+import shutil
+import tempfile
+from concurrent import futures
+
+from submitRAADC2 import cache
+from submitRAADC2 import submit
+from submitRAADC2 import tracing
+from submitRAADC2 import validation
+
+REPORT_COLUMNS = ['path', 'entity_id', 'version', 'submission_id', 'error']
+VALIDATION_REPORT_COLUMNS = ['path', 'status', 'error']
+# Files uploaded and submitted concurrently by default
+SUBMIT_WORKERS = 4
+
+
+def expand_paths(patterns):
+    '''
+    Expands glob patterns and directories into prediction file paths,
+    keeping the given order and dropping duplicates
+
+    Args:
+        patterns: File paths, directories (for the CSV files in them)
+            and/or glob patterns
+
+    Returns:
+        list: File paths
+
+    Raises:
+        ValueError: If a glob pattern or directory matches no files
+    '''
+    paths = []
+    for pattern in patterns:
+        if glob.has_magic(pattern):
+            matches = sorted(glob.glob(pattern))
+        elif os.path.isdir(pattern):
+            matches = sorted(glob.glob(os.path.join(pattern, '*.csv')))
+        else:
+            matches = [pattern]
+        if not matches:
+            raise ValueError(
+                "No prediction files matched {pattern}".format(pattern=pattern)
+            )
+        for path in matches:
+            if path not in paths:
+                paths.append(path)
+    return paths
+
+
+def _new_result(path):
+    result = dict.fromkeys(REPORT_COLUMNS)
+    result['path'] = path
+    return result
+
+
+def _read_and_validate(path):
+    '''
+    Reads and validates one prediction file
+
+    Args:
+        path: Prediction file path
+
+    Returns:
+        tuple (DataFrame, str): Prediction dataframe, or None and the
+        error message if the file can't be read or fails validation
+    '''
+    pd = importlib.import_module('pandas')
+    try:
+        with tracing.span('read_csv', path=path):
+            predictiondf = pd.read_csv(path)
+        with tracing.span('validate', path=path):
+            validation.validate_predictions(predictiondf)
+    except (IOError, OSError, ValueError) as e:
+        return None, str(e)
+    return predictiondf, None
+
+
+def _init_validation_worker(codes):
+    # Workers get the patient ID reference from the parent instead of
+    # each reading and encoding data/patient_ids.csv
+    validation._patient_id_index = validation.PatientIdIndex(codes)
+
+
+def _validate_file(path):
+    '''
+    Validates one prediction file in chunks
+
+    Args:
+        path: Prediction file path
+
+    Returns:
+        str: The first error message, or None if all checks pass
+    '''
+    try:
+        validation.validate_prediction_file(path)
+    except (IOError, OSError, ValueError) as e:
+        return str(e)
+    return None
+
+
+def validate_prediction_files(prediction_paths, max_workers=None):
+    '''
+    Validates many prediction files in parallel across processes
+
+    Args:
+        prediction_paths: Prediction file paths, directories and/or glob
+            patterns
+        max_workers: Worker processes, defaults to the number of CPUs
+
+    Returns:
+        list: One dict per file with path, status ('pass' or 'fail') and
+              the first error
+    '''
+    paths = expand_paths(prediction_paths)
+    if not paths:
+        return []
+    if max_workers is None:
+        max_workers = os.cpu_count() or 1
+    max_workers = min(max_workers, len(paths))
+    codes = validation.patient_id_index().codes
+    with futures.ProcessPoolExecutor(
+            max_workers=max_workers, initializer=_init_validation_worker,
+            initargs=(codes,)) as executor:
+        errors = list(executor.map(_validate_file, paths))
+    return [
+        {'path': path, 'status': 'pass' if error is None else 'fail',
+         'error': error}
+        for path, error in zip(paths, errors)
+    ]
+
+
+def format_validation_report(report):
+    '''
+    Formats a validation report as a table, with each error on one line
+
+    Args:
+        report: Response from validate_prediction_files()
+
+    Returns:
+        str: Report table
+    '''
+    pd = importlib.import_module('pandas')
+    reportdf = pd.DataFrame(report, columns=VALIDATION_REPORT_COLUMNS)
+    reportdf['error'] = [
+        ' '.join(result['error'].split()) if result['error'] else ''
+        for result in report
+    ]
+    return reportdf.to_string(index=False)
+
+
+def _submit_one(syn, team_info, predictiondf, result, submission_dir,
+                eligibility_cache, dry_run, file_format, compression, dedupe):
+    '''Writes, uploads and submits one validated prediction file'''
+    # One directory per file so files with the same name don't collide
+    filename = os.path.splitext(os.path.basename(result['path']))[0]
+    submission_filepath = os.path.join(
+        tempfile.mkdtemp(dir=submission_dir),
+        '{name}.{ext}'.format(
+            name=filename, ext=file_format
+        )
+    )
+    try:
+        with tracing.span('write_submission', path=result['path']):
+            submit.write_submission(predictiondf, submission_filepath,
+                                    file_format=file_format)
+        if dry_run:
+            result['entity_id'] = '<pending; dry-run only>'
+            result['version'] = 'TBD'
+            result['submission_id'] = '<pending; dry-run only>'
+            return result
+        prediction_ent, submission_object = submit._store_submission(
+            syn, team_info, submission_filepath,
+            eligibility_cache=eligibility_cache, verbose=False,
+            compression=compression, dedupe=dedupe
+        )
+    except Exception as e:
+        result['error'] = str(e)
+        return result
+    result['entity_id'] = prediction_ent['id']
+    result['version'] = prediction_ent['versionNumber']
+    result['submission_id'] = submission_object['id']
+    return result
+
+
+def _in_thread(profiler, func, *args):
+    '''Runs func in a worker thread under the caller's profiler'''
+    with tracing.profile(profiler):
+        return func(*args)
+
+
+def submit_raadc2_batch(prediction_paths, validate_only=False, dry_run=False,
+                        max_workers=None, syn=None, confirm=True,
+                        file_format='csv', compression=None,
+                        dedupe='manifest'):
+    '''
+    Submitting many RAAD2 prediction files
+
+    Args:
+        prediction_paths: Prediction file paths and/or glob patterns
+        validate_only: If 'True', check the files for any formatting
+            errors but don't submit to the challenge.
+        dry_run: If 'True', execute submission steps, but don't store
+            any data in Synapse.
+        max_workers: Files validated, uploaded and submitted concurrently,
+            defaults to SUBMIT_WORKERS (the number of CPUs when only
+            validating)
+        syn: Synapse object, logs in with synapse_login() if not given
+        confirm: If 'True', ask for confirmation once before submitting
+        file_format: Submission file format, see submit.write_submission();
+            formats other than submit.SCORED_FORMATS need dry_run
+        compression: Upload Content-Encoding, see submit.upload_predictions()
+        dedupe: Reuse earlier uploads of identical files, one of
+            submit.DEDUPE_MODES
+
+    Returns:
+        list: One dict per file with path, entity_id, version,
+              submission_id and error
+    '''
+    if not validate_only:
+        submit.check_submission_format(file_format, dry_run=dry_run)
+    paths = expand_paths(prediction_paths)
+    report = [_new_result(path) for path in paths]
+
+    print("Running checks to validate {count} prediction file(s)...\n"
+          .format(count=len(paths)))
+    if validate_only:
+        validation_report = validate_prediction_files(
+            paths, max_workers=max_workers
+        )
+        for result, file_result in zip(report, validation_report):
+            result['error'] = file_result['error']
+        print("{passed} of {count} file(s) passed all checks."
+              .format(passed=sum(result['error'] is None
+                                 for result in report),
+                      count=len(paths)))
+        return report
+
+    if max_workers is None:
+        max_workers = SUBMIT_WORKERS
+    # Spans in the worker threads go to the caller's profiler
+    profiler = tracing.current_profiler()
+    with futures.ThreadPoolExecutor(max_workers=max_workers) as executor:
+        validated = list(executor.map(
+            lambda path: _in_thread(profiler, _read_and_validate, path),
+            paths
+        ))
+    pending = []
+    for result, (predictiondf, error) in zip(report, validated):
+        if error is not None:
+            result['error'] = error
+        else:
+            pending.append((result, predictiondf))
+    print("{passed} of {count} file(s) passed all checks."
+          .format(passed=len(pending), count=len(paths)))
+    if not pending:
+        return report
+
+    exceptions = submit._synapse_exceptions()
+    with tracing.span('synapse_login'):
+        if syn is None:
+            syn = submit.synapse_login()
+        ownerid = submit._lookup_owner_id(syn)
+    with tracing.span('get_team_info'):
+        team_info = submit.get_team_info(
+            syn, ownerid, team_index=cache.default_team_index()
+        )
+    print("\nChecking ability to submit...")
+    eligibility_cache = cache.default_eligibility_cache()
+    with tracing.span('check_eligibility'):
+        is_eligible = submit.check_eligibility(
+            syn, team_info, ownerid, eligibility_cache=eligibility_cache
+        )
+    if not is_eligible:
+        raise exceptions.SynapseError(
+            "\nExiting submission attempt.\n"
+            "Visit the RAAD2 Challenge page in Synapse "
+            "to track results in the leaderboard."
+        )
+    if confirm and submit.r_package()._confirm_prompt()[0] in [0, 2]:
+        raise exceptions.SynapseError(
+            "\nExiting submission attempt.\n"
+            "Run `submit_raadc2_batch()` to try again when ready."
+        )
+
+    print("\nSubmitting {count} prediction file(s)..."
+          .format(count=len(pending)))
+    submission_dir = tempfile.mkdtemp(prefix='submitRAADC2-')
+    try:
+        with futures.ThreadPoolExecutor(max_workers=max_workers) as executor:
+            list(executor.map(
+                lambda item: _in_thread(
+                    profiler, _submit_one, syn, team_info, item[1], item[0],
+                    submission_dir, eligibility_cache, dry_run, file_format,
+                    compression, dedupe
+                ),
+                pending
+            ))
+    finally:
+        shutil.rmtree(submission_dir, ignore_errors=True)
+    return report
+
+
+def format_report(report):
+    '''
+    Formats a batch report as a table
+
+    Args:
+        report: Response from submit_raadc2_batch()
+
+    Returns:
+        str: Report table
+    '''
+    pd = importlib.import_module('pandas')
+    reportdf = pd.DataFrame(report, columns=REPORT_COLUMNS)
+    return reportdf.fillna('').to_string(index=False)
@@ -0,0 +1,109 @@
+'''
+Hands prediction frames to R.  to_r converts a frame into an R
+data.frame once, so the R engine's validate_predictions and
+_create_submission calls share one object:
+
+    r_predictiondf = bridge.to_r(predictiondf)
+
+With rpy2-arrow and the R arrow package installed, the columns go over
+as Arrow buffers and R builds its vectors in one pass.  Otherwise
+pandas2ri converts the frame, sending repetitive string columns as
+factors (integer codes plus a few levels) rather than one R string per
+row.
+'''
+import importlib
+
+BRIDGE_METHODS = ['arrow', 'pandas2ri']
+# String columns with at most this fraction of distinct values are sent
+# to R as factors by the pandas2ri bridge
+FACTOR_MAX_UNIQUE = 0.5
+
+
+def arrow_available():
+    '''
+    Checks if the Arrow bridge can be used
+
+    Returns:
+        bool: If pyarrow, rpy2-arrow and the R arrow package are installed
+    '''
+    try:
+        importlib.import_module('pyarrow')
+        importlib.import_module('rpy2_arrow.pyarrow_rarrow')
+    # rpy2 raises an ImportError subclass when the R package is missing
+    except ImportError:
+        return False
+    return True
+
+
+def bridge_method():
+    '''
+    Gets the method to_r uses by default
+
+    Returns:
+        str: One of BRIDGE_METHODS
+    '''
+    return 'arrow' if arrow_available() else 'pandas2ri'
+
+
+def _as_factors(predictiondf):
+    '''
+    Converts repetitive string columns to categoricals, which pandas2ri
+    sends to R as factors
+
+    Args:
+        predictiondf: Prediction dataframe
+
+    Returns:
+        pandas.DataFrame: The frame, with categorical string columns
+    '''
+    pd = importlib.import_module('pandas')
+    columns = {}
+    for name, column in predictiondf.items():
+        if (pd.api.types.is_string_dtype(column) and
+                column.nunique() <= FACTOR_MAX_UNIQUE * len(column)):
+            columns[name] = column.astype('category')
+    if not columns:
+        return predictiondf
+    return predictiondf.assign(**columns)
+
+
+def _to_r_arrow(predictiondf):
+    pa = importlib.import_module('pyarrow')
+    pyarrow_rarrow = importlib.import_module('rpy2_arrow.pyarrow_rarrow')
+    robjects = importlib.import_module('rpy2.robjects')
+    table = pa.Table.from_pandas(predictiondf, preserve_index=False)
+    return robjects.r['as.data.frame'](
+        pyarrow_rarrow.pyarrow_table_to_r_table(table)
+    )
+
+
+def _to_r_pandas2ri(predictiondf):
+    pandas2ri = importlib.import_module('rpy2.robjects.pandas2ri')
+    pandas2ri.activate()
+    try:
+        return pandas2ri.py2ri(_as_factors(predictiondf))
+    finally:
+        pandas2ri.deactivate()
+
+
+def to_r(predictiondf, method=None):
+    '''
+    Converts a prediction dataframe to an R data.frame
+
+    Args:
+        predictiondf: Prediction dataframe
+        method: One of BRIDGE_METHODS, defaults to bridge_method()
+
+    Returns:
+        rpy2 R data.frame
+    '''
+    if method is None:
+        method = bridge_method()
+    if method not in BRIDGE_METHODS:
+        raise ValueError(
+            "method must be one of {methods}, not {method!r}"
+            .format(methods=", ".join(BRIDGE_METHODS), method=method)
+        )
+    if method == 'arrow':
+        return _to_r_arrow(predictiondf)
+    return _to_r_pandas2ri(predictiondf)
@@ -0,0 +1,398 @@
+'''
+Local caches for Synapse lookups that rarely change between submissions
+'''
+import hashlib
+import json
+import os
+import threading
+import time
+
+CHALLENGE_TEAM_TABLE = 'syn17096669'
+
+# Seconds before the table's etag is checked again
+DEFAULT_TEAM_INDEX_TTL = 15 * 60
+# Seconds before the index is dropped and rebuilt regardless of etag
+DEFAULT_TEAM_INDEX_MAX_AGE = 24 * 60 * 60
+# Seconds a submissionEligibility response is served without refetching
+DEFAULT_ELIGIBILITY_TTL = 5 * 60
+
+
+def cache_dir():
+    '''
+    Gets the submitRAADC2 cache directory, creating it if needed.  Set
+    RAADC2_CACHE_DIR to override the default of ~/.submitRAADC2
+
+    Returns:
+        str: Cache directory path
+    '''
+    path = os.environ.get(
+        'RAADC2_CACHE_DIR',
+        os.path.join(os.path.expanduser('~'), '.submitRAADC2')
+    )
+    if not os.path.isdir(path):
+        os.makedirs(path)
+    return path
+
+
+def _read_json(path):
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (IOError, OSError, ValueError):
+        return None
+
+
+def _write_json(path, data):
+    tmp_path = '{path}.{pid}.tmp'.format(path=path, pid=os.getpid())
+    with open(tmp_path, 'w') as f:
+        json.dump(data, f)
+    os.replace(tmp_path, path)
+
+
+class TeamIndex(object):
+    '''
+    On-disk index of the challenge team table, keyed by team name and
+    holding (folderId, advancedCompute).  The whole table is re-queried
+    only when the table's etag or version changes, and the etag is only
+    checked once every `ttl` seconds, so lookups in between are a
+    dictionary access.
+
+    Args:
+        table_synid: Synapse id of the challenge team table
+        path: Index file path, defaults to team_index.json in cache_dir()
+        ttl: Seconds before the table's etag is checked again
+        max_age: Seconds before the index is evicted and rebuilt
+    '''
+    def __init__(self, table_synid=CHALLENGE_TEAM_TABLE, path=None,
+                 ttl=DEFAULT_TEAM_INDEX_TTL,
+                 max_age=DEFAULT_TEAM_INDEX_MAX_AGE):
+        self.table_synid = table_synid
+        self.path = path
+        self.ttl = ttl
+        self.max_age = max_age
+        self._lock = threading.Lock()
+        self._index = None
+
+    def _index_path(self):
+        if self.path is None:
+            self.path = os.path.join(cache_dir(), 'team_index.json')
+        return self.path
+
+    def _load(self):
+        if self._index is None:
+            index = _read_json(self._index_path())
+            if index is not None and index.get('table') == self.table_synid:
+                self._index = index
+        if (self._index is not None and
+                time.time() - self._index['fetched'] > self.max_age):
+            self._index = None
+
+    def _table_version(self, syn):
+        header = syn.restGET('/entity/{id}'.format(id=self.table_synid))
+        return header['etag'], header.get('versionNumber')
+
+    def _fetch(self, syn, etag, version):
+        table = syn.tableQuery(
+            "select teamName, folderId, advancedCompute from {synid}"
+            .format(synid=self.table_synid)
+        )
+        tabledf = table.asDataFrame()
+        teams = {
+            row.teamName: [row.folderId, bool(row.advancedCompute)]
+            for row in tabledf.itertuples()
+        }
+        now = time.time()
+        self._index = {
+            'table': self.table_synid,
+            'etag': etag,
+            'version': version,
+            'fetched': now,
+            'checked': now,
+            'teams': teams
+        }
+        _write_json(self._index_path(), self._index)
+
+    def refresh(self, syn, force=False):
+        '''
+        Revalidates the index against the table's etag and version,
+        re-querying the table only if they changed
+
+        Args:
+            syn: Synapse object
+            force: If 'True', revalidate even within the TTL
+
+        Returns:
+            bool: If the table was re-queried
+        '''
+        with self._lock:
+            self._load()
+            now = time.time()
+            if (not force and self._index is not None and
+                    now - self._index['checked'] < self.ttl):
+                return False
+            etag, version = self._table_version(syn)
+            if (self._index is not None and
+                    self._index['etag'] == etag and
+                    self._index['version'] == version):
+                self._index['checked'] = now
+                _write_json(self._index_path(), self._index)
+                return False
+            self._fetch(syn, etag, version)
+            return True
+
+    def lookup(self, syn, teamname):
+        '''
+        Looks up a team's prediction folder
+
+        Args:
+            syn: Synapse object
+            teamname: Name of team, without the 'RAAD2 ' prefix
+
+        Returns:
+            tuple (str, bool): team submission folder synapse id, if team
+            is in advanced compute, or None if the team isn't in the table
+        '''
+        fetched = self.refresh(syn)
+        team = self._index['teams'].get(teamname)
+        if team is None and not fetched:
+            # The team may have registered since the last etag check
+            self.refresh(syn, force=True)
+            team = self._index['teams'].get(teamname)
+        return tuple(team) if team is not None else None
+
+    def team_names(self, syn):
+        '''
+        Lists the teams in the challenge team table
+
+        Args:
+            syn: Synapse object
+
+        Returns:
+            list: Team names, without the 'RAAD2 ' prefix, sorted
+        '''
+        self.refresh(syn)
+        return sorted(self._index['teams'])
+
+    def evict(self):
+        '''Drops the index from memory and disk'''
+        with self._lock:
+            self._index = None
+            if os.path.exists(self._index_path()):
+                os.remove(self._index_path())
+
+
+def index_members(eligibility_data):
+    '''
+    Indexes a submissionEligibility response's membersEligibility by
+    principalId
+
+    Args:
+        eligibility_data: submissionEligibility response
+
+    Returns:
+        dict: principalId (int) to member eligibility dict
+    '''
+    return {
+        int(member['principalId']): member
+        for member in eligibility_data['membersEligibility']
+    }
+
+
+class EligibilityCache(object):
+    '''
+    In-memory cache of submissionEligibility responses keyed by team and
+    evaluation.  Entries are served for `ttl` seconds; after that the
+    response is refetched and, if its eligibilityStateHash is unchanged,
+    the existing entry and member index are kept.  Entries should be
+    invalidated once a submission is made, since that changes the
+    team's quota.
+
+    Args:
+        ttl: Seconds an entry is served without refetching
+    '''
+    def __init__(self, ttl=DEFAULT_ELIGIBILITY_TTL):
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._entries = {}
+
+    def get(self, teamid, evalid, fetch):
+        '''
+        Gets a team's eligibility, fetching it if not cached or stale
+
+        Args:
+            teamid: Synapse team id
+            evalid: Synapse evaluation id
+            fetch: Called with no arguments to fetch the response
+
+        Returns:
+            tuple (dict, dict): submissionEligibility response, members
+            indexed by principalId
+        '''
+        key = (str(teamid), str(evalid))
+        with self._lock:
+            entry = self._entries.get(key)
+        now = time.time()
+        if entry is not None and now - entry['checked'] < self.ttl:
+            return entry['data'], entry['members']
+
+        eligibility_data = fetch()
+        if (entry is None or
+                entry['data']['eligibilityStateHash'] !=
+                eligibility_data['eligibilityStateHash']):
+            entry = {
+                'data': eligibility_data,
+                'members': index_members(eligibility_data)
+            }
+        entry['checked'] = now
+        with self._lock:
+            self._entries[key] = entry
+        return entry['data'], entry['members']
+
+    def invalidate(self, teamid, evalid):
+        '''
+        Drops a team's cached eligibility
+
+        Args:
+            teamid: Synapse team id
+            evalid: Synapse evaluation id
+        '''
+        with self._lock:
+            self._entries.pop((str(teamid), str(evalid)), None)
+
+    def clear(self):
+        '''Drops all cached eligibility'''
+        with self._lock:
+            self._entries.clear()
+
+
+def file_md5(path, chunk_size=2**20):
+    '''
+    Computes a file's MD5 in chunks, matching Synapse's contentMd5
+
+    Args:
+        path: File path
+        chunk_size: Bytes read at a time
+
+    Returns:
+        str: Hex digest
+    '''
+    md5 = hashlib.md5()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            md5.update(chunk)
+    return md5.hexdigest()
+
+
+class UploadManifest(object):
+    '''
+    On-disk record of prediction files uploaded to team folders, keyed
+    by folder and content MD5, so an identical file can be submitted
+    again without re-uploading it
+
+    Args:
+        path: Manifest file path, defaults to uploads.json in cache_dir()
+    '''
+    def __init__(self, path=None):
+        self.path = path
+        self._lock = threading.Lock()
+
+    def _manifest_path(self):
+        if self.path is None:
+            self.path = os.path.join(cache_dir(), 'uploads.json')
+        return self.path
+
+    def _read(self):
+        # Re-read each time so uploads from other processes are seen
+        return _read_json(self._manifest_path()) or {}
+
+    @staticmethod
+    def _key(folder_id, md5):
+        return '{folder}:{md5}'.format(folder=folder_id, md5=md5)
+
+    def lookup(self, folder_id, md5):
+        '''
+        Looks up an uploaded file by content
+
+        Args:
+            folder_id: Synapse id of the team submission folder
+            md5: Submission file MD5
+
+        Returns:
+            dict: id and versionNumber of the uploaded file, or None
+        '''
+        with self._lock:
+            return self._read().get(self._key(folder_id, md5))
+
+    def add(self, folder_id, md5, entity):
+        '''
+        Records an uploaded file
+
+        Args:
+            folder_id: Synapse id of the team submission folder
+            md5: Submission file MD5
+            entity: Uploaded Synapse File Entity
+        '''
+        with self._lock:
+            manifest = self._read()
+            manifest[self._key(folder_id, md5)] = {
+                'id': entity['id'],
+                'versionNumber': entity['versionNumber']
+            }
+            _write_json(self._manifest_path(), manifest)
+
+    def remove(self, folder_id, md5):
+        '''
+        Forgets an uploaded file, e.g. once it can't be submitted
+
+        Args:
+            folder_id: Synapse id of the team submission folder
+            md5: Submission file MD5
+        '''
+        with self._lock:
+            manifest = self._read()
+            if manifest.pop(self._key(folder_id, md5), None) is not None:
+                _write_json(self._manifest_path(), manifest)
+
+
+_default_team_index = None
+_default_eligibility_cache = None
+_default_upload_manifest = None
+
+
+def default_team_index():
+    '''
+    Gets the process-wide team index used by submit_raadc2
+
+    Returns:
+        TeamIndex
+    '''
+    global _default_team_index
+    if _default_team_index is None:
+        _default_team_index = TeamIndex()
+    return _default_team_index
+
+
+def default_eligibility_cache():
+    '''
+    Gets the process-wide eligibility cache used by submit_raadc2
+
+    Returns:
+        EligibilityCache
+    '''
+    global _default_eligibility_cache
+    if _default_eligibility_cache is None:
+        _default_eligibility_cache = EligibilityCache()
+    return _default_eligibility_cache
+
+
+def default_upload_manifest():
+    '''
+    Gets the process-wide upload manifest used by submit_raadc2
+
+    Returns:
+        UploadManifest
+    '''
+    global _default_upload_manifest
+    if _default_upload_manifest is None:
+        _default_upload_manifest = UploadManifest()
+    return _default_upload_manifest
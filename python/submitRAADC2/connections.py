@@ -0,0 +1,182 @@
+'''
+Shared HTTP connection pool for the predictions gateway, Synapse REST
+calls and service-account logins.
+
+All network calls made by submitRAADC2 go through one `requests.Session`
+so that repeated submissions and validations reuse TLS connections
+instead of handshaking for every request.
+'''
+import hashlib
+import importlib
+import threading
+
+DEFAULT_POOL_SIZE = 10
+
+_lock = threading.Lock()
+_config = {'pool_size': DEFAULT_POOL_SIZE, 'keep_alive': True}
+_session = None
+_service_accounts = {}
+_counters = {'requests': 0, 'misses': 0, 'login_hits': 0, 'login_misses': 0}
+# Requests made by each thread, so concurrent stages only count their own
+_thread_counters = threading.local()
+
+
+def _count(name):
+    with _lock:
+        _counters[name] += 1
+    if name == 'requests':
+        _thread_counters.requests = thread_requests() + 1
+
+
+def thread_requests():
+    '''
+    Gets the number of requests this thread made through the shared pool
+
+    Returns:
+        int: Request count
+    '''
+    return getattr(_thread_counters, 'requests', 0)
+
+
+def _counting_pool(pool_class):
+    '''
+    Subclasses a urllib3 connection pool so that every request and every
+    socket it opens is counted
+
+    Args:
+        pool_class: urllib3 HTTPConnectionPool or HTTPSConnectionPool
+
+    Returns:
+        Connection pool class
+    '''
+    class CountingConnection(pool_class.ConnectionCls):
+        def connect(self):
+            _count('misses')
+            return super(CountingConnection, self).connect()
+
+    class CountingPool(pool_class):
+        ConnectionCls = CountingConnection
+
+        def urlopen(self, *args, **kwargs):
+            _count('requests')
+            return super(CountingPool, self).urlopen(*args, **kwargs)
+
+    CountingPool.__name__ = 'Counting' + pool_class.__name__
+    return CountingPool
+
+
+def _build_session(pool_size, keep_alive):
+    '''
+    Builds a requests Session whose adapters count connection reuse
+
+    Args:
+        pool_size: Connections kept open per host
+        keep_alive: If 'False', close connections after every request
+
+    Returns:
+        requests.Session
+    '''
+    requests = importlib.import_module('requests')
+    urllib3 = importlib.import_module('urllib3')
+    pool_classes = {
+        'http': _counting_pool(urllib3.HTTPConnectionPool),
+        'https': _counting_pool(urllib3.HTTPSConnectionPool)
+    }
+
+    class PooledAdapter(requests.adapters.HTTPAdapter):
+        def init_poolmanager(self, *args, **kwargs):
+            super(PooledAdapter, self).init_poolmanager(*args, **kwargs)
+            self.poolmanager.pool_classes_by_scheme = pool_classes
+
+    session = requests.Session()
+    adapter = PooledAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+    session.mount('https://', adapter)
+    session.mount('http://', adapter)
+    if not keep_alive:
+        session.headers['Connection'] = 'close'
+    return session
+
+
+def configure(pool_size=None, keep_alive=None):
+    '''
+    Configures the shared connection pool.  The current session and any
+    cached service-account logins are dropped, and the next call to
+    get_session() builds a new pool with these settings.
+
+    Args:
+        pool_size: Connections kept open per host
+        keep_alive: If 'False', close connections after every request
+    '''
+    global _session
+    with _lock:
+        if pool_size is not None:
+            _config['pool_size'] = pool_size
+        if keep_alive is not None:
+            _config['keep_alive'] = keep_alive
+        session = _session
+        _session = None
+        _service_accounts.clear()
+    if session is not None:
+        session.close()
+
+
+def get_session():
+    '''
+    Gets the shared requests Session, creating it on first use
+
+    Returns:
+        requests.Session
+    '''
+    global _session
+    with _lock:
+        if _session is None:
+            _session = _build_session(**_config)
+        return _session
+
+
+def service_account_login(email, apikey):
+    '''
+    Logs a service account into Synapse over the shared session, reusing
+    an existing login for the same credentials
+
+    Args:
+        email: Service account email
+        apikey: Service account API key
+
+    Returns:
+        Synapse object
+    '''
+    key = (email, hashlib.sha256(apikey.encode('utf-8')).hexdigest())
+    with _lock:
+        syn = _service_accounts.get(key)
+    if syn is not None:
+        _count('login_hits')
+        return syn
+    _count('login_misses')
+    synapseclient = importlib.import_module('synapseclient')
+    syn = synapseclient.Synapse(requests_session=get_session())
+    syn.login(email, apiKey=apikey)
+    with _lock:
+        _service_accounts[key] = syn
+    return syn
+
+
+def pool_stats():
+    '''
+    Gets connection reuse counters for the shared pool
+
+    Returns:
+        dict: requests, connection hits (reused) and misses (opened),
+              service account login hits and misses
+    '''
+    with _lock:
+        stats = dict(_counters)
+    stats['hits'] = stats['requests'] - stats['misses']
+    return stats
+
+
+def reset_stats():
+    '''Resets the connection reuse counters'''
+    with _lock:
+        for name in _counters:
+            _counters[name] = 0
@@ -0,0 +1,568 @@
+'''
+Submission daemon.  Keeps the R runtime, a logged-in Synapse client and
+the team lookup warm between runs, and takes validate and submit
+requests over a local Unix socket (or a localhost port, where requests
+must carry the token the daemon writes to a user-only file).  The client
+commands forward prediction files to it and ask for confirmation
+locally, so repeated runs skip R startup and login:
+
+    submitRAADC2-daemon serve &
+    submitRAADC2-daemon validate prediction.csv
+    submitRAADC2-daemon submit prediction.csv
+    submitRAADC2-daemon stop
+'''
+import argparse
+import contextlib
+import hmac
+import importlib
+import io
+import json
+import os
+import secrets
+import socket
+import sys
+import tempfile
+import threading
+
+from http.client import HTTPConnection
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from socketserver import ThreadingMixIn, UnixStreamServer
+from urllib.parse import parse_qs, urlencode, urlsplit
+
+from submitRAADC2 import bridge
+from submitRAADC2 import cache
+from submitRAADC2 import submit
+from submitRAADC2 import validation
+
+SOCKET_NAME = 'daemon.sock'
+TOKEN_NAME = 'daemon.token'
+# Submissions can take a while on slow uploads
+CLIENT_TIMEOUT = 600
+
+
+def default_socket_path():
+    '''
+    Gets the default Unix socket path of the daemon
+
+    Returns:
+        str: Socket path in the cache directory
+    '''
+    return os.path.join(cache.cache_dir(), SOCKET_NAME)
+
+
+def default_token_path():
+    '''
+    Gets the default path of the token for the daemon's TCP port
+
+    Returns:
+        str: Token path in the cache directory
+    '''
+    return os.path.join(cache.cache_dir(), TOKEN_NAME)
+
+
+def write_token(token_path):
+    '''
+    Writes a new random token readable only by this user
+
+    Args:
+        token_path: Token file path
+
+    Returns:
+        str: Token
+    '''
+    token = secrets.token_hex(32)
+    if os.path.exists(token_path):
+        os.remove(token_path)
+    fd = os.open(token_path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600)
+    with os.fdopen(fd, 'w') as f:
+        f.write(token)
+    return token
+
+
+def read_token(token_path):
+    '''
+    Reads the daemon's token
+
+    Args:
+        token_path: Token file path
+
+    Returns:
+        str: Token
+    '''
+    with open(token_path) as f:
+        return f.read().strip()
+
+
+class SubmissionDaemon(object):
+    '''
+    Holds the warm state shared by requests.  Requests run one at a
+    time, since the embedded R interpreter is single-threaded.
+
+    Args:
+        syn: Synapse object, logs in with synapse_login() on start if
+            not given
+        engine: Validation engine, 'python' or 'r'
+        file_format: Submission file format for the python engine, see
+            submit.write_submission(); formats other than
+            submit.SCORED_FORMATS are only accepted for dry runs
+        compression: Upload Content-Encoding, see submit.upload_predictions()
+    '''
+    def __init__(self, syn=None, engine='python', file_format='csv',
+                 compression=None):
+        self.syn = syn
+        self.engine = engine
+        self.file_format = file_format
+        self.compression = compression
+        self.ownerid = None
+        self.team_info = None
+        self.eligibility_cache = cache.default_eligibility_cache()
+        self._lock = threading.Lock()
+
+    def start(self):
+        '''Starts R for the r engine, logs in and looks up the team'''
+        if self.engine == 'r':
+            submit.r_package()
+        if self.syn is None:
+            self.syn = submit.synapse_login()
+        self.ownerid = submit._lookup_owner_id(self.syn)
+        self.team_info = submit.get_team_info(
+            self.syn, self.ownerid, team_index=cache.default_team_index()
+        )
+        return self
+
+    def status(self):
+        return {'ok': True, 'engine': self.engine, 'ownerid': self.ownerid,
+                'team_info': self.team_info}
+
+    def _read_predictions(self, data):
+        pd = importlib.import_module('pandas')
+        return pd.read_csv(io.BytesIO(data))
+
+    def _to_r(self, predictiondf):
+        '''Converts the frame for the r engine, once per request'''
+        if self.engine == 'r':
+            return bridge.to_r(predictiondf)
+        return None
+
+    def _validate(self, predictiondf, r_predictiondf=None):
+        if self.engine == 'r':
+            submit.r_package().validate_predictions(r_predictiondf)
+        else:
+            validation.validate_predictions(predictiondf)
+
+    def _validation_errors(self):
+        if self.engine == 'r':
+            return (ValueError,
+                    importlib.import_module('rpy2.rinterface').RRuntimeError)
+        return (ValueError,)
+
+    def validate(self, data):
+        '''
+        Validates a prediction file
+
+        Args:
+            data: CSV file contents
+
+        Returns:
+            dict: ok, and error with the validation message on failure
+        '''
+        try:
+            predictiondf = self._read_predictions(data)
+            self._validate(predictiondf, self._to_r(predictiondf))
+        except self._validation_errors() as e:
+            print(e)
+            return {'ok': False, 'error': str(e)}
+        print("All checks passed.")
+        return {'ok': True}
+
+    def check(self):
+        '''
+        Checks the team and user can submit, from the eligibility cache
+
+        Returns:
+            dict: ok, eligible, team_name
+        '''
+        is_eligible = submit.check_eligibility(
+            self.syn, self.team_info, self.ownerid,
+            eligibility_cache=self.eligibility_cache
+        )
+        return {'ok': True, 'eligible': bool(is_eligible),
+                'team_name': self.team_info['team_name']}
+
+    def _write(self, predictiondf, name, r_predictiondf=None):
+        if self.engine == 'r':
+            return submit.r_package()._create_submission(r_predictiondf)[0]
+        # One directory per request so files with the same name don't
+        # collide
+        filename = os.path.splitext(os.path.basename(name))[0]
+        return submit.write_submission(
+            predictiondf,
+            os.path.join(
+                tempfile.mkdtemp(dir=submit._get_submission_dir()),
+                '{name}.{ext}'.format(name=filename, ext=self.file_format)
+            ),
+            file_format=self.file_format
+        )
+
+    def submit(self, data, name='prediction.csv', dry_run=False):
+        '''
+        Validates, writes, uploads and submits a prediction file
+
+        Args:
+            data: CSV file contents
+            name: Client file name, used to name the submission file
+            dry_run: If 'True', don't store any data in Synapse
+
+        Returns:
+            dict: ok, filename, entity_id, version and submission_id, or
+                  error
+        '''
+        if self.engine != 'r':
+            try:
+                submit.check_submission_format(self.file_format,
+                                               dry_run=dry_run)
+            except ValueError as e:
+                print(e)
+                return {'ok': False, 'error': str(e)}
+        predictiondf = self._read_predictions(data)
+        r_predictiondf = self._to_r(predictiondf)
+        try:
+            self._validate(predictiondf, r_predictiondf)
+        except self._validation_errors() as e:
+            print(e)
+            return {'ok': False, 'error': str(e)}
+        if not self.check()['eligible']:
+            return {'ok': False,
+                    'error': "This team or account can't submit right now."}
+        submission_filepath = self._write(predictiondf, name, r_predictiondf)
+        if dry_run:
+            prediction_ent = {'id': '<pending; dry-run only>',
+                              'versionNumber': 'TBD'}
+            submission_object = {'id': '<pending; dry-run only>'}
+        else:
+            prediction_ent, submission_object = submit._store_submission(
+                self.syn, self.team_info, submission_filepath,
+                eligibility_cache=self.eligibility_cache,
+                compression=self.compression
+            )
+        print("\nSuccessfully submitted file: '{filename}'"
+              .format(filename=submission_filepath))
+        print(" > stored as {entityid} [version: {version}]"
+              .format(entityid=prediction_ent['id'],
+                      version=prediction_ent['versionNumber']))
+        print(" > submission Id: {subid}"
+              .format(subid=submission_object['id']))
+        return {'ok': True, 'filename': submission_filepath,
+                'entity_id': prediction_ent['id'],
+                'version': prediction_ent['versionNumber'],
+                'submission_id': submission_object['id']}
+
+    def handle(self, action, data=None, params=None):
+        '''
+        Runs one request, capturing what it prints
+
+        Args:
+            action: 'validate', 'check' or 'submit'
+            data: CSV file contents for validate and submit
+            params: Request parameters, name and dry_run for submit
+
+        Returns:
+            dict: Response of the action, with output holding what it
+                  printed
+        '''
+        params = params or {}
+        output = io.StringIO()
+        with self._lock, contextlib.redirect_stdout(output):
+            try:
+                if action == 'validate':
+                    response = self.validate(data)
+                elif action == 'check':
+                    response = self.check()
+                else:
+                    response = self.submit(
+                        data, name=params.get('name', 'prediction.csv'),
+                        dry_run=params.get('dry_run') == '1'
+                    )
+            except Exception as e:
+                response = {'ok': False, 'error': str(e)}
+        response['output'] = output.getvalue()
+        return response
+
+
+class _DaemonHandler(BaseHTTPRequestHandler):
+    def _reply(self, status, body):
+        data = json.dumps(body).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _authorized(self):
+        '''
+        Rejects requests from browsers, which send an Origin header, and
+        requests without the daemon's token when it has one
+        '''
+        if self.headers.get('Origin') is not None:
+            return False
+        token = self.server.token
+        if token is None:
+            return True
+        return hmac.compare_digest(
+            self.headers.get('Authorization', ''),
+            'Bearer {token}'.format(token=token)
+        )
+
+    def do_GET(self):
+        if not self._authorized():
+            self._reply(403, {'ok': False, 'error': 'Forbidden'})
+        elif urlsplit(self.path).path == '/status':
+            self._reply(200, self.server.daemon.status())
+        else:
+            self._reply(404, {'ok': False, 'error': 'Not found'})
+
+    def do_POST(self):
+        if not self._authorized():
+            self._reply(403, {'ok': False, 'error': 'Forbidden'})
+            return
+        url = urlsplit(self.path)
+        action = url.path.strip('/')
+        params = dict((key, values[0]) for key, values
+                      in parse_qs(url.query).items())
+        data = self.rfile.read(int(self.headers.get('Content-Length', 0)))
+        if action == 'shutdown':
+            self._reply(200, {'ok': True})
+            # shutdown() waits for serve_forever, so it can't run in the
+            # request thread
+            threading.Thread(target=self.server.shutdown).start()
+        elif action in ('validate', 'check', 'submit'):
+            self._reply(200, self.server.daemon.handle(action, data, params))
+        else:
+            self._reply(404, {'ok': False, 'error': 'Not found'})
+
+    def log_message(self, *args):
+        pass
+
+
+class _UnixServer(ThreadingMixIn, UnixStreamServer):
+    daemon_threads = True
+
+
+class _TCPServer(ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+
+
+def make_server(daemon, socket_path=None, port=None, token_path=None):
+    '''
+    Makes a server for a daemon, on a Unix socket or a localhost port.
+    Only this user can submit through the daemon's Synapse login: the
+    socket is created user-only, and the port requires a token that is
+    written to a user-only file.
+
+    Args:
+        daemon: Started SubmissionDaemon
+        socket_path: Unix socket path, used unless port is given
+        port: Localhost TCP port
+        token_path: Token file for the port, defaults to
+            default_token_path()
+
+    Returns:
+        socketserver.BaseServer
+    '''
+    if port is not None:
+        server = _TCPServer(('127.0.0.1', port), _DaemonHandler)
+        server.token = write_token(token_path or default_token_path())
+    else:
+        if os.path.exists(socket_path):
+            os.remove(socket_path)
+        # Created with user-only permissions, leaving no window where
+        # other users can connect
+        umask = os.umask(0o077)
+        try:
+            server = _UnixServer(socket_path, _DaemonHandler)
+        finally:
+            os.umask(umask)
+        server.token = None
+    server.daemon = daemon
+    return server
+
+
+class _UnixHTTPConnection(HTTPConnection):
+    '''HTTPConnection over a Unix socket'''
+    def __init__(self, socket_path, timeout=CLIENT_TIMEOUT):
+        super().__init__('localhost', timeout=timeout)
+        self.socket_path = socket_path
+
+    def connect(self):
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.sock.settimeout(self.timeout)
+        self.sock.connect(self.socket_path)
+
+
+def request(action, prediction_path=None, socket_path=None, port=None,
+            token_path=None, **params):
+    '''
+    Sends a request to a running daemon
+
+    Args:
+        action: 'status', 'validate', 'check', 'submit' or 'shutdown'
+        prediction_path: Prediction CSV file forwarded to the daemon
+        socket_path: Daemon Unix socket path, used unless port is given
+        port: Daemon localhost TCP port
+        token_path: Token file for the port, defaults to
+            default_token_path()
+        **params: Request parameters
+
+    Returns:
+        dict: Daemon response
+    '''
+    headers = {}
+    if port is not None:
+        connection = HTTPConnection('127.0.0.1', port, timeout=CLIENT_TIMEOUT)
+        headers['Authorization'] = 'Bearer {token}'.format(
+            token=read_token(token_path or default_token_path())
+        )
+    else:
+        connection = _UnixHTTPConnection(socket_path or default_socket_path())
+    uri = '/' + action
+    if params:
+        uri += '?' + urlencode(params)
+    try:
+        if action == 'status':
+            connection.request('GET', uri, headers=headers)
+        elif prediction_path is None:
+            connection.request('POST', uri, body=b'', headers=headers)
+        else:
+            with open(prediction_path, 'rb') as body:
+                headers['Content-Type'] = 'text/csv'
+                headers['Content-Length'] = str(
+                    os.fstat(body.fileno()).st_size
+                )
+                connection.request('POST', uri, body=body, headers=headers)
+        return json.loads(connection.getresponse().read().decode('utf-8'))
+    finally:
+        connection.close()
+
+
+def _confirm_prompt():
+    '''Asks for confirmation in the client, like the R package prompt'''
+    print("\nAre you sure you want to submit?\n\n\n1: Yes\n\n2: No\n\n")
+    return input("Selection: ").strip() == '1'
+
+
+def build_parser():
+    """Builds the argument parser and returns the result."""
+    parser = argparse.ArgumentParser(
+        description="Run or talk to a submitRAADC2 daemon"
+    )
+    parser.add_argument("--socket", dest='socket_path',
+                        help="Daemon Unix socket (default: {name} in the "
+                             "cache directory)".format(name=SOCKET_NAME))
+    parser.add_argument("--port", type=int,
+                        help="Use a localhost TCP port instead of a Unix "
+                             "socket; clients authenticate with the token "
+                             "in {name} in the cache directory"
+                             .format(name=TOKEN_NAME))
+    subparsers = parser.add_subparsers(dest='command')
+    subparsers.required = True
+    serve = subparsers.add_parser("serve", help="Start the daemon")
+    serve.add_argument("--engine", choices=['python', 'r'], default='python',
+                       help="Validation engine (default: python)")
+    serve.add_argument("--format", dest='file_format',
+                       choices=submit.SUBMISSION_FORMATS, default='csv',
+                       help="Submission file format (default: csv)")
+    serve.add_argument("--compression",
+                       choices=sorted(submit.COMPRESSION_LEVELS),
+                       help="Compress uploads to the predictions gateway")
+    validate = subparsers.add_parser("validate",
+                                     help="Validate a prediction file")
+    validate.add_argument("prediction", help="Prediction filepath")
+    submit_parser = subparsers.add_parser("submit",
+                                          help="Submit a prediction file")
+    submit_parser.add_argument("prediction", help="Prediction filepath")
+    submit_parser.add_argument("--dry-run", action='store_true',
+                               help="Don't store any data in Synapse")
+    submit_parser.add_argument("-y", "--yes", action='store_true',
+                               help="Submit without asking for confirmation")
+    subparsers.add_parser("status", help="Show the daemon's team and engine")
+    subparsers.add_parser("stop", help="Stop the daemon")
+    return parser
+
+
+def _print_response(response):
+    sys.stdout.write(response['output'])
+    error = response.get('error')
+    if error is not None and error not in response['output']:
+        print(error)
+
+
+def _client(args):
+    '''
+    Runs a client command against the daemon
+
+    Args:
+        args: Response from build_parser().parse_args()
+
+    Returns:
+        bool: If the command succeeded
+    '''
+    address = {'socket_path': args.socket_path, 'port': args.port}
+    if args.command == 'status':
+        response = request('status', **address)
+        print(json.dumps(response, indent=2))
+        return response['ok']
+    if args.command == 'stop':
+        return request('shutdown', **address)['ok']
+
+    print("Running checks to validate date frame format...\n")
+    response = request('validate', args.prediction, **address)
+    _print_response(response)
+    if not response['ok'] or args.command == 'validate':
+        return response['ok']
+
+    print("\nChecking ability to submit...")
+    response = request('check', **address)
+    _print_response(response)
+    if not response['ok'] or not response['eligible']:
+        print("\nExiting submission attempt.")
+        return False
+    if not args.yes and not _confirm_prompt():
+        print("\nExiting submission attempt.")
+        return False
+    print("\nWriting the submission file...")
+    params = {'name': os.path.basename(args.prediction)}
+    if args.dry_run:
+        params['dry_run'] = '1'
+    response = request('submit', args.prediction, **dict(address, **params))
+    _print_response(response)
+    return response['ok']
+
+
+def main():
+    args = build_parser().parse_args()
+    if args.command != 'serve':
+        sys.exit(0 if _client(args) else 1)
+    socket_path = args.socket_path or default_socket_path()
+    daemon = SubmissionDaemon(
+        engine=args.engine, file_format=args.file_format,
+        compression=args.compression
+    ).start()
+    server = make_server(daemon, socket_path=socket_path, port=args.port)
+    print("\nServing {team} on {address}"
+          .format(team=daemon.team_info['team_name'],
+                  address=socket_path if args.port is None
+                  else '127.0.0.1:{port}'.format(port=args.port)))
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        if args.port is None and os.path.exists(socket_path):
+            os.remove(socket_path)
+        if args.port is not None and os.path.exists(default_token_path()):
+            os.remove(default_token_path())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,170 @@
+'''
+Bulk eligibility scan across the challenge teams.  Lists every team in
+the challenge team table and fetches its submissionEligibility
+concurrently, under a rate limit, returning one row per team member:
+
+    python -m submitRAADC2.eligibility --csv eligibility.csv
+'''
+import argparse
+import importlib
+import threading
+import time
+from concurrent import futures
+
+from submitRAADC2 import cache
+from submitRAADC2 import submit
+
+ELIGIBILITY_COLUMNS = [
+    'team', 'team_id', 'member', 'isEligible', 'isRegistered',
+    'isQuotaFilled', 'hasConflictingSubmission', 'teamIsEligible',
+    'teamIsQuotaFilled', 'error'
+]
+SCAN_WORKERS = 16
+# REST calls per second across all workers
+SCAN_RATE = 10.0
+
+
+class RateLimiter(object):
+    '''
+    Token bucket shared by threads, allowing `rate` calls per second on
+    average with bursts of up to `burst` calls
+
+    Args:
+        rate: Calls per second, None for no limit
+        burst: Calls allowed back to back
+    '''
+    def __init__(self, rate, burst=1):
+        self.rate = rate
+        self.burst = burst
+        self._tokens = float(burst)
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        '''Waits until a call is allowed'''
+        if self.rate is None:
+            return
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(
+                    self.burst,
+                    self._tokens + (now - self._updated) * self.rate
+                )
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                wait = (1 - self._tokens) / self.rate
+            time.sleep(wait)
+
+
+def _team_rows(syn, teamname, limiter):
+    '''
+    Fetches one team's eligibility
+
+    Args:
+        syn: Synapse object
+        teamname: Team name, without the 'RAAD2 ' prefix
+        limiter: RateLimiter for the REST calls
+
+    Returns:
+        list: One row dict per member, or a single row with the error if
+              the team can't be looked up
+    '''
+    exceptions = submit._synapse_exceptions()
+    row = dict.fromkeys(ELIGIBILITY_COLUMNS)
+    row['team'] = 'RAAD2 ' + teamname
+    try:
+        limiter.acquire()
+        team = syn.getTeam(row['team'])
+        row['team_id'] = str(team['id'])
+        limiter.acquire()
+        eligibility_data = submit._get_eligibility_data(syn, row['team_id'])
+    except (ValueError, exceptions.SynapseError) as e:
+        row['error'] = str(e)
+        return [row]
+    team_eligibility = eligibility_data['teamEligibility']
+    row['teamIsEligible'] = team_eligibility['isEligible']
+    row['teamIsQuotaFilled'] = team_eligibility['isQuotaFilled']
+    rows = []
+    for member in eligibility_data['membersEligibility']:
+        member_row = dict(row)
+        member_row['member'] = str(member['principalId'])
+        for key in ('isEligible', 'isRegistered', 'isQuotaFilled',
+                    'hasConflictingSubmission'):
+            member_row[key] = member.get(key)
+        rows.append(member_row)
+    return rows
+
+
+def scan_eligibility(syn, teamnames=None, max_workers=SCAN_WORKERS,
+                     rate=SCAN_RATE, team_index=None):
+    '''
+    Fetches the submission eligibility of every team and member
+
+    Args:
+        syn: Synapse object
+        teamnames: Team names (with or without the 'RAAD2 ' prefix),
+            defaults to every team in the challenge team table
+        max_workers: Teams fetched concurrently
+        rate: REST calls per second across all workers, None for no limit
+        team_index: cache.TeamIndex listing the teams, defaults to
+            cache.default_team_index()
+
+    Returns:
+        pandas.DataFrame: One row per team member with ELIGIBILITY_COLUMNS;
+            teams that can't be looked up get one row with the error
+    '''
+    pd = importlib.import_module('pandas')
+    if teamnames is None:
+        if team_index is None:
+            team_index = cache.default_team_index()
+        teamnames = team_index.team_names(syn)
+    else:
+        teamnames = [teamname.replace('RAAD2 ', '', 1)
+                     for teamname in teamnames]
+    limiter = RateLimiter(rate)
+    with futures.ThreadPoolExecutor(max_workers=max_workers) as executor:
+        team_rows = list(executor.map(
+            lambda teamname: _team_rows(syn, teamname, limiter), teamnames
+        ))
+    return pd.DataFrame(
+        [row for rows in team_rows for row in rows],
+        columns=ELIGIBILITY_COLUMNS
+    )
+
+
+def build_parser():
+    """Builds the argument parser and returns the result."""
+    parser = argparse.ArgumentParser(
+        description="List which RAAD2 Challenge teams and members can submit"
+    )
+    parser.add_argument("--team", dest='teamnames', action='append',
+                        help="Team to scan; repeat for several "
+                             "(default: every team in the team table)")
+    parser.add_argument("-j", "--jobs", type=int, default=SCAN_WORKERS,
+                        help="Teams fetched concurrently (default: {})"
+                        .format(SCAN_WORKERS))
+    parser.add_argument("--rate", type=float, default=SCAN_RATE,
+                        help="REST calls per second (default: {})"
+                        .format(SCAN_RATE))
+    parser.add_argument("--csv", metavar='FILE',
+                        help="Write the table as CSV instead of printing it")
+    return parser
+
+
+def main():
+    args = build_parser().parse_args()
+    syn = submit.synapse_login()
+    eligibilitydf = scan_eligibility(
+        syn, teamnames=args.teamnames, max_workers=args.jobs, rate=args.rate
+    )
+    if args.csv:
+        eligibilitydf.to_csv(args.csv, index=False)
+    else:
+        print(eligibilitydf.fillna('').to_string(index=False))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,519 @@
+'''
+Load-test harness for the submission path.  Runs simulated submitters
+concurrently through the network steps of submit_raadc2 (owner lookup,
+get_team_info, check_eligibility, the gateway upload and syn.submit)
+against a local stand-in for Synapse and the predictions gateway, and
+reports throughput, per-stage latency percentiles and failure rates.
+
+    python -m submitRAADC2.loadtest --submitters 500 --concurrency 100 \\
+        --latency 0.05 --error-rate 0.01
+'''
+import argparse
+import base64
+import contextlib
+import gzip
+import hashlib
+import importlib
+import itertools
+import json
+import os
+import random
+import re
+import shutil
+import tempfile
+import threading
+import time
+from concurrent import futures
+
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from socketserver import ThreadingMixIn
+
+from submitRAADC2 import cache
+from submitRAADC2 import connections
+from submitRAADC2 import submit
+from submitRAADC2 import tracing
+from submitRAADC2 import validation
+
+# Endpoints of the stand-in, used as keys for per-endpoint latency and
+# error rates
+ENDPOINTS = ['user_profile', 'user_teams', 'team', 'table_query',
+             'eligibility', 'gateway', 'entity', 'submit']
+STAGES = ['lookup_owner_id', 'get_team_info', 'check_eligibility',
+          'hash', 'upload', 'submit']
+# Teams each simulated user belongs to besides their RAAD2 team
+OTHER_TEAMS = 3
+
+_ROUTES = [
+    ('GET', re.compile(r'^/userProfile$'), 'user_profile'),
+    ('GET', re.compile(r'^/user/(?P<userid>\d+)/team/id$'), 'user_teams'),
+    ('GET', re.compile(r'^/team/(?P<teamid>\d+)$'), 'team'),
+    ('POST', re.compile(r'^/table/query$'), 'table_query'),
+    ('GET', re.compile(r'^/evaluation/(?P<evalid>\d+)/team/(?P<teamid>\d+)'
+                       r'/submissionEligibility$'), 'eligibility'),
+    ('POST', re.compile(r'^/v1/predictions$'), 'gateway'),
+    ('GET', re.compile(r'^/entity/(?P<entityid>syn\d+)/version/(?P<version>\d+)$'),
+     'entity'),
+    ('POST', re.compile(r'^/evaluation/submission$'), 'submit'),
+]
+
+
+def _team_id(userid):
+    return 100000 + userid
+
+
+def _other_team_ids(userid):
+    return [200000 + userid * OTHER_TEAMS + i for i in range(OTHER_TEAMS)]
+
+
+class _StandInHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    # Headers and body are written separately, which Nagle's algorithm
+    # would hold back for a delayed ACK
+    disable_nagle_algorithm = True
+
+    def _reply(self, status, body):
+        data = json.dumps(body).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _body(self, keep=False):
+        length = int(self.headers.get('Content-Length', 0))
+        remaining = length
+        chunks = []
+        while remaining:
+            chunk = self.rfile.read(min(remaining, 2**20))
+            remaining -= len(chunk)
+            # Only JSON bodies are kept; gateway uploads are drained
+            # unless they're recorded
+            if keep or length <= 2**20:
+                chunks.append(chunk)
+        return b''.join(chunks)
+
+    def _handle(self, method):
+        path = self.path.split('?', 1)[0]
+        for route_method, pattern, endpoint in _ROUTES:
+            match = pattern.match(path)
+            if route_method == method and match:
+                break
+        else:
+            self._body()
+            self._reply(404, {'reason': 'Not found: ' + path})
+            return
+        stand_in = self.server.stand_in
+        body = self._body(keep=stand_in.record_uploads)
+        stand_in.delay(endpoint)
+        if stand_in.should_fail(endpoint):
+            self._reply(503, {'reason': 'Injected failure'})
+            return
+        handler = getattr(stand_in, endpoint)
+        reply = handler(self, body, **match.groupdict())
+        # Handlers return a (status, body) pair for anything but a 200
+        if isinstance(reply, tuple):
+            self._reply(*reply)
+        else:
+            self._reply(200, reply)
+
+    def do_GET(self):
+        self._handle('GET')
+
+    def do_POST(self):
+        self._handle('POST')
+
+    def log_message(self, *args):
+        pass
+
+
+class _ThreadingServer(ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+    request_queue_size = 1024
+
+
+class StandInServer(object):
+    '''
+    Local stand-in for the Synapse REST endpoints used by submissions and
+    for the predictions gateway.  Simulated user N belongs to team
+    'RAAD2 Team N' plus a few unrelated teams, and every team is eligible.
+
+    Args:
+        latency: Seconds added to every response, or a dict of endpoint
+            name (see ENDPOINTS) to seconds
+        error_rate: Probability of answering 503, or a dict of endpoint
+            name to probability
+        jitter: Fraction of latency added or removed at random
+        seed: Random seed for jitter and injected failures
+        record_uploads: Decode each gateway upload and append its
+            submission folder, MD5, Content-Encoding and whether it was
+            chunked to uploads
+        accept_encodings: Content-Encodings the gateway accepts (None
+            for no encoding), all of them by default.  Other uploads get
+            the reject_encoding (status, body) reply.
+    '''
+    def __init__(self, latency=0.0, error_rate=0.0, jitter=0.1, seed=None,
+                 record_uploads=False, accept_encodings=None):
+        self.latency = self._per_endpoint(latency)
+        self.error_rate = self._per_endpoint(error_rate)
+        self.jitter = jitter
+        self.record_uploads = record_uploads
+        self.accept_encodings = accept_encodings
+        self.reject_encoding = (415, {'reason': 'Unsupported Content-Encoding'})
+        self.uploads = []
+        self._random = random.Random(seed)
+        self._random_lock = threading.Lock()
+        self._submission_ids = itertools.count(9000000)
+        self._entity_ids = itertools.count(20000000)
+        self._server = None
+
+    @staticmethod
+    def _per_endpoint(value):
+        if isinstance(value, dict):
+            return dict((endpoint, value.get(endpoint, 0.0))
+                        for endpoint in ENDPOINTS)
+        return dict.fromkeys(ENDPOINTS, value)
+
+    def _uniform(self):
+        with self._random_lock:
+            return self._random.random()
+
+    def delay(self, endpoint):
+        latency = self.latency[endpoint]
+        if latency:
+            time.sleep(latency * (1 + self.jitter * (2 * self._uniform() - 1)))
+
+    def should_fail(self, endpoint):
+        return self._uniform() < self.error_rate[endpoint]
+
+    def user_profile(self, request, body):
+        return {'ownerId': request.headers['X-Stand-In-User']}
+
+    def user_teams(self, request, body, userid):
+        userid = int(userid)
+        return {'teamIds': _other_team_ids(userid) + [_team_id(userid)]}
+
+    def team(self, request, body, teamid):
+        teamid = int(teamid)
+        if teamid >= 200000:
+            return {'id': str(teamid), 'name': 'Other Team {}'.format(teamid)}
+        return {'id': str(teamid),
+                'name': 'RAAD2 Team {}'.format(teamid - 100000)}
+
+    def table_query(self, request, body):
+        sql = json.loads(body.decode('utf-8'))['sql']
+        teamname = re.search(r"teamName = '([^']*)'", sql).group(1)
+        userid = int(teamname.split()[-1])
+        return {'rows': [{'folderId': 'syn{}'.format(30000000 + userid),
+                          'advancedCompute': False}]}
+
+    def eligibility(self, request, body, evalid, teamid):
+        userid = int(teamid) - 100000
+        return {
+            'teamId': teamid,
+            'evaluationId': evalid,
+            'teamEligibility': {'isEligible': True, 'isRegistered': True,
+                                'isQuotaFilled': False},
+            'membersEligibility': [
+                {'isEligible': True, 'isRegistered': True,
+                 'isQuotaFilled': False, 'principalId': userid,
+                 'hasConflictingSubmission': False}
+            ],
+            'eligibilityStateHash': 1
+        }
+
+    def gateway(self, request, body):
+        content_encoding = request.headers.get('Content-Encoding')
+        if (self.accept_encodings is not None and
+                content_encoding not in self.accept_encodings):
+            return self.reject_encoding
+        if self.record_uploads:
+            if content_encoding == 'gzip':
+                body = gzip.decompress(body)
+            elif content_encoding == 'zstd':
+                zstandard = importlib.import_module('zstandard')
+                body = zstandard.ZstdDecompressor().decompressobj().decompress(body)
+            data = json.loads(body.decode('utf-8'))
+            self.uploads.append({
+                'submission_folder': data['submission_folder'],
+                'md5': hashlib.md5(base64.b64decode(data['data'])).hexdigest(),
+                'chunked': 'Transfer-Encoding' in request.headers,
+                'content_encoding': content_encoding
+            })
+        entityid = 'syn{}'.format(next(self._entity_ids))
+        return self.entity(request, b'', entityid, 1)
+
+    def entity(self, request, body, entityid, version):
+        return {'id': entityid, 'versionNumber': int(version),
+                'etag': '{id}.{version}'.format(id=entityid, version=version)}
+
+    def submit(self, request, body):
+        return {'id': str(next(self._submission_ids))}
+
+    @property
+    def url(self):
+        return 'http://127.0.0.1:{port}'.format(
+            port=self._server.server_address[1])
+
+    def start(self):
+        '''Starts serving on a free local port'''
+        self._server = _ThreadingServer(('127.0.0.1', 0), _StandInHandler)
+        self._server.stand_in = self
+        thread = threading.Thread(target=self._server.serve_forever)
+        thread.daemon = True
+        thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+
+class _QueryResult(object):
+    def __init__(self, rows):
+        self.rows = rows
+
+    def asDataFrame(self):
+        pd = importlib.import_module('pandas')
+        return pd.DataFrame(self.rows, columns=['folderId', 'advancedCompute'])
+
+
+class StandInSynapse(object):
+    '''
+    Minimal Synapse client that makes the calls submit.py uses against a
+    StandInServer, over the shared connection pool
+
+    Args:
+        url: StandInServer url
+        userid: Simulated user id
+    '''
+    def __init__(self, url, userid):
+        self.url = url
+        self.userid = userid
+        self.session = connections.get_session()
+
+    def _request(self, method, uri, body=None):
+        res = self.session.request(
+            method, self.url + uri, json=body,
+            headers={'X-Stand-In-User': str(self.userid)}
+        )
+        res.raise_for_status()
+        return res.json()
+
+    def restGET(self, uri):
+        return self._request('GET', uri)
+
+    def restPOST(self, uri, body):
+        return self._request('POST', uri, json.loads(body))
+
+    def getUserProfile(self):
+        return self.restGET('/userProfile')
+
+    def getTeam(self, teamid):
+        return self.restGET('/team/{id}'.format(id=teamid))
+
+    def tableQuery(self, query):
+        return _QueryResult(self._request(
+            'POST', '/table/query', {'sql': query}
+        )['rows'])
+
+    def submit(self, evaluation, entity, name=None, team=None, **kwargs):
+        # Like Synapse.submit, which sends the etag it's given
+        return self._request('POST', '/evaluation/submission', {
+            'evaluationId': evaluation, 'entityId': entity['id'],
+            'versionNumber': entity['versionNumber'],
+            'entityEtag': entity['etag'], 'teamName': team
+        })
+
+
+def _simulate_submitter(url, userid, submission_filepath, upload_manifest):
+    '''
+    Runs one submitter through the network steps of submit_raadc2
+
+    Returns:
+        tuple (Profiler, str): Spans for each stage, error message or None
+    '''
+    syn = StandInSynapse(url, userid)
+    profiler = tracing.Profiler()
+    try:
+        with tracing.profile(profiler):
+            with tracing.span('lookup_owner_id'):
+                ownerid = submit._lookup_owner_id(syn)
+            with tracing.span('get_team_info'):
+                team_info = submit.get_team_info(syn, ownerid)
+            with tracing.span('check_eligibility'):
+                if not submit.check_eligibility(syn, team_info, ownerid):
+                    raise ValueError("Submitter is not eligible")
+            submit._store_submission(syn, team_info, submission_filepath,
+                                     verbose=False,
+                                     upload_manifest=upload_manifest,
+                                     predictions_url=url + '/v1/predictions')
+    except Exception as e:
+        return profiler, '{name}: {error}'.format(name=type(e).__name__,
+                                                  error=e)
+    return profiler, None
+
+
+def _percentiles(seconds):
+    np = importlib.import_module('numpy')
+    if not seconds:
+        return dict.fromkeys(['p50', 'p95', 'p99'])
+    p50, p95, p99 = np.percentile(seconds, [50, 95, 99])
+    return {'p50': float(p50), 'p95': float(p95), 'p99': float(p99)}
+
+
+def run_load_test(submitters=100, concurrency=20, latency=0.0, error_rate=0.0,
+                  rows=1000, seed=None):
+    '''
+    Runs simulated submitters concurrently against a StandInServer
+
+    Args:
+        submitters: Total number of simulated submissions
+        concurrency: Submissions in flight at once
+        latency: Seconds of latency per stand-in response, or a dict of
+            endpoint name to seconds
+        error_rate: Probability of a 503 per stand-in response, or a dict
+            of endpoint name to probability
+        rows: Rows in the uploaded prediction file (repeats patient IDs)
+        seed: Random seed for the stand-in
+
+    Returns:
+        dict: seconds, throughput (submissions/second), failures,
+              failure_rate, errors (first few messages), and per-stage
+              count, failures, failure_rate, p50, p95 and p99 seconds
+    '''
+    pd = importlib.import_module('pandas')
+    ids = validation.patient_ids()
+    predictiondf = pd.DataFrame({
+        'PatientID': [ids[i % len(ids)] for i in range(rows)],
+        'RespondingSubgroup': ['Tecentriq', 'Chemo'] * (rows // 2) +
+                              ['Chemo'] * (rows % 2)
+    })
+    tmpdir = tempfile.mkdtemp(prefix='submitRAADC2-loadtest-')
+    submission_filepath = submit.write_submission(
+        predictiondf, os.path.join(tmpdir, 'prediction.csv')
+    )
+
+    # Stand-in uploads are kept out of the user's upload manifest
+    upload_manifest = cache.UploadManifest(
+        os.path.join(tmpdir, 'uploads.json')
+    )
+
+    stand_in = StandInServer(latency=latency, error_rate=error_rate, seed=seed)
+    try:
+        with stand_in, open(os.devnull, 'w') as devnull, \
+                contextlib.redirect_stdout(devnull):
+            start = time.time()
+            with futures.ThreadPoolExecutor(max_workers=concurrency) as executor:
+                results = list(executor.map(
+                    lambda userid: _simulate_submitter(
+                        stand_in.url, userid, submission_filepath,
+                        upload_manifest
+                    ),
+                    range(1, submitters + 1)
+                ))
+            seconds = time.time() - start
+    finally:
+        shutil.rmtree(tmpdir, ignore_errors=True)
+
+    errors = [error for _, error in results if error is not None]
+    stages = {}
+    for stage in STAGES:
+        spans = [span for profiler, _ in results
+                 for span in profiler.spans if span.name == stage]
+        stage_failures = sum(1 for span in spans if span.error is not None)
+        stage_report = {
+            'count': len(spans),
+            'failures': stage_failures,
+            'failure_rate': float(stage_failures) / len(spans) if spans else 0.0
+        }
+        stage_report.update(_percentiles(
+            [span.seconds for span in spans if span.error is None]
+        ))
+        stages[stage] = stage_report
+    succeeded = submitters - len(errors)
+    return {
+        'submitters': submitters,
+        'concurrency': concurrency,
+        'seconds': seconds,
+        'throughput': succeeded / seconds if seconds else 0.0,
+        'failures': len(errors),
+        'failure_rate': float(len(errors)) / submitters if submitters else 0.0,
+        'errors': errors[:10],
+        'stages': stages
+    }
+
+
+def format_report(report):
+    '''
+    Formats a load test report as text
+
+    Args:
+        report: Response from run_load_test()
+
+    Returns:
+        str: Summary line and per-stage table
+    '''
+    lines = [
+        "{submitters} submissions, concurrency {concurrency}: "
+        "{seconds:.2f}s, {throughput:.1f} submissions/s, "
+        "{failure_rate:.1%} failed".format(**report),
+        "",
+        "{:<20}{:>8}{:>10}{:>10}{:>10}{:>10}".format(
+            'stage', 'count', 'failed', 'p50', 'p95', 'p99')
+    ]
+    for stage in STAGES:
+        stats = report['stages'][stage]
+        percentiles = ['{:.4f}'.format(stats[p]) if stats[p] is not None
+                       else '-' for p in ('p50', 'p95', 'p99')]
+        lines.append("{:<20}{:>8}{:>10.1%}{:>10}{:>10}{:>10}".format(
+            stage, stats['count'], stats['failure_rate'], *percentiles))
+    return '\n'.join(lines)
+
+
+def build_parser():
+    """Builds the argument parser and returns the result."""
+    parser = argparse.ArgumentParser(
+        description="Load-test the submission path against a local "
+                    "Synapse and predictions gateway stand-in"
+    )
+    parser.add_argument("--submitters", type=int, default=100,
+                        help="Total simulated submissions (default: 100)")
+    parser.add_argument("--concurrency", type=int, default=20,
+                        help="Submissions in flight at once (default: 20)")
+    parser.add_argument("--latency", type=float, default=0.0,
+                        help="Seconds added to each stand-in response")
+    parser.add_argument("--error-rate", type=float, default=0.0,
+                        help="Probability of a 503 per stand-in response")
+    parser.add_argument("--rows", type=int, default=1000,
+                        help="Rows in the uploaded prediction file")
+    parser.add_argument("--pool-size", type=int,
+                        help="Connection pool size per host")
+    parser.add_argument("--seed", type=int, help="Random seed")
+    parser.add_argument("--json", metavar='FILE',
+                        help="Also write the report as JSON")
+    return parser
+
+
+def main():
+    args = build_parser().parse_args()
+    if args.pool_size is not None:
+        connections.configure(pool_size=args.pool_size)
+    report = run_load_test(
+        submitters=args.submitters, concurrency=args.concurrency,
+        latency=args.latency, error_rate=args.error_rate, rows=args.rows,
+        seed=args.seed
+    )
+    print(format_report(report))
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
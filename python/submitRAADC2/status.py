@@ -0,0 +1,278 @@
+'''
+Follows submissions until they are scored.  Statuses are read a page at
+a time from the evaluation's status listing, so one poll covers any
+number of submissions, and the poll interval backs off while nothing
+changes:
+
+    for status in SubmissionTracker(syn, ['9999', '10000']).changes():
+        print(format_status(status))
+
+or from the command line:
+
+    submitRAADC2-status 9999 10000 --timeout 3600
+'''
+import argparse
+import math
+import sys
+import time
+
+from submitRAADC2 import submit
+
+# SubmissionStatus states that scoring doesn't move a submission out of
+TERMINAL_STATUSES = ['ACCEPTED', 'CLOSED', 'INVALID', 'REJECTED', 'SCORED']
+# Seconds between polls: the first, the longest, and the growth factor
+# applied while no status changes
+MIN_INTERVAL = 5.0
+MAX_INTERVAL = 120.0
+BACKOFF = 1.5
+# Largest page the status listing returns
+PAGE_SIZE = 100
+
+
+def is_terminal(status):
+    '''
+    Checks if a submission is done being evaluated
+
+    Args:
+        status: SubmissionStatus dict
+
+    Returns:
+        bool: If the status is one of TERMINAL_STATUSES
+    '''
+    return status.get('status') in TERMINAL_STATUSES
+
+
+def format_status(status):
+    '''
+    Formats a status change for printing
+
+    Args:
+        status: SubmissionStatus dict
+
+    Returns:
+        str: Submission id and status
+    '''
+    return "Submission {subid}: {status}".format(
+        subid=status['id'], status=status['status']
+    )
+
+
+class SubmissionTracker(object):
+    '''
+    Tracks the status of submissions to an evaluation queue
+
+    Each poll pages through the evaluation's status listing, stopping
+    once every pending submission has been seen.  Submissions are
+    fetched one by one instead when that takes fewer calls than reading
+    the listing (a few submissions in a long queue), or when the user
+    can't read the listing.
+
+    Args:
+        syn: Synapse object
+        submission_ids: Submission ids to follow
+        evaluation_id: Evaluation queue the submissions were made to
+        min_interval: Seconds between polls after a status change
+        max_interval: Longest wait between polls
+        backoff: Factor the interval grows by after a poll without
+            changes
+        page_size: Statuses fetched per call from the listing
+    '''
+    def __init__(self, syn, submission_ids,
+                 evaluation_id=submit.EVALUATION_ID,
+                 min_interval=MIN_INTERVAL, max_interval=MAX_INTERVAL,
+                 backoff=BACKOFF, page_size=PAGE_SIZE):
+        self.syn = syn
+        self.evaluation_id = evaluation_id
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.backoff = backoff
+        self.page_size = page_size
+        self.statuses = dict.fromkeys(str(subid) for subid in submission_ids)
+        # Pages in the listing as of the last read, None before the first
+        self._pages = None
+        self._batched = True
+
+    @property
+    def pending(self):
+        '''Ids of the submissions not yet in a terminal state'''
+        return set(
+            subid for subid, status in self.statuses.items()
+            if status is None or not is_terminal(status)
+        )
+
+    @property
+    def done(self):
+        return not self.pending
+
+    def _read_listing(self, pending):
+        '''
+        Pages through the status listing until every pending submission
+        is found
+
+        Returns:
+            dict: SubmissionStatus by submission id
+        '''
+        found = {}
+        offset = 0
+        while True:
+            page = self.syn.restGET(
+                '/evaluation/{evalid}/submission/status/all'
+                '?limit={limit}&offset={offset}'
+                .format(evalid=self.evaluation_id, limit=self.page_size,
+                        offset=offset)
+            )
+            self._pages = max(1, math.ceil(
+                page['totalNumberOfResults'] / float(self.page_size)
+            ))
+            for status in page['results']:
+                if status['id'] in pending:
+                    found[status['id']] = status
+            offset += self.page_size
+            if (len(found) == len(pending) or not page['results'] or
+                    offset >= page['totalNumberOfResults']):
+                return found
+
+    def _fetch(self, pending):
+        '''
+        Fetches the status of the pending submissions
+
+        Returns:
+            dict: SubmissionStatus by submission id
+        '''
+        found = {}
+        if self._batched and (self._pages is None or
+                              len(pending) >= self._pages):
+            exceptions = submit._synapse_exceptions()
+            try:
+                found = self._read_listing(pending)
+            # Listing the whole queue needs more access than reading
+            # your own submissions
+            except exceptions.SynapseHTTPError:
+                self._batched = False
+        # Submissions missing from the listing, e.g. made after it was
+        # read, or all of them when the listing isn't used
+        for subid in sorted(pending - set(found)):
+            found[subid] = self.syn.restGET(
+                '/evaluation/submission/{subid}/status'.format(subid=subid)
+            )
+        return found
+
+    def poll(self):
+        '''
+        Fetches the status of the pending submissions once
+
+        Returns:
+            list: SubmissionStatus dicts whose status changed since the
+                  last poll, including every status seen for the first
+                  time
+        '''
+        pending = self.pending
+        if not pending:
+            return []
+        changed = []
+        for subid, status in sorted(self._fetch(pending).items()):
+            previous = self.statuses[subid]
+            if previous is None or previous['status'] != status['status']:
+                changed.append(status)
+            self.statuses[subid] = status
+        return changed
+
+    def changes(self, timeout=None):
+        '''
+        Polls until every submission reaches a terminal state, waiting
+        min_interval after a poll with changes and backing off towards
+        max_interval while nothing changes
+
+        Args:
+            timeout: Seconds to stop after, None to wait until done
+
+        Yields:
+            dict: SubmissionStatus, each time a submission's status changes
+        '''
+        deadline = None if timeout is None else time.monotonic() + timeout
+        interval = self.min_interval
+        while True:
+            changed = self.poll()
+            for status in changed:
+                yield status
+            if self.done:
+                return
+            if changed:
+                interval = self.min_interval
+            else:
+                interval = min(self.max_interval, interval * self.backoff)
+            wait = interval
+            if deadline is not None:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return
+                wait = min(wait, remaining)
+            time.sleep(wait)
+
+
+def wait_for_submissions(syn, submission_ids, callback=None, timeout=None,
+                         evaluation_id=submit.EVALUATION_ID,
+                         min_interval=MIN_INTERVAL,
+                         max_interval=MAX_INTERVAL):
+    '''
+    Waits for submissions to be scored
+
+    Args:
+        syn: Synapse object
+        submission_ids: Submission ids to follow
+        callback: Called with each SubmissionStatus as its status changes
+        timeout: Seconds to stop waiting after, None to wait until done
+        evaluation_id: Evaluation queue the submissions were made to
+        min_interval: Seconds between polls after a status change
+        max_interval: Longest wait between polls
+
+    Returns:
+        dict: Last SubmissionStatus seen by submission id; check
+              is_terminal() for submissions still pending at the timeout
+    '''
+    tracker = SubmissionTracker(
+        syn, submission_ids, evaluation_id=evaluation_id,
+        min_interval=min_interval, max_interval=max_interval
+    )
+    for status in tracker.changes(timeout=timeout):
+        if callback is not None:
+            callback(status)
+    return tracker.statuses
+
+
+def print_status(status):
+    print(format_status(status))
+
+
+def build_parser():
+    """Builds the argument parser and returns the result."""
+    parser = argparse.ArgumentParser(
+        description="Wait for RAAD2 Challenge submissions to be scored"
+    )
+    parser.add_argument("submission_ids", nargs='+', metavar='ID',
+                        help="Submission id(s) to follow")
+    parser.add_argument("--timeout", type=float,
+                        help="Seconds to stop waiting after "
+                             "(default: wait until scored)")
+    parser.add_argument("--max-interval", type=float, default=MAX_INTERVAL,
+                        help="Longest wait between polls in seconds "
+                             "(default: {})".format(MAX_INTERVAL))
+    return parser
+
+
+def main():
+    args = build_parser().parse_args()
+    syn = submit.synapse_login()
+    statuses = wait_for_submissions(
+        syn, args.submission_ids, callback=print_status,
+        timeout=args.timeout, max_interval=args.max_interval
+    )
+    pending = sorted(subid for subid, status in statuses.items()
+                     if status is None or not is_terminal(status))
+    if pending:
+        print("\nStill pending: {ids}".format(ids=", ".join(pending)))
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,23 +1,65 @@
 import os
 import sys
+import atexit
 import base64
-import requests
+import importlib
 import json
-import csv
 import argparse
+import shutil
+import tempfile
+import zlib
+from concurrent import futures
+
+from submitRAADC2 import bridge
+from submitRAADC2 import cache
+from submitRAADC2 import connections
+from submitRAADC2 import tracing
+# Re-exported, validation used to live in this module
+from submitRAADC2.validation import (
+    IncrementalValidator, PatientIdIndex, incremental_validator,
+    patient_id_index, patient_ids, validate_prediction_file,
+    validate_predictions
+)
 
-import pandas as pd
-import synapseclient
+# pandas, numpy, requests, synapseclient and rpy2 are imported on first
+# use so that `submitRAADC2 --help` and validate-only runs don't pay for
+# them (or for starting the embedded R interpreter).
+_r_package = None
 
-from synapseclient.exceptions import (SynapseError, 
-                                      SynapseNoCredentialsError, 
-                                      SynapseHTTPError)
-from rpy2.robjects.packages import importr
-from rpy2.robjects import pandas2ri
-from rpy2.rinterface import RRuntimeError
-from distutils.util import strtobool
 
-r_submitRAADC2 = importr('submitRAADC2')
+def _synapse_exceptions():
+    '''
+    Gets synapseclient.exceptions, importing synapseclient on first use
+
+    Returns:
+        module
+    '''
+    return importlib.import_module('synapseclient.exceptions')
+
+
+def r_package():
+    '''
+    Gets the submitRAADC2 R package handle, starting R and loading the
+    package the first time it is called
+
+    Returns:
+        rpy2 package object
+    '''
+    global _r_package
+    if _r_package is None:
+        importr = importlib.import_module('rpy2.robjects.packages').importr
+        _r_package = importr('submitRAADC2')
+    return _r_package
+
+
+def __getattr__(name):
+    # Keeps `submit.r_submitRAADC2` working without loading R at import
+    if name == 'r_submitRAADC2':
+        return r_package()
+    raise AttributeError(
+        "module {mod!r} has no attribute {name!r}"
+        .format(mod=__name__, name=name)
+    )
 
 
 def synapse_login():
@@ -28,11 +70,13 @@ def synapse_login():
     Returns:
         Synapse object
     '''
-    syn = synapseclient.Synapse()
-    email = r_submitRAADC2._user_email_prompt()[0]
+    synapseclient = importlib.import_module('synapseclient')
+    exceptions = _synapse_exceptions()
+    syn = synapseclient.Synapse(requests_session=connections.get_session())
+    email = r_package()._user_email_prompt()[0]
     try:
         syn.login(email=email)
-    except SynapseNoCredentialsError:
+    except exceptions.SynapseNoCredentialsError:
         syn = _new_login(syn, email)
     return syn
 
@@ -48,12 +92,13 @@ def _new_login(syn, email):
     Returns:
         Synapse Object
     '''
-    print(''.join(r_submitRAADC2._new_login_text()))
-    apikey = r_submitRAADC2._api_key_prompt()[0]
+    exceptions = _synapse_exceptions()
+    print(''.join(r_package()._new_login_text()))
+    apikey = r_package()._api_key_prompt()[0]
     try:
         syn.login(email, apiKey=apikey, rememberMe=True)
     except:
-        raise SynapseError(
+        raise exceptions.SynapseError(
             "Something went wrong with the attempt to log you "
             "into Synapse. Please doublecheck your email and API "
             "key combination."
@@ -61,19 +106,25 @@ def _new_login(syn, email):
     return(syn)
 
 
-def _lookup_team_info(syn, teamname):
+def _lookup_team_info(syn, teamname, team_index=None):
     '''
     Looks up team's prediction folder
 
     Args:
         syn: Synapse object
         teamname: Name of team
+        team_index: cache.TeamIndex to look the team up in before
+            falling back to a table query
 
     Returns:
         tuple (str, bool): team submission folder synapse id, if team is in advanced compute
     '''
-    challenge_team_table_synid = 'syn17096669'
+    challenge_team_table_synid = cache.CHALLENGE_TEAM_TABLE
     teamname = teamname.replace('RAAD2 ', '', 1)
+    if team_index is not None:
+        team = team_index.lookup(syn, teamname)
+        if team is not None:
+            return team
     challenge_team_table = syn.tableQuery(
         "select folderId, advancedCompute from {synid} where teamName = '{teamname}'"
         .format(synid=challenge_team_table_synid, teamname=teamname)
@@ -85,13 +136,51 @@ def _lookup_team_info(syn, teamname):
     )
 
 
-def get_team_info(syn, ownerid):
+EVALUATION_ID = '9614112'
+
+# Upper bound on concurrent getTeam calls per get_team_info call
+TEAM_LOOKUP_WORKERS = 8
+
+
+def _is_raad2_team(teamname):
     '''
-    Get team information
+    Checks if a team is a RAAD2 participant team
+
+    Args:
+        teamname: Name of team
+
+    Returns:
+        bool: If the team is a RAAD2 participant team
+    '''
+    return (
+        'Participants' not in teamname and 
+        'Admin' not in teamname and 
+        teamname.startswith("RAAD2 ")
+    )
+
+
+def _no_raad2_team_error():
+    exceptions = _synapse_exceptions()
+    return exceptions.SynapseError(
+        "This Synapse account does not appear to be part of any "
+        "RAAD2 Challenge teams. Did you mean to use a different "
+        "account? Make sure to use the account associated with "
+        "your @gene.com or @roche.com email address."
+    )
+
+
+def get_team_info(syn, ownerid, max_workers=TEAM_LOOKUP_WORKERS,
+                  team_index=None):
+    '''
+    Get team information.  The user's teams are resolved concurrently and
+    the scan stops at the first RAAD2 team found, whose prediction
+    folder lookup starts right away.
 
     Args:
         syn: Synapse object
         ownerid: Synapse userid
+        max_workers: Maximum number of concurrent team lookups
+        team_index: cache.TeamIndex used for the folder lookup
 
     Returns:
         dict: team id, team name, folder id, if advanced compute
@@ -99,27 +188,38 @@ def get_team_info(syn, ownerid):
     owner_teams = syn.restGET('/user/{id}/team/id'.format(id=ownerid))
     owner_team_ids = owner_teams['teamIds']
 
-    for teamid in owner_team_ids:
-        team_object = syn.getTeam(teamid)
-        teamname = team_object['name']
-        if 'Participants' not in teamname and 'Admin' not in teamname and teamname.startswith("RAAD2 "):
-            raad2_team = team_object
-            break
-        else:
-            raad2_team = None
-    
-    try: 
-        team_folder_id, advanced_compute = _lookup_team_info(
-            syn, 
-            raad2_team['name']
-        )
-    except TypeError:
-        raise SynapseError(
-            "This Synapse account does not appear to be part of any "
-            "RAAD2 Challenge teams. Did you mean to use a different "
-            "account? Make sure to use the account associated with "
-            "your @gene.com or @roche.com email address."
-        )
+    raad2_team = None
+    executor = futures.ThreadPoolExecutor(max_workers=max_workers)
+    try:
+        team_order = {
+            executor.submit(syn.getTeam, teamid): order
+            for order, teamid in enumerate(owner_team_ids)
+        }
+        pending = set(team_order)
+        while pending and raad2_team is None:
+            done, pending = futures.wait(
+                pending, return_when=futures.FIRST_COMPLETED
+            )
+            # Keep the original team order when several finish together
+            for future in sorted(done, key=team_order.get):
+                team_object = future.result()
+                if _is_raad2_team(team_object['name']):
+                    raad2_team = team_object
+                    break
+        for future in pending:
+            future.cancel()
+    finally:
+        # Lookups already in flight finish in the background rather
+        # than holding up the folder query
+        executor.shutdown(wait=False)
+
+    if raad2_team is None:
+        raise _no_raad2_team_error()
+    team_folder_id, advanced_compute = _lookup_team_info(
+        syn, 
+        raad2_team['name'],
+        team_index=team_index
+    )
     return {
         'team_id': raad2_team['id'], 
         'team_name': raad2_team['name'], 
@@ -155,14 +255,15 @@ def _get_eligibility_data(syn, teamid):
               teamEligibility, membersEligibility, and 
               eligibilityStateHash
     '''
-    evalid = '9614112'
+    evalid = EVALUATION_ID
+    exceptions = _synapse_exceptions()
     try:
         eligibility_data = syn.restGET(
             '/evaluation/{evalId}/team/{id}/submissionEligibility'
             .format(evalId = evalid, id = teamid)
         )
-    except SynapseHTTPError:
-        raise SynapseError(
+    except exceptions.SynapseHTTPError:
+        raise exceptions.SynapseError(
             "The RAAD2 Challenge submission queues are not "
             "currently open. Teams can submit between February "
             "19th and March 15th."
@@ -170,24 +271,32 @@ def _get_eligibility_data(syn, teamid):
     return eligibility_data
 
 
-def _get_owner_eligibility(eligibility_data, ownerid):
+def _get_owner_eligibility(eligibility_data, ownerid, members=None):
     '''
     Gets owner eligibility
 
     Args:
         eligibility_data: Response from _get_eligibility_data()
         ownerid: Synapse user id
+        members: membersEligibility indexed by principalId, see
+                 cache.index_members(); built from eligibility_data
+                 if not given
 
     Returns:
         dict: Eligbility of member dict containing isEligible, 
               isRegistered, isQuotaFilled, principalId, and 
               hasConflictingSubmission
     '''
-    member_eligible = filter(
-        lambda member: member['principalId'] == int(ownerid), 
-        eligibility_data['membersEligibility']
-    )
-    return list(member_eligible)[0]
+    if members is None:
+        members = cache.index_members(eligibility_data)
+    try:
+        return members[int(ownerid)]
+    except KeyError:
+        exceptions = _synapse_exceptions()
+        raise exceptions.SynapseError(
+            "This Synapse account is not a member of the RAAD2 Challenge "
+            "team it is submitting for."
+        )
 
 
 def _team_eligibility_message(team_eligibility, teamname):
@@ -262,20 +371,32 @@ def _owner_eligibility_message(owner_eligibility, advanced_compute):
     return(messages)
 
 
-def check_eligibility(syn, team_info, ownerid):
+def check_eligibility(syn, team_info, ownerid, eligibility_cache=None):
     '''
     Check eligibility of the team and user submitting for the team
 
     Args:
         team_info:  Response from get_team_info()
         ownerid: Synapse user id
+        eligibility_cache: cache.EligibilityCache to serve the
+                           eligibility response from
 
     Returns:
         bool: If user and team is eligible for submission
     '''
-    eligibility_data = _get_eligibility_data(syn, team_info['team_id'])
+    teamid = team_info['team_id']
+    if eligibility_cache is None:
+        eligibility_data = _get_eligibility_data(syn, teamid)
+        members = None
+    else:
+        eligibility_data, members = eligibility_cache.get(
+            teamid, EVALUATION_ID,
+            lambda: _get_eligibility_data(syn, teamid)
+        )
     team_eligibility = eligibility_data['teamEligibility']  
-    owner_eligibility = _get_owner_eligibility(eligibility_data, ownerid)
+    owner_eligibility = _get_owner_eligibility(
+        eligibility_data, ownerid, members=members
+    )
 
     messages = _team_eligibility_message(team_eligibility, team_info['team_name'])
     [print(message) for message in messages]
@@ -286,13 +407,207 @@ def check_eligibility(syn, team_info, ownerid):
 
 
 def get_service_account():
+    '''
+    Log in the submission service account, reusing the pooled login
+    when one exists for the same credentials
+
+    Returns:
+        Synapse object
+    '''
     email = os.environ['EMAIL']
     apikey = os.environ['APIKEY']
-    syn = synapseclient.login(email, apiKey=apikey)
+    syn = connections.service_account_login(email, apikey)
     return syn
 
 
-def upload_predictions(submission_filepath, folder_id, direct=False):
+PREDICTIONS_URL = 'https://gja3h20usl.execute-api.us-east-1.amazonaws.com/v1/predictions'
+
+# Multiple of 3 so each chunk base64-encodes without padding
+UPLOAD_CHUNK_SIZE = 3 * 2**16
+
+
+class _PredictionPayload(object):
+    '''
+    JSON body for the predictions gateway, base64-encoding the submission
+    file chunk by chunk as it is sent.  The encoded length is known up
+    front, so the request still carries a Content-Length header and is
+    byte-for-byte the same body as `requests.post(url, json=data)`.
+
+    Args:
+        submission_filepath: File path of submission
+        folder_id: Synapse id of Team submission folder
+        chunk_size: Bytes read from the file per chunk, multiple of 3
+    '''
+    def __init__(self, submission_filepath, folder_id,
+                 chunk_size=UPLOAD_CHUNK_SIZE):
+        if chunk_size % 3:
+            raise ValueError("chunk_size must be a multiple of 3")
+        self.submission_filepath = submission_filepath
+        self.chunk_size = chunk_size
+        body = json.dumps({'submission_folder': folder_id, 'data': ''})
+        self.prefix = body[:-2].encode('utf-8')
+        self.suffix = body[-2:].encode('utf-8')
+        file_size = os.path.getsize(submission_filepath)
+        self.encoded_size = 4 * ((file_size + 2) // 3)
+
+    def __len__(self):
+        return len(self.prefix) + self.encoded_size + len(self.suffix)
+
+    def __iter__(self):
+        yield self.prefix
+        with open(self.submission_filepath, 'rb') as data_file:
+            chunk = data_file.read(self.chunk_size)
+            while chunk:
+                yield base64.b64encode(chunk)
+                chunk = data_file.read(self.chunk_size)
+        yield self.suffix
+
+
+# Default compression level per Content-Encoding
+COMPRESSION_LEVELS = {'gzip': 6, 'zstd': 3}
+# Gateway URLs that rejected a compressed upload
+_uncompressed_gateways = set()
+
+
+def _compressor(compression, level):
+    '''
+    Gets a streaming compressor for a Content-Encoding, falling back to
+    gzip when the zstandard package isn't installed
+
+    Args:
+        compression: 'gzip' or 'zstd'
+        level: Compression level, None for the default
+
+    Returns:
+        tuple (str, compressobj): Content-Encoding used, object with
+        compress() and flush()
+    '''
+    if compression not in COMPRESSION_LEVELS:
+        raise ValueError(
+            "Unknown compression '{compression}', expected one of: {known}"
+            .format(compression=compression,
+                    known=", ".join(sorted(COMPRESSION_LEVELS)))
+        )
+    if compression == 'zstd':
+        try:
+            zstandard = importlib.import_module('zstandard')
+        except ImportError:
+            compression = 'gzip'
+            level = None
+        else:
+            if level is None:
+                level = COMPRESSION_LEVELS['zstd']
+            return 'zstd', zstandard.ZstdCompressor(level=level).compressobj()
+    if level is None:
+        level = COMPRESSION_LEVELS['gzip']
+    # wbits 31 writes a gzip header and trailer
+    return 'gzip', zlib.compressobj(level, zlib.DEFLATED, 31)
+
+
+def _compress_payload(payload, compression, level):
+    '''
+    Compresses a gateway request body into a temporary file, so memory
+    use stays bounded and the compressed length is known before sending
+
+    Args:
+        payload: Iterable of body chunks, e.g. _PredictionPayload
+        compression: 'gzip' or 'zstd'
+        level: Compression level, None for the default
+
+    Returns:
+        tuple (str, file): Content-Encoding used, compressed body file
+        positioned at the start
+    '''
+    content_encoding, compressor = _compressor(compression, level)
+    body = tempfile.TemporaryFile()
+    for chunk in payload:
+        body.write(compressor.compress(chunk))
+    body.write(compressor.flush())
+    body.seek(0)
+    return content_encoding, body
+
+
+def _gateway_entity(res):
+    '''
+    Reads the File Entity from a predictions gateway response
+
+    Args:
+        res: requests.Response from the gateway
+
+    Returns:
+        Synapse File Entity
+
+    Raises:
+        SynapseHTTPError: If the gateway didn't accept the upload
+    '''
+    if not 200 <= res.status_code < 300:
+        exceptions = _synapse_exceptions()
+        raise exceptions.SynapseHTTPError(
+            "Prediction upload failed with status {status}: {body}"
+            .format(status=res.status_code, body=res.text[:200]),
+            response=res
+        )
+    return json.loads(res.content)
+
+
+def _rejects_encoding(res):
+    '''
+    Checks if a gateway response rejects the Content-Encoding itself,
+    rather than failing for another reason
+
+    Args:
+        res: requests.Response from the gateway
+
+    Returns:
+        bool: If the response is a 415, or a 400 naming Content-Encoding
+    '''
+    if res.status_code == 415:
+        return True
+    return (res.status_code == 400 and
+            'content-encoding' in res.text.lower())
+
+
+def _post_compressed(submission_filepath, folder_id, compression, level,
+                     url=PREDICTIONS_URL):
+    '''
+    Posts a compressed upload to the predictions gateway
+
+    Args:
+        submission_filepath: File path of submission
+        folder_id: Synapse id of Team submission folder
+        compression: 'gzip' or 'zstd'
+        level: Compression level, None for the default
+        url: Predictions gateway URL
+
+    Returns:
+        Synapse File Entity, or None if the gateway rejected the encoding
+        and the file should be sent again uncompressed
+
+    Raises:
+        SynapseHTTPError: If the upload failed for another reason
+    '''
+    content_encoding, body = _compress_payload(
+        _PredictionPayload(submission_filepath, folder_id), compression, level
+    )
+    tracing.add_bytes(os.fstat(body.fileno()).st_size)
+    with body:
+        res = connections.get_session().post(
+            url,
+            data=body,
+            headers={'Content-Type': 'application/json',
+                     'Content-Encoding': content_encoding}
+        )
+    if _rejects_encoding(res):
+        _uncompressed_gateways.add(url)
+        return None
+    # Other failures aren't retried, since the gateway may have stored
+    # the file before failing (e.g. timing out)
+    return _gateway_entity(res)
+
+
+def upload_predictions(submission_filepath, folder_id, direct=False,
+                       stream=True, compression=None, compression_level=None,
+                       url=None):
     '''
     Upload prediciton file to synapse
 
@@ -300,28 +615,299 @@ def upload_predictions(submission_filepath, folder_id, direct=False):
         syn: Synapse object
         submission_filepath: File path of submission
         folder_id: Synapse id of Team submission folder
+        stream: If 'True', encode and send the file in chunks so memory
+            use doesn't grow with file size
+        compression: 'gzip' or 'zstd' to compress the request body with a
+            Content-Encoding header.  If the gateway rejects the
+            encoding, the file is sent again uncompressed and later
+            uploads to that gateway skip compression.
+        compression_level: Compression level, defaults to
+            COMPRESSION_LEVELS for the encoding
+        url: Predictions gateway URL, defaults to PREDICTIONS_URL
 
     Returns:
         Synapse File Entity
+
+    Raises:
+        SynapseHTTPError: If the gateway didn't accept the upload
     '''
+    if url is None:
+        url = PREDICTIONS_URL
+    if (not direct and compression is not None and
+            url not in _uncompressed_gateways):
+        entity = _post_compressed(
+            submission_filepath, folder_id, compression, compression_level,
+            url=url
+        )
+        if entity is not None:
+            return entity
     if direct:
         syn_service = get_service_account()
+        synapseclient = importlib.import_module('synapseclient')
         file_ent = synapseclient.File(submission_filepath, parentId=folder_id)
-        file_ent = syn.store(file_ent)
+        file_ent = syn_service.store(file_ent)
         entity = file_ent
+    elif stream:
+        payload = _PredictionPayload(submission_filepath, folder_id)
+        tracing.add_bytes(len(payload))
+        res = connections.get_session().post(
+            url,
+            data=payload,
+            headers={'Content-Type': 'application/json'}
+        )
+        entity = _gateway_entity(res)
     else:
         with open(submission_filepath, 'rb') as data_file:
             prediction_data = data_file.read()
             encoded_prediction_data = base64.b64encode(prediction_data)
-        url = 'https://gja3h20usl.execute-api.us-east-1.amazonaws.com/v1/predictions'
         data = {'submission_folder': folder_id,
                 'data': encoded_prediction_data.decode('utf-8')}
-        res = requests.post(url, json=data)
-        entity = json.loads(res.content)
+        tracing.add_bytes(len(encoded_prediction_data))
+        res = connections.get_session().post(url, json=data)
+        entity = _gateway_entity(res)
     return entity
 
 
-def submit_raadc2(predictiondf, validate_only=False, dry_run=False):
+# 'manifest' reuses uploads recorded in the local manifest, 'folder' also
+# looks for a file with the same MD5 in the team folder
+DEDUPE_MODES = ['off', 'manifest', 'folder']
+
+
+def _find_folder_file(syn, folder_id, md5):
+    '''
+    Looks for a file with the given content in a team folder
+
+    Args:
+        syn: Synapse object
+        folder_id: Synapse id of Team submission folder
+        md5: Submission file MD5
+
+    Returns:
+        dict: id and versionNumber of the matching file, or None
+    '''
+    exceptions = _synapse_exceptions()
+    try:
+        for child in syn.getChildren(folder_id, includeTypes=['file']):
+            file_handles = syn.restGET(
+                '/entity/{id}/version/{version}/filehandles'
+                .format(id=child['id'], version=child['versionNumber'])
+            )
+            for file_handle in file_handles['list']:
+                if file_handle.get('contentMd5') == md5:
+                    return {'id': child['id'],
+                            'versionNumber': child['versionNumber']}
+    # The folder may not be readable by the submitter
+    except exceptions.SynapseHTTPError:
+        pass
+    return None
+
+
+def _find_uploaded(syn, folder_id, md5, manifest, dedupe):
+    '''
+    Finds an earlier upload of the same submission file
+
+    Returns:
+        dict: id and versionNumber of the uploaded file, or None
+    '''
+    if dedupe == 'off':
+        return None
+    prediction_ent = manifest.lookup(folder_id, md5)
+    if prediction_ent is None and dedupe == 'folder':
+        prediction_ent = _find_folder_file(syn, folder_id, md5)
+        if prediction_ent is not None:
+            manifest.add(folder_id, md5, prediction_ent)
+    return prediction_ent
+
+
+def _store_submission(syn, team_info, submission_filepath, 
+                      eligibility_cache=None, verbose=True, compression=None,
+                      dedupe='manifest', upload_manifest=None,
+                      predictions_url=None):
+    '''
+    Uploads a submission file to the team's folder and submits it to the
+    challenge evaluation queue.  If the same file content was uploaded
+    to the folder before, that entity is submitted instead of uploading
+    the file again.
+
+    Args:
+        syn: Synapse object
+        team_info: Response from get_team_info()
+        submission_filepath: File path of submission
+        eligibility_cache: cache.EligibilityCache to invalidate once the
+                           submission is made
+        verbose: If 'True', print progress messages
+        compression: Upload Content-Encoding, see upload_predictions()
+        dedupe: One of DEDUPE_MODES
+        upload_manifest: cache.UploadManifest of earlier uploads,
+                         defaults to cache.default_upload_manifest()
+        predictions_url: Predictions gateway URL, see upload_predictions()
+
+    Returns:
+        tuple (dict, dict): Synapse File Entity, Submission object
+    '''
+    exceptions = _synapse_exceptions()
+    if upload_manifest is None:
+        upload_manifest = cache.default_upload_manifest()
+    folder_id = team_info['folder_id']
+    md5 = None
+    prediction_ent = None
+    if dedupe != 'off':
+        with tracing.span('hash'):
+            md5 = cache.file_md5(submission_filepath)
+        prediction_ent = _find_uploaded(
+            syn, folder_id, md5, upload_manifest, dedupe
+        )
+    if prediction_ent is not None:
+        try:
+            # Only the id and version are recorded, and syn.submit needs
+            # the whole entity (including its current etag)
+            prediction_ent = syn.restGET(
+                '/entity/{id}/version/{version}'
+                .format(id=prediction_ent['id'],
+                        version=prediction_ent['versionNumber'])
+            )
+        # The recorded entity may have been deleted, so forget it and
+        # upload the file again
+        except exceptions.SynapseHTTPError:
+            upload_manifest.remove(folder_id, md5)
+            prediction_ent = None
+        else:
+            if verbose:
+                print("\nReusing uploaded prediction file {entityid} "
+                      "[version: {version}]..."
+                      .format(entityid=prediction_ent['id'],
+                              version=prediction_ent['versionNumber']))
+                print("\nSubmitting prediction to challenge evaluation "
+                      "queue...")
+            with tracing.span('submit', reused=True):
+                submission_object = syn.submit(
+                    evaluation=EVALUATION_ID,
+                    entity=prediction_ent,
+                    team=team_info['team_name']
+                )
+            if eligibility_cache is not None:
+                eligibility_cache.invalidate(team_info['team_id'],
+                                             EVALUATION_ID)
+            return prediction_ent, submission_object
+
+    if verbose:
+        print("\nUploading prediciton file to Synapse...")
+    # This parameter determines if the submission file is 
+    # directly uploaded by a service account
+    direct = False
+    with tracing.span('upload', compression=compression):
+        prediction_ent = upload_predictions(
+            submission_filepath, 
+            folder_id, 
+            direct=direct,
+            compression=compression,
+            url=predictions_url
+        )
+    if md5 is not None and 'id' in prediction_ent:
+        upload_manifest.add(folder_id, md5, prediction_ent)
+    if verbose:
+        print("\nSubmitting prediction to challenge evaluation queue...")
+    with tracing.span('submit'):
+        submission_object = syn.submit(
+            evaluation=EVALUATION_ID,
+            entity=prediction_ent,
+            team=team_info['team_name']
+        )
+    # The submission counts against the team's quota
+    if eligibility_cache is not None:
+        eligibility_cache.invalidate(team_info['team_id'], EVALUATION_ID)
+    return prediction_ent, submission_object
+
+
+# Also used as the file extension
+SUBMISSION_FORMATS = ['csv', 'csv.gz', 'parquet', 'feather']
+# Formats the challenge scorer reads; the others are only written locally
+SCORED_FORMATS = ['csv']
+
+
+def check_submission_format(file_format, dry_run=False):
+    '''
+    Checks a submission file format can be submitted to the challenge
+
+    Args:
+        file_format: One of SUBMISSION_FORMATS
+        dry_run: If 'True', the file is only written locally
+
+    Raises:
+        ValueError: If the scorer can't read the format and the file
+            would be submitted
+    '''
+    if file_format not in SCORED_FORMATS and not dry_run:
+        raise ValueError(
+            "'{fmt}' submission files can't be scored by the challenge. "
+            "Submit as csv, or use '{fmt}' with a dry run to only write "
+            "the file locally.".format(fmt=file_format)
+        )
+
+_submission_dir = None
+
+
+def _get_submission_dir():
+    '''
+    Gets a temporary directory for submission files, removed when the
+    process exits (like R's tempdir())
+
+    Returns:
+        str: Directory path
+    '''
+    global _submission_dir
+    if _submission_dir is None:
+        _submission_dir = tempfile.mkdtemp(prefix='submitRAADC2-')
+        atexit.register(shutil.rmtree, _submission_dir, True)
+    return _submission_dir
+
+
+def write_submission(predictiondf, submission_filepath=None, file_format='csv'):
+    '''
+    Writes a validated prediction dataframe to a submission file without
+    going through R
+
+    Args:
+        predictiondf: Prediction dataframe
+        submission_filepath: File path to write, defaults to
+            prediction.<extension> in a per-process temporary directory
+        file_format: 'csv', 'csv.gz' (gzip-compressed CSV), or the typed
+            columnar 'parquet' or 'feather' formats (these need pyarrow)
+
+    Returns:
+        str: File path of submission
+    '''
+    if file_format not in SUBMISSION_FORMATS:
+        raise ValueError(
+            "Unknown submission format '{fmt}', expected one of: {formats}"
+            .format(fmt=file_format, formats=", ".join(SUBMISSION_FORMATS))
+        )
+    if submission_filepath is None:
+        submission_filepath = os.path.join(
+            _get_submission_dir(),
+            'prediction.{ext}'.format(ext=file_format)
+        )
+    if file_format == 'csv':
+        predictiondf.to_csv(submission_filepath, index=False)
+    elif file_format == 'csv.gz':
+        predictiondf.to_csv(submission_filepath, index=False,
+                            compression='gzip')
+    else:
+        # Categorical columns keep the repeated strings as small integer
+        # codes in the columnar formats
+        columnardf = predictiondf.astype({
+            'PatientID': 'category', 'RespondingSubgroup': 'category'
+        }).reset_index(drop=True)
+        if file_format == 'parquet':
+            columnardf.to_parquet(submission_filepath, index=False)
+        else:
+            columnardf.to_feather(submission_filepath)
+    return submission_filepath
+
+
+def submit_raadc2(predictiondf, validate_only=False, dry_run=False,
+                  engine='python', file_format='csv', compression=None,
+                  dedupe='manifest', wait=False, incremental=False):
     '''
     Submitting RAAD2 prediction files
 
@@ -331,63 +917,113 @@ def submit_raadc2(predictiondf, validate_only=False, dry_run=False):
             but don't submit to the challenge.
         dry_run: If ‘TRUE', execute submission steps, but don’t store
              any data in Synapse. 
+        engine: Validation engine, 'python' (default) runs the native
+            pandas checks, 'r' calls the R package's validate_predictions
+            and writes the submission file with R
+        file_format: Submission file format for the python engine, see
+            write_submission(); formats other than SCORED_FORMATS need
+            dry_run
+        compression: 'gzip' or 'zstd' to compress the upload, see
+            upload_predictions()
+        dedupe: Reuse an earlier upload of identical file content, one
+            of DEDUPE_MODES
+        wait: If 'True', wait for the submission to be scored, printing
+            its status as it changes
+        incremental: If 'True', validate with the process-wide
+            incremental_validator(), so validating the frame again after
+            editing a few rows only re-checks those rows.  The validator
+            keeps a copy of the frame's columns (about as much memory as
+            the frame) until the frame is submitted.
     '''
-    pandas2ri.activate()
+    if not validate_only and engine != 'r':
+        check_submission_format(file_format, dry_run=dry_run)
     print("Running checks to validate date frame format...\n")
+    validation_errors = (ValueError,)
     try:
-        r_submitRAADC2.validate_predictions(
-            pandas2ri.py2ri(predictiondf)
-        )
+        if engine == 'r':
+            validation_errors += (
+                importlib.import_module('rpy2.rinterface').RRuntimeError,
+            )
+            with tracing.span('r_startup'):
+                r_package()
+            # Converted once and reused for _create_submission
+            bridge_method = bridge.bridge_method()
+            with tracing.span('r_bridge', method=bridge_method):
+                r_predictiondf = bridge.to_r(predictiondf,
+                                             method=bridge_method)
+            with tracing.span('validate', engine=engine):
+                r_package().validate_predictions(r_predictiondf)
+        else:
+            with tracing.span('validate', engine=engine):
+                if incremental:
+                    incremental_validator().validate(predictiondf)
+                else:
+                    validate_predictions(predictiondf)
         print("All checks passed.")
     
     # This is done so the traceback isn't shown
-    except RRuntimeError as e:
+    except validation_errors as e:
         print(e)
         sys.exit(1)
 
     if not validate_only:
-        syn = synapse_login()
-        ownerid = _lookup_owner_id(syn)
-        team_info = get_team_info(syn, ownerid)
+        if incremental:
+            # The frame is being submitted, so the validator's copies of
+            # it aren't needed anymore
+            incremental_validator().reset()
+        exceptions = _synapse_exceptions()
+        with tracing.span('r_startup'):
+            r_submitRAADC2 = r_package()
+        with tracing.span('synapse_login'):
+            syn = synapse_login()
+            ownerid = _lookup_owner_id(syn)
+        with tracing.span('get_team_info'):
+            team_info = get_team_info(
+                syn, ownerid, team_index=cache.default_team_index()
+            )
         print("\nChecking ability to submit...")
-        is_eligible = check_eligibility(syn, team_info, ownerid)
+        eligibility_cache = cache.default_eligibility_cache()
+        with tracing.span('check_eligibility'):
+            is_eligible = check_eligibility(
+                syn, team_info, ownerid, eligibility_cache=eligibility_cache
+            )
         if not is_eligible:
             print("")
-            raise SynapseError(
+            raise exceptions.SynapseError(
                 "\nExiting submission attempt.\n"
                 "Visit the RAAD2 Challenge page in Synapse "
                 "to track results in the leaderboard."
             )
 
-        confirm_submission = r_submitRAADC2._confirm_prompt()
+        with tracing.span('confirm_prompt'):
+            confirm_submission = r_submitRAADC2._confirm_prompt()
         if confirm_submission[0] in [0,2]:
             print("")
-            raise SynapseError(
+            raise exceptions.SynapseError(
                 "\nExiting submission attempt.\n"
                 "Run `submit_raadc2()` to try again when ready."
             )
         else:
-            print("\nWriting data to local CSV file...")
-            submission_filename = r_submitRAADC2._create_submission(
-                pandas2ri.py2ri(predictiondf)
-            )
-            pandas2ri.deactivate()
+            print("\nWriting data to local {fmt} file..."
+                  .format(fmt='csv' if engine == 'r' else file_format))
+            with tracing.span('write_submission', format=file_format) as span:
+                if engine == 'r':
+                    submission_filename = r_submitRAADC2._create_submission(
+                        r_predictiondf
+                    )
+                else:
+                    submission_filename = [
+                        write_submission(predictiondf, file_format=file_format)
+                    ]
+                if span is not None:
+                    span.add_bytes(os.path.getsize(submission_filename[0]))
 
             if not dry_run:
-                print("\nUploading prediciton file to Synapse...")
-                # This parameter determines if the submission file is 
-                # directly uploaded by a service account
-                direct = False
-                prediction_ent = upload_predictions(
-                    submission_filename[0], 
-                    team_info['folder_id'], 
-                    direct=direct
-                )
-                print("\nSubmitting prediction to challenge evaluation queue...")
-                submission_object = syn.submit(
-                    evaluation='9614112',
-                    entity=prediction_ent,
-                    team=team_info['team_name']
+                prediction_ent, submission_object = _store_submission(
+                    syn, team_info, submission_filename[0], 
+                    eligibility_cache=eligibility_cache,
+                    compression=compression,
+                    dedupe=dedupe
                 )
             else:
                 prediction_ent = {
@@ -411,31 +1047,134 @@ def submit_raadc2(predictiondf, validate_only=False, dry_run=False):
             )
             print(msg)
 
-
-data_path = os.path.join(
-    os.path.dirname(os.path.realpath(__file__)),
-    'data'
-)
-def patient_ids():
-    with open(os.path.join(data_path, 'patient_ids.csv')) as f:
-      reader = csv.reader(f)
-      patient_ids = [l[0] for l in reader]
-    return patient_ids
+            if wait and not dry_run:
+                from submitRAADC2 import status
+                print("\nWaiting for the submission to be scored...")
+                status.wait_for_submissions(
+                    syn, [submission_object['id']],
+                    callback=status.print_status
+                )
 
 
 def build_parser():
     """Builds the argument parser and returns the result."""
     parser = argparse.ArgumentParser()
-    parser.add_argument("prediction", help="Prediction filepath")
+    parser.add_argument("prediction", nargs='+',
+                        help="Prediction filepath(s), directories or glob "
+                             "pattern(s); more than one file runs in batch "
+                             "mode")
     parser.add_argument("-v", "--validate_only", 
                         help="Validate file only", action='store_true')
+    parser.add_argument("--engine", choices=['python', 'r'], default='python',
+                        help="Validation engine (default: python)")
+    parser.add_argument("--format", dest='file_format',
+                        choices=SUBMISSION_FORMATS, default='csv',
+                        help="Submission file format (default: csv); the "
+                             "challenge only scores csv, so other formats "
+                             "need --dry-run")
+    parser.add_argument("--dry-run", action='store_true',
+                        help="Write the submission file locally, but don't "
+                             "store any data in Synapse")
+    parser.add_argument("--compression", choices=sorted(COMPRESSION_LEVELS),
+                        help="Compress the upload to the predictions gateway")
+    parser.add_argument("--dedupe", choices=DEDUPE_MODES, default='manifest',
+                        help="Reuse an earlier upload of the same file "
+                             "content: from the local manifest, or also by "
+                             "MD5 in the team folder (default: manifest)")
+    parser.add_argument("--profile", nargs='?', const='', metavar='FILE',
+                        help="Print a per-stage timing breakdown; with FILE, "
+                             "also write it as a trace-event JSON file")
+    parser.add_argument("-j", "--jobs", type=int,
+                        help="Files validated and uploaded concurrently in "
+                             "batch mode (default: 4, or one process per "
+                             "CPU with -v)")
+    parser.add_argument("--wait", action='store_true',
+                        help="After submitting, wait for the submission(s) "
+                             "to be scored")
     return parser
 
 
+def _run(args):
+    '''
+    Runs a validation or submission for parsed command line arguments
+
+    Args:
+        args: Response from build_parser().parse_args()
+    '''
+    from submitRAADC2 import batch
+    try:
+        if not args.validate_only:
+            check_submission_format(args.file_format, dry_run=args.dry_run)
+        prediction_paths = batch.expand_paths(args.prediction)
+    except ValueError as e:
+        print(e)
+        sys.exit(1)
+    if (len(prediction_paths) == 1 and prediction_paths == args.prediction and
+            args.validate_only and args.engine == 'python'):
+        # Validate in chunks without loading the whole file
+        print("Running checks to validate date frame format...\n")
+        try:
+            with tracing.span('validate', engine='python-chunked'):
+                validate_prediction_file(prediction_paths[0])
+        except ValueError as e:
+            print(e)
+            sys.exit(1)
+        print("All checks passed.")
+    elif len(prediction_paths) == 1 and prediction_paths == args.prediction:
+        pd = importlib.import_module('pandas')
+        with tracing.span('read_csv'):
+            predictiondf = pd.read_csv(prediction_paths[0])
+        submit_raadc2(predictiondf, validate_only=args.validate_only,
+                      dry_run=args.dry_run, engine=args.engine,
+                      file_format=args.file_format,
+                      compression=args.compression, dedupe=args.dedupe,
+                      wait=args.wait)
+    elif args.validate_only:
+        print("Running checks to validate {count} prediction file(s)...\n"
+              .format(count=len(prediction_paths)))
+        with tracing.span('validate', engine='python-parallel'):
+            report = batch.validate_prediction_files(
+                prediction_paths, max_workers=args.jobs
+            )
+        print(batch.format_validation_report(report))
+        if any(result['status'] == 'fail' for result in report):
+            sys.exit(1)
+    else:
+        # Logged in here to reuse the session for waiting
+        syn = synapse_login() if args.wait and not args.dry_run else None
+        report = batch.submit_raadc2_batch(
+            prediction_paths, validate_only=args.validate_only,
+            dry_run=args.dry_run, max_workers=args.jobs, syn=syn,
+            file_format=args.file_format, compression=args.compression,
+            dedupe=args.dedupe
+        )
+        print(batch.format_report(report))
+        submission_ids = [result['submission_id'] for result in report
+                          if result['submission_id'] is not None]
+        if syn is not None and submission_ids:
+            from submitRAADC2 import status
+            print("\nWaiting for {count} submission(s) to be scored..."
+                  .format(count=len(submission_ids)))
+            status.wait_for_submissions(syn, submission_ids,
+                                        callback=status.print_status)
+        if any(result['error'] for result in report):
+            sys.exit(1)
+
+
 def main():
     args = build_parser().parse_args()
-    predictiondf = pd.read_csv(args.prediction)
-    submit_raadc2(predictiondf, validate_only=args.validate_only)
+    if args.profile is None:
+        _run(args)
+        return
+    profiler = tracing.Profiler()
+    try:
+        with tracing.profile(profiler):
+            _run(args)
+    finally:
+        print("\n" + profiler.summary())
+        if args.profile:
+            profiler.write_trace(args.profile)
+            print("\nTrace written to {path}".format(path=args.profile))
 
 
 if __name__ == "__main__":
@@ -0,0 +1,237 @@
+'''
+Per-stage timing for submissions.  Stages of submit_raadc2 are wrapped in
+span() blocks, which record wall time, bytes transferred and the number
+of HTTP requests the span's thread made through the shared connection
+pool while a Profiler is active:
+
+    profiler = tracing.Profiler()
+    with tracing.profile(profiler):
+        submit_raadc2(predictiondf)
+    print(profiler.summary())
+
+Without an active profiler, span() does nothing.
+'''
+import contextlib
+import json
+import os
+import threading
+import time
+
+from submitRAADC2 import connections
+
+_active = threading.local()
+
+
+class Span(object):
+    '''
+    One timed stage
+
+    Args:
+        name: Stage name
+        metadata: Extra values stored with the span
+    '''
+    def __init__(self, name, metadata=None):
+        self.name = name
+        self.metadata = metadata or {}
+        self.start = None
+        self.end = None
+        self.bytes = 0
+        self.rest_calls = 0
+        self.error = None
+        self.thread_id = threading.current_thread().ident
+
+    @property
+    def seconds(self):
+        if self.start is None or self.end is None:
+            return None
+        return self.end - self.start
+
+    def add_bytes(self, count):
+        self.bytes += count
+
+    def to_dict(self):
+        return {
+            'name': self.name,
+            'start': self.start,
+            'seconds': self.seconds,
+            'bytes': self.bytes,
+            'rest_calls': self.rest_calls,
+            'error': self.error,
+            'metadata': self.metadata
+        }
+
+
+class Profiler(object):
+    '''
+    Collects spans, calling hooks as each span starts and ends
+
+    Args:
+        on_start: Callables passed each Span when it starts
+        on_end: Callables passed each Span when it ends
+    '''
+    def __init__(self, on_start=None, on_end=None):
+        self.spans = []
+        self.on_start = list(on_start or [])
+        self.on_end = list(on_end or [])
+        self._lock = threading.Lock()
+        self._started = time.time()
+
+    @contextlib.contextmanager
+    def span(self, name, **metadata):
+        '''
+        Times a stage
+
+        Args:
+            name: Stage name
+            **metadata: Extra values stored with the span
+
+        Yields:
+            Span
+        '''
+        span = Span(name, metadata)
+        stack = _span_stack()
+        for hook in self.on_start:
+            hook(span)
+        requests_before = connections.thread_requests()
+        span.start = time.time()
+        stack.append(span)
+        try:
+            yield span
+        except BaseException as e:
+            span.error = repr(e)
+            raise
+        finally:
+            span.end = time.time()
+            stack.pop()
+            span.rest_calls = connections.thread_requests() - requests_before
+            with self._lock:
+                self.spans.append(span)
+            for hook in self.on_end:
+                hook(span)
+
+    def summary(self):
+        '''
+        Formats the timing breakdown as a table
+
+        Returns:
+            str: One line per span with seconds, share of total, bytes
+                 and REST calls
+        '''
+        total = sum(span.seconds for span in self.spans) or 1.0
+        lines = ['{name:<24}{seconds:>10}{share:>8}{bytes:>14}{calls:>8}'.format(
+            name='stage', seconds='seconds', share='%', bytes='bytes',
+            calls='rest')]
+        for span in sorted(self.spans, key=lambda span: span.start):
+            lines.append(
+                '{name:<24}{seconds:>10.3f}{share:>8.1f}{bytes:>14}{calls:>8}'
+                .format(name=span.name, seconds=span.seconds,
+                        share=100 * span.seconds / total, bytes=span.bytes,
+                        calls=span.rest_calls)
+            )
+        return '\n'.join(lines)
+
+    def to_dict(self):
+        return {'spans': [span.to_dict() for span in self.spans]}
+
+    def trace_events(self):
+        '''
+        Converts spans to Chrome trace-event format, viewable in
+        chrome://tracing or Perfetto
+
+        Returns:
+            dict: Trace with traceEvents
+        '''
+        pid = os.getpid()
+        events = []
+        for span in self.spans:
+            args = dict(span.metadata, bytes=span.bytes,
+                        rest_calls=span.rest_calls)
+            if span.error is not None:
+                args['error'] = span.error
+            events.append({
+                'name': span.name,
+                'cat': 'submitRAADC2',
+                'ph': 'X',
+                'ts': int((span.start - self._started) * 1e6),
+                'dur': int(span.seconds * 1e6),
+                'pid': pid,
+                'tid': span.thread_id,
+                'args': args
+            })
+        return {'traceEvents': events, 'displayTimeUnit': 'ms'}
+
+    def write_trace(self, path):
+        '''
+        Writes spans as a trace-event JSON file
+
+        Args:
+            path: Output file path
+        '''
+        with open(path, 'w') as f:
+            json.dump(self.trace_events(), f, indent=2)
+
+
+def _span_stack():
+    if not hasattr(_active, 'spans'):
+        _active.spans = []
+    return _active.spans
+
+
+def current_profiler():
+    '''
+    Gets the profiler active in this thread
+
+    Returns:
+        Profiler, or None
+    '''
+    return getattr(_active, 'profiler', None)
+
+
+@contextlib.contextmanager
+def profile(profiler):
+    '''
+    Activates a profiler for spans opened in this thread.  Worker
+    threads don't inherit it; pass current_profiler() to them and
+    activate it there.
+
+    Args:
+        profiler: Profiler, or None to leave spans unrecorded
+    '''
+    previous = current_profiler()
+    _active.profiler = profiler
+    try:
+        yield profiler
+    finally:
+        _active.profiler = previous
+
+
+@contextlib.contextmanager
+def span(name, **metadata):
+    '''
+    Times a stage with the active profiler, if there is one
+
+    Args:
+        name: Stage name
+        **metadata: Extra values stored with the span
+
+    Yields:
+        Span, or None without an active profiler
+    '''
+    profiler = current_profiler()
+    if profiler is None:
+        yield None
+    else:
+        with profiler.span(name, **metadata) as active_span:
+            yield active_span
+
+
+def add_bytes(count):
+    '''
+    Adds bytes transferred to the innermost open span, if any
+
+    Args:
+        count: Number of bytes
+    '''
+    stack = _span_stack()
+    if stack:
+        stack[-1].add_bytes(count)
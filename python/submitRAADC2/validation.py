@@ -0,0 +1,667 @@
+'''
+Checks prediction frames and files against the challenge format without
+the R runtime:
+
+    validate_predictions(predictiondf)
+    validate_prediction_file('prediction.csv')
+
+Test-set patient IDs are held in a PatientIdIndex, read from
+data/patient_ids.csv once per process.  IncrementalValidator re-checks
+only the rows of a frame that changed since it was last validated.
+'''
+import csv
+import importlib
+import os
+import re
+
+data_path = os.path.join(
+    os.path.dirname(os.path.realpath(__file__)),
+    'data'
+)
+PATIENT_ID_PREFIX = 'RAADCV'
+
+
+class PatientIdIndex(object):
+    '''
+    Compact index of the test-set patient IDs.  IDs are stored as the
+    integer part of RAADCV##### in a sorted array, so membership checks
+    for a whole column are a single vectorized binary search.
+
+    Args:
+        codes: Integer-encoded patient IDs, in reference order
+    '''
+    def __init__(self, codes):
+        np = importlib.import_module('numpy')
+        self.codes = np.asarray(codes, dtype=np.int64)
+        self._order = np.argsort(self.codes, kind='mergesort')
+        self._sorted_codes = self.codes[self._order]
+
+    def __len__(self):
+        return len(self.codes)
+
+    @staticmethod
+    def encode(ids):
+        '''
+        Integer-encodes patient IDs
+
+        Args:
+            ids: Sequence of patient IDs
+
+        Returns:
+            numpy.ndarray: Numeric part of each ID, -1 where the ID isn't
+            exactly of the form RAADCV#####
+        '''
+        np = importlib.import_module('numpy')
+        pd = importlib.import_module('pandas')
+        # Prediction frames repeat a small set of IDs, so the string work
+        # is done once per distinct ID
+        id_codes, unique_ids = pd.factorize(
+            pd.Series(ids, dtype=object).astype(str)
+        )
+        unique_ids = pd.Series(unique_ids, dtype=object)
+        is_wellformed = unique_ids.str.match(
+            PATIENT_ID_PREFIX + r'[0-9]{5}$'
+        ).values
+        unique_codes = np.full(len(unique_ids), -1, dtype=np.int64)
+        unique_codes[is_wellformed] = (
+            unique_ids[is_wellformed].str.slice(6).astype(np.int64)
+        )
+        return unique_codes[id_codes]
+
+    @staticmethod
+    def decode(codes):
+        '''
+        Decodes integer-encoded patient IDs
+
+        Args:
+            codes: Integer-encoded patient IDs
+
+        Returns:
+            list: Patient IDs
+        '''
+        return ['{prefix}{code:05d}'.format(prefix=PATIENT_ID_PREFIX, code=code)
+                for code in codes]
+
+    def positions(self, codes):
+        '''
+        Finds integer-encoded IDs in the reference
+
+        Args:
+            codes: Integer-encoded patient IDs
+
+        Returns:
+            numpy.ndarray: Position of each ID in reference order, -1 for
+            IDs not in the reference
+        '''
+        np = importlib.import_module('numpy')
+        codes = np.asarray(codes, dtype=np.int64)
+        if not len(self._sorted_codes):
+            return np.full(len(codes), -1, dtype=np.int64)
+        found_at = np.searchsorted(self._sorted_codes, codes)
+        found_at = np.minimum(found_at, len(self._sorted_codes) - 1)
+        is_found = self._sorted_codes[found_at] == codes
+        return np.where(is_found, self._order[found_at], -1)
+
+    def contains(self, ids):
+        '''
+        Checks which patient IDs are in the reference
+
+        Args:
+            ids: Sequence of patient IDs
+
+        Returns:
+            numpy.ndarray: bool for each ID
+        '''
+        return self.positions(self.encode(ids)) >= 0
+
+    def extra(self, ids):
+        '''
+        Gets patient IDs that aren't in the reference
+
+        Args:
+            ids: Sequence of patient IDs
+
+        Returns:
+            list: Unique unexpected IDs, in order of first appearance
+        '''
+        pd = importlib.import_module('pandas')
+        ids = pd.Series(ids, dtype=object).astype(str).values
+        return pd.unique(ids[~self.contains(ids)]).tolist()
+
+    def missing(self, ids):
+        '''
+        Gets reference patient IDs that don't appear in ids
+
+        Args:
+            ids: Sequence of patient IDs
+
+        Returns:
+            list: Missing IDs, in reference order
+        '''
+        np = importlib.import_module('numpy')
+        positions = self.positions(self.encode(ids))
+        is_present = np.zeros(len(self.codes), dtype=bool)
+        is_present[positions[positions >= 0]] = True
+        return self.decode(self.codes[~is_present])
+
+
+_patient_id_index = None
+
+
+def patient_id_index():
+    '''
+    Gets the test-set patient ID index, reading data/patient_ids.csv the
+    first time it is called
+
+    Returns:
+        PatientIdIndex
+    '''
+    global _patient_id_index
+    if _patient_id_index is None:
+        with open(os.path.join(data_path, 'patient_ids.csv')) as f:
+            reader = csv.reader(f)
+            ids = [l[0] for l in reader]
+        _patient_id_index = PatientIdIndex(PatientIdIndex.encode(ids))
+    return _patient_id_index
+
+
+def patient_ids():
+    return PatientIdIndex.decode(patient_id_index().codes)
+
+
+PATIENT_ID_PATTERN = "RAADCV[0-9]{4}[0-9]"
+PREDICTION_COLUMNS = ['PatientID', 'RespondingSubgroup']
+PREDICTION_VALUES = ['Chemo', 'Tecentriq']
+
+
+def validate_predictions(predictiondf):
+    '''
+    Validates prediction dataframe without the R runtime.  Applies the
+    same checks as the R package's validate_predictions, in the same
+    order and with the same error messages.
+
+    Args:
+        predictiondf: Prediction dataframe
+
+    Returns:
+        bool: True if all checks pass
+
+    Raises:
+        ValueError: The first check that fails
+    '''
+    if list(predictiondf.columns) != PREDICTION_COLUMNS:
+        raise ValueError(
+            "Prediction headers not of the format PatientID, "
+            "RespondingSubgroup"
+        )
+
+    np = importlib.import_module('numpy')
+    pd = importlib.import_module('pandas')
+
+    unique_ids = pd.Series(
+        pd.unique(predictiondf['PatientID'].astype(str)), dtype=object
+    )
+    # na=False so missing IDs fail the check instead of being skipped
+    if not unique_ids.str.contains(PATIENT_ID_PATTERN, regex=True,
+                                   na=False).all():
+        raise ValueError(
+            "Unexpected value in PatientID column: \n"
+            "IDs should in the format RAADCV00000 "
+            "(RAADCV prefix with 5 digit holders)"
+        )
+
+    # Checked per distinct ID, in order of first appearance
+    reference = patient_id_index()
+    positions = reference.positions(reference.encode(unique_ids))
+    is_known = positions >= 0
+    if not is_known.all():
+        extra_ids = unique_ids[~is_known]
+        raise ValueError(
+            "Unexpected ID(s) in PatientID column:\n\n"
+            "  {ids}\n\n"
+            "IDs for predictions should only match PatientID values \n"
+            "from the provided test data"
+            .format(ids=",".join(extra_ids))
+        )
+
+    is_present = np.zeros(len(reference), dtype=bool)
+    is_present[positions] = True
+    if not is_present.all():
+        missing_ids = reference.decode(reference.codes[~is_present])
+        raise ValueError(
+            "Missing the following patient ID(s):\n\n"
+            "{ids}\n\n"
+            "IDs for predictions should match all PatientID values \n"
+            "from the provided test data"
+            .format(ids=",".join(missing_ids))
+        )
+
+    values = predictiondf['RespondingSubgroup']
+    if sorted(values.unique().tolist(), key=str) != PREDICTION_VALUES:
+        raise ValueError(
+            "Prediction values should be converted to Chemo, Tecentriq"
+        )
+
+    tecentriq_proportion = (values == 'Tecentriq').mean()
+    if tecentriq_proportion < 0.2 or tecentriq_proportion > 0.8:
+        raise ValueError("Proportion in subgroup is not between 20 and 80%")
+
+    return True
+
+
+# Positions recorded by IncrementalValidator for IDs not in the reference
+_UNKNOWN_ID = -1
+_MALFORMED_ID = -2
+# Updates with fewer changed rows than this are done row by row, which is
+# faster than vectorized pandas calls at that size
+_ROW_BY_ROW_UPDATE = 512
+
+
+class IncrementalValidator(object):
+    '''
+    Validates successive versions of a prediction frame, re-checking only
+    the rows that changed since the last call.  Changed rows are found by
+    comparing each column with a copy of the last validated one, and the
+    state the checks need (malformed and unknown ID counts, how often
+    each reference ID appears and how often each value appears) is
+    updated for the changed rows only.  Raises the same errors, in the
+    same order, as validate_predictions.
+
+        validator = IncrementalValidator()
+        validator.validate(predictiondf)
+        predictiondf.loc[10, 'RespondingSubgroup'] = 'Chemo'
+        validator.validate(predictiondf)  # re-checks one row
+    '''
+    def __init__(self):
+        self.rows_checked = 0
+        self._reference = None
+
+    def reset(self):
+        '''Forgets the last validated frame, releasing the column copies'''
+        self._reference = None
+        self._columns = None
+        self._positions = self._value_codes = None
+
+    def _start(self, reference):
+        np = importlib.import_module('numpy')
+        self._reference = reference
+        self._code_positions = dict(
+            zip(reference.codes.tolist(), range(len(reference)))
+        )
+        self._columns = None
+        # Reference position of each row's ID, or _UNKNOWN_ID/_MALFORMED_ID
+        self._positions = np.zeros(0, dtype=np.int64)
+        # Index of each row's value in self._values
+        self._value_codes = np.zeros(0, dtype=np.int64)
+        self._values = []
+        self._value_index = {}
+        # Rows per reference ID and per value
+        self._id_counts = np.zeros(len(reference), dtype=np.int64)
+        self._value_counts = np.zeros(0, dtype=np.int64)
+        self._missing_count = len(reference)
+        self._malformed_count = 0
+        self._unknown_count = 0
+
+    def _value_code(self, value):
+        pd = importlib.import_module('pandas')
+        np = importlib.import_module('numpy')
+        # All missing values count as one distinct value
+        key = None if pd.isna(value) else value
+        code = self._value_index.get(key)
+        if code is None:
+            code = self._value_index[key] = len(self._values)
+            self._values.append(key)
+            self._value_counts = np.append(self._value_counts, 0)
+        return code
+
+    def _id_position(self, patient_id, is_wellformed, is_encodable):
+        patient_id = str(patient_id)
+        if not is_wellformed(patient_id):
+            return _MALFORMED_ID
+        if is_encodable(patient_id):
+            return self._code_positions.get(int(patient_id[6:]), _UNKNOWN_ID)
+        return _UNKNOWN_ID
+
+    def _changed_rows(self, columns):
+        '''
+        Finds rows that differ from the last validated frame
+
+        Returns:
+            tuple (numpy.ndarray, int): Changed row numbers among the rows
+            both frames have, number of rows in the last frame
+        '''
+        np = importlib.import_module('numpy')
+        if self._columns is None:
+            return np.zeros(0, dtype=np.int64), 0
+        old_count, row_count = len(self._columns[0]), len(columns[0])
+        common = min(old_count, row_count)
+        is_changed = np.zeros(common, dtype=bool)
+        for column, old_column in zip(columns, self._columns):
+            if column.dtype != old_column.dtype:
+                is_changed[:] = True
+                break
+            # Missing values never compare equal, so those rows are
+            # always re-checked
+            is_equal = column.iloc[:common].eq(old_column.iloc[:common])
+            is_changed |= ~is_equal.fillna(False).values.astype(bool)
+        return np.flatnonzero(is_changed), old_count
+
+    def _resize(self, row_count):
+        np = importlib.import_module('numpy')
+        added = row_count - len(self._positions)
+        if added <= 0:
+            self._positions = self._positions[:row_count]
+            self._value_codes = self._value_codes[:row_count]
+        else:
+            self._positions = np.concatenate(
+                [self._positions, np.zeros(added, dtype=np.int64)]
+            )
+            self._value_codes = np.concatenate(
+                [self._value_codes, np.zeros(added, dtype=np.int64)]
+            )
+
+    def _check_rows(self, columns, rows):
+        '''Records the ID position and value code of rows'''
+        np = importlib.import_module('numpy')
+        pd = importlib.import_module('pandas')
+        is_wellformed = re.compile(PATIENT_ID_PATTERN).search
+        is_encodable = re.compile(PATIENT_ID_PREFIX + r'[0-9]{5}$').match
+        if len(rows) == len(columns[0]):
+            # Every row, in order
+            ids, values = columns
+        else:
+            ids, values = columns[0].iloc[rows], columns[1].iloc[rows]
+        if len(rows) < _ROW_BY_ROW_UPDATE:
+            for row, patient_id, value in zip(rows.tolist(), ids.tolist(),
+                                              values.tolist()):
+                self._positions[row] = self._id_position(
+                    patient_id, is_wellformed, is_encodable
+                )
+                self._value_codes[row] = self._value_code(value)
+            return
+        # Each distinct ID and value is checked once; factorize gives
+        # missing values code -1, which picks the last entry
+        id_codes, unique_ids = pd.factorize(ids)
+        unique_positions = np.array(
+            [self._id_position(patient_id, is_wellformed, is_encodable)
+             for patient_id in unique_ids] + [_MALFORMED_ID],
+            dtype=np.int64
+        )
+        self._positions[rows] = unique_positions[id_codes]
+        value_codes, unique_values = pd.factorize(values)
+        unique_value_codes = np.array(
+            [self._value_code(value) for value in unique_values] +
+            [self._value_code(None)],
+            dtype=np.int64
+        )
+        self._value_codes[rows] = unique_value_codes[value_codes]
+
+    def _count(self, rows, sign):
+        '''Adds (sign=1) or removes (sign=-1) rows from the aggregates'''
+        np = importlib.import_module('numpy')
+        if len(rows) < _ROW_BY_ROW_UPDATE:
+            for row in rows.tolist():
+                position = int(self._positions[row])
+                if position == _MALFORMED_ID:
+                    self._malformed_count += sign
+                elif position == _UNKNOWN_ID:
+                    self._unknown_count += sign
+                else:
+                    id_count = int(self._id_counts[position])
+                    self._id_counts[position] = id_count + sign
+                    self._missing_count += (
+                        (id_count + sign == 0) - (id_count == 0)
+                    )
+                self._value_counts[self._value_codes[row]] += sign
+            return
+        positions = self._positions[rows]
+        self._malformed_count += sign * int((positions == _MALFORMED_ID).sum())
+        self._unknown_count += sign * int((positions == _UNKNOWN_ID).sum())
+        was_present = self._id_counts > 0
+        self._id_counts += sign * np.bincount(
+            positions[positions >= 0], minlength=len(self._id_counts)
+        )
+        self._missing_count += int(
+            was_present.sum() - (self._id_counts > 0).sum()
+        )
+        self._value_counts += sign * np.bincount(
+            self._value_codes[rows], minlength=len(self._value_counts)
+        )
+
+    def validate(self, predictiondf):
+        '''
+        Validates a prediction dataframe
+
+        Args:
+            predictiondf: Prediction dataframe
+
+        Returns:
+            bool: True if all checks pass
+
+        Raises:
+            ValueError: The first check that fails
+        '''
+        if list(predictiondf.columns) != PREDICTION_COLUMNS:
+            raise ValueError(
+                "Prediction headers not of the format PatientID, "
+                "RespondingSubgroup"
+            )
+
+        np = importlib.import_module('numpy')
+        reference = patient_id_index()
+        if reference is not self._reference:
+            self._start(reference)
+
+        # Copies, so later in-place edits of the frame show up as changes
+        columns = [predictiondf[column].reset_index(drop=True).copy()
+                   for column in PREDICTION_COLUMNS]
+        row_count = len(predictiondf)
+        try:
+            changed, old_count = self._changed_rows(columns)
+            added = np.arange(old_count, row_count)
+            removed = np.arange(row_count, old_count)
+            rows = np.concatenate([changed, added])
+            self._count(np.concatenate([changed, removed]), -1)
+            self._resize(row_count)
+            self._check_rows(columns, rows)
+            self._count(rows, 1)
+        except BaseException:
+            # Don't keep partially updated state
+            self.reset()
+            raise
+        self._columns = columns
+        self.rows_checked = len(rows)
+        return self._check(row_count)
+
+    def _check(self, row_count):
+        '''Raises the first failing check for the recorded state'''
+        pd = importlib.import_module('pandas')
+        if self._malformed_count:
+            raise ValueError(
+                "Unexpected value in PatientID column: \n"
+                "IDs should in the format RAADCV00000 "
+                "(RAADCV prefix with 5 digit holders)"
+            )
+
+        if self._unknown_count:
+            # Only built when reporting, in order of first appearance
+            ids = self._columns[0][self._positions == _UNKNOWN_ID]
+            extra_ids = pd.unique(ids.astype(str).values)
+            raise ValueError(
+                "Unexpected ID(s) in PatientID column:\n\n"
+                "  {ids}\n\n"
+                "IDs for predictions should only match PatientID values \n"
+                "from the provided test data"
+                .format(ids=",".join(extra_ids))
+            )
+
+        if self._missing_count:
+            missing_ids = self._reference.decode(
+                self._reference.codes[self._id_counts == 0]
+            )
+            raise ValueError(
+                "Missing the following patient ID(s):\n\n"
+                "{ids}\n\n"
+                "IDs for predictions should match all PatientID values \n"
+                "from the provided test data"
+                .format(ids=",".join(missing_ids))
+            )
+
+        distinct_values = set(
+            value for value, count in zip(self._values, self._value_counts)
+            if count
+        )
+        if distinct_values != set(PREDICTION_VALUES):
+            raise ValueError(
+                "Prediction values should be converted to Chemo, Tecentriq"
+            )
+
+        tecentriq_code = self._value_index['Tecentriq']
+        tecentriq_proportion = (
+            float(self._value_counts[tecentriq_code]) / row_count
+        )
+        if tecentriq_proportion < 0.2 or tecentriq_proportion > 0.8:
+            raise ValueError("Proportion in subgroup is not between 20 and 80%")
+
+        return True
+
+
+_incremental_validator = None
+
+
+def incremental_validator():
+    '''
+    Gets the process-wide IncrementalValidator used by
+    submit_raadc2(incremental=True), so re-validating an edited frame only
+    re-checks the edited rows
+
+    Returns:
+        IncrementalValidator
+    '''
+    global _incremental_validator
+    if _incremental_validator is None:
+        _incremental_validator = IncrementalValidator()
+    return _incremental_validator
+
+
+# Rows read per chunk by validate_prediction_file
+VALIDATION_CHUNK_SIZE = 100000
+# Offending rows listed in a validate_prediction_file error
+MAX_REPORTED_ROWS = 20
+
+
+def _row_numbers_message(message, rows):
+    '''
+    Appends offending row numbers to a validation error message
+
+    Args:
+        message: Validation error message
+        rows: 1-based data row numbers, header excluded
+
+    Returns:
+        str: Error message
+    '''
+    listed = ",".join(str(row) for row in rows[:MAX_REPORTED_ROWS])
+    if len(rows) > MAX_REPORTED_ROWS:
+        listed += ",... ({count} rows)".format(count=len(rows))
+    return "{message}\n\nRow(s): {rows}".format(message=message, rows=listed)
+
+
+def validate_prediction_file(prediction_filepath,
+                             chunksize=VALIDATION_CHUNK_SIZE):
+    '''
+    Validates a prediction CSV in fixed-size chunks, so memory use is
+    bounded by the chunk size rather than the file size.  Applies the
+    same checks as validate_predictions but only keeps running state
+    (which reference IDs were seen, which values were seen, and the
+    Tecentriq count), and fails on the first chunk with a bad row,
+    reporting the offending row numbers.  Because of this, a bad value
+    in an early chunk is reported before a bad ID in a later one.
+
+    Args:
+        prediction_filepath: Prediction CSV file path
+        chunksize: Rows read per chunk
+
+    Returns:
+        bool: True if all checks pass
+
+    Raises:
+        ValueError: The first check that fails
+    '''
+    np = importlib.import_module('numpy')
+    pd = importlib.import_module('pandas')
+
+    header = pd.read_csv(prediction_filepath, nrows=0)
+    if list(header.columns) != PREDICTION_COLUMNS:
+        raise ValueError(
+            "Prediction headers not of the format PatientID, "
+            "RespondingSubgroup"
+        )
+
+    reference = patient_id_index()
+    is_present = np.zeros(len(reference), dtype=bool)
+    values_seen = set()
+    tecentriq_count = 0
+    row_count = 0
+    chunks = pd.read_csv(
+        prediction_filepath, chunksize=chunksize, na_filter=False,
+        dtype={'PatientID': str, 'RespondingSubgroup': 'category'}
+    )
+    for chunk in chunks:
+        rows = np.arange(row_count + 1, row_count + len(chunk) + 1)
+        ids = chunk['PatientID']
+
+        is_wellformed = ids.str.contains(PATIENT_ID_PATTERN, regex=True).values
+        if not is_wellformed.all():
+            raise ValueError(_row_numbers_message(
+                "Unexpected value in PatientID column: \n"
+                "IDs should in the format RAADCV00000 "
+                "(RAADCV prefix with 5 digit holders)",
+                rows[~is_wellformed]
+            ))
+
+        positions = reference.positions(reference.encode(ids))
+        is_known = positions >= 0
+        if not is_known.all():
+            raise ValueError(_row_numbers_message(
+                "Unexpected ID(s) in PatientID column:\n\n"
+                "  {ids}\n\n"
+                "IDs for predictions should only match PatientID values \n"
+                "from the provided test data"
+                .format(ids=",".join(pd.unique(ids.values[~is_known]))),
+                rows[~is_known]
+            ))
+        is_present[positions] = True
+
+        values = chunk['RespondingSubgroup']
+        is_expected = values.isin(PREDICTION_VALUES).values
+        if not is_expected.all():
+            raise ValueError(_row_numbers_message(
+                "Prediction values should be converted to Chemo, Tecentriq",
+                rows[~is_expected]
+            ))
+        values_seen.update(values.unique())
+        tecentriq_count += int((values == 'Tecentriq').sum())
+        row_count += len(chunk)
+
+    if not is_present.all():
+        raise ValueError(
+            "Missing the following patient ID(s):\n\n"
+            "{ids}\n\n"
+            "IDs for predictions should match all PatientID values \n"
+            "from the provided test data"
+            .format(ids=",".join(
+                reference.decode(reference.codes[~is_present])
+            ))
+        )
+
+    if sorted(values_seen) != PREDICTION_VALUES:
+        raise ValueError(
+            "Prediction values should be converted to Chemo, Tecentriq"
+        )
+
+    tecentriq_proportion = float(tecentriq_count) / row_count
+    if tecentriq_proportion < 0.2 or tecentriq_proportion > 0.8:
+        raise ValueError("Proportion in subgroup is not between 20 and 80%")
+
+    return True
@@ -0,0 +1,54 @@
+import pytest
+
+from submitRAADC2 import cache, validation
+import pandas as pd
+
+
+@pytest.fixture(autouse=True)
+def cache_dir(tmpdir, monkeypatch):
+    '''Keeps the on-disk caches of each test out of the user's cache'''
+    path = tmpdir.mkdir('cache')
+    monkeypatch.setenv('RAADC2_CACHE_DIR', str(path))
+    monkeypatch.setattr(cache, '_default_upload_manifest', None)
+    return path
+
+
+@pytest.fixture
+def team_info():
+    '''get_team_info() response for a team that can submit'''
+    return {'team_id': '123456', 'team_name': 'RAAD2 First',
+            'folder_id': 'syn1234', 'advanced_compute': False}
+
+
+def make_predictions(ids=None):
+    '''
+    Builds a prediction frame, valid when ids is left as the test-set
+    patient IDs
+
+    Args:
+        ids: PatientID column, defaults to validation.patient_ids()
+
+    Returns:
+        pandas.DataFrame
+    '''
+    if ids is None:
+        ids = validation.patient_ids()
+    return pd.DataFrame({
+        'PatientID': ids,
+        'RespondingSubgroup': ['Tecentriq', 'Chemo'] * (len(ids) // 2)
+    })
+
+
+@pytest.fixture
+def predictiondf():
+    '''A valid prediction frame'''
+    return make_predictions()
+
+
+@pytest.fixture
+def write_predictions():
+    '''Writes make_predictions(ids) to a CSV and returns its path'''
+    def write(path, ids=None):
+        make_predictions(ids).to_csv(str(path), index=False)
+        return str(path)
+    return write
@@ -0,0 +1,106 @@
+import asyncio
+import threading
+
+import pytest
+
+from submitRAADC2 import aio, cache, submit, validation
+import mock
+import synapseclient
+from synapseclient.exceptions import SynapseError
+import pandas as pd
+
+syn = mock.create_autospec(synapseclient.Synapse)
+
+teams = {1: {'name': 'Other', 'id': '1'},
+         2: {'name': 'RAAD2 First', 'id': '2'}}
+eligibility_data = {
+    'teamId': '2',
+    'evaluationId': '9614112',
+    'teamEligibility': {'isEligible': True, 'isRegistered': True,
+                        'isQuotaFilled': False},
+    'membersEligibility': [
+        {'isEligible': True, 'isRegistered': True, 'isQuotaFilled': False,
+         'principalId': 4444, 'hasConflictingSubmission': False}
+    ],
+    'eligibilityStateHash': 1
+}
+
+
+class team_folder():
+    def asDataFrame():
+        return(pd.DataFrame({"folderId": 'syn1234', "advancedCompute": False}, index=[0]))
+
+
+def _rest_get(uri):
+    if uri.endswith('/team/id'):
+        return {'teamIds': list(teams)}
+    return eligibility_data
+
+
+@pytest.fixture
+def synapse_calls():
+    with mock.patch.object(syn, 'getUserProfile', return_value={'ownerId': '4444'}), \
+         mock.patch.object(syn, 'restGET', side_effect=_rest_get), \
+         mock.patch.object(syn, 'getTeam', side_effect=teams.get) as get_team, \
+         mock.patch.object(syn, 'tableQuery', return_value=team_folder), \
+         mock.patch.object(syn, 'submit', return_value={'id': '9999'}) as syn_submit, \
+         mock.patch.object(cache, 'default_team_index', return_value=None), \
+         mock.patch.object(cache, 'default_eligibility_cache', return_value=cache.EligibilityCache()):
+        yield get_team, syn_submit
+
+
+def test_async_get_team_info(synapse_calls):
+    team_info = asyncio.run(aio.get_team_info(syn, '4444'))
+    assert team_info == {'team_id': '2', 'team_name': 'RAAD2 First',
+                         'folder_id': 'syn1234', 'advanced_compute': False}
+
+
+def test_async_get_team_info_no_team(synapse_calls):
+    with mock.patch.dict(teams, {2: {'name': 'Another', 'id': '2'}}):
+        with pytest.raises(SynapseError, match='not appear to be part of any'):
+            asyncio.run(aio.get_team_info(syn, '4444'))
+
+
+def test_async_submit_overlaps_validation(synapse_calls, predictiondf):
+    get_team, syn_submit = synapse_calls
+    team_looked_up = threading.Event()
+    get_team.side_effect = lambda teamid: team_looked_up.set() or teams[teamid]
+    validate_predictions = validation.validate_predictions
+
+    def slow_validate(df):
+        # Only returns once the team lookup has run alongside it
+        assert team_looked_up.wait(5)
+        validate_predictions(df)
+
+    with mock.patch.object(validation, 'validate_predictions', side_effect=slow_validate), \
+         mock.patch.object(submit, 'upload_predictions', return_value={'id': 'syn1', 'versionNumber': 1}) as upload:
+        entity, submission_object = asyncio.run(
+            aio.async_submit_raadc2(predictiondf, syn=syn, confirm=False)
+        )
+    assert entity == {'id': 'syn1', 'versionNumber': 1}
+    assert submission_object == {'id': '9999'}
+    upload.assert_called_once()
+    assert upload.call_args[0][1] == 'syn1234'
+    syn_submit.assert_called_once()
+
+
+def test_async_submit_invalid(synapse_calls, predictiondf):
+    _, syn_submit = synapse_calls
+    with pytest.raises(ValueError, match='Missing the following patient ID'):
+        asyncio.run(aio.async_submit_raadc2(predictiondf[2:], syn=syn,
+                                            confirm=False))
+    syn_submit.assert_not_called()
+
+
+def test_async_submit_not_confirmed(synapse_calls, predictiondf):
+    _, syn_submit = synapse_calls
+
+    async def decline():
+        return False
+
+    with mock.patch.object(submit, 'upload_predictions') as upload:
+        with pytest.raises(SynapseError, match='Exiting submission attempt'):
+            asyncio.run(aio.async_submit_raadc2(predictiondf, syn=syn,
+                                                confirm=decline))
+    upload.assert_not_called()
+    syn_submit.assert_not_called()
@@ -0,0 +1,110 @@
+import sys
+
+import pytest
+
+from submitRAADC2 import batch, submit
+import mock
+import synapseclient
+
+syn = mock.create_autospec(synapseclient.Synapse)
+
+ids = submit.patient_ids()
+
+
+@pytest.fixture
+def prediction_files(tmpdir, write_predictions):
+    return [
+        write_predictions(tmpdir.join('first.csv')),
+        write_predictions(tmpdir.join('second.csv'), ids=ids[::-1]),
+        write_predictions(tmpdir.join('bad.csv'), ids=ids[:-2])
+    ]
+
+
+def test_expand_paths(tmpdir, prediction_files):
+    pattern = str(tmpdir.join('*.csv'))
+    assert batch.expand_paths([pattern, prediction_files[0]]) == sorted(prediction_files)
+
+
+def test_validate_only_batch(prediction_files):
+    report = batch.submit_raadc2_batch(prediction_files, validate_only=True)
+    assert [result['error'] is None for result in report] == [True, True, False]
+    assert report[2]['error'].startswith('Missing the following patient ID(s)')
+
+
+def test_submit_raadc2_batch(prediction_files, team_info):
+    entities = iter([{'id': 'syn1', 'versionNumber': 1},
+                     {'id': 'syn2', 'versionNumber': 1}])
+    with mock.patch.object(submit, 'get_team_info', return_value=team_info) as get_team_info, \
+         mock.patch.object(submit, 'check_eligibility', return_value=True) as check_eligibility, \
+         mock.patch.object(submit, '_lookup_owner_id', return_value='4444'), \
+         mock.patch.object(submit, 'upload_predictions', side_effect=lambda *args, **kwargs: next(entities)) as upload, \
+         mock.patch.object(syn, 'submit', side_effect=lambda entity, **kwargs: {'id': 'sub-' + entity['id']}):
+        report = batch.submit_raadc2_batch(prediction_files, syn=syn, confirm=False)
+        get_team_info.assert_called_once()
+        check_eligibility.assert_called_once()
+        assert upload.call_count == 2
+    submitted = sorted((result['entity_id'], result['submission_id']) for result in report[:2])
+    assert submitted == [('syn1', 'sub-syn1'), ('syn2', 'sub-syn2')]
+    assert report[2]['entity_id'] is None
+    assert report[2]['error'].startswith('Missing the following patient ID(s)')
+
+
+def test_upload_error_is_reported(prediction_files, team_info):
+    with mock.patch.object(submit, 'get_team_info', return_value=team_info), \
+         mock.patch.object(submit, 'check_eligibility', return_value=True), \
+         mock.patch.object(submit, '_lookup_owner_id', return_value='4444'), \
+         mock.patch.object(submit, 'upload_predictions', side_effect=IOError('gateway down')):
+        report = batch.submit_raadc2_batch(prediction_files[:1], syn=syn, confirm=False)
+    assert report[0]['error'] == 'gateway down'
+
+
+def test_format_report(prediction_files):
+    report = batch.submit_raadc2_batch(prediction_files, validate_only=True)
+    table = batch.format_report(report)
+    assert table.splitlines()[0].split() == batch.REPORT_COLUMNS
+
+
+def test_expand_directory(tmpdir, prediction_files):
+    tmpdir.join('notes.txt').write('')
+    assert batch.expand_paths([str(tmpdir)]) == sorted(prediction_files)
+
+
+def test_validate_prediction_files(tmpdir, prediction_files):
+    missing = str(tmpdir.join('missing.csv'))
+    report = batch.validate_prediction_files(prediction_files + [missing],
+                                             max_workers=2)
+    assert [result['path'] for result in report] == prediction_files + [missing]
+    assert [result['status'] for result in report] == ['pass', 'pass', 'fail', 'fail']
+    assert report[0]['error'] is None
+    assert report[2]['error'].startswith('Missing the following patient ID(s)')
+    assert 'missing.csv' in report[3]['error']
+    table = batch.format_validation_report(report).splitlines()
+    assert table[0].split() == batch.VALIDATION_REPORT_COLUMNS
+    # Each file's error fits on its row
+    assert len(table) == len(report) + 1
+
+
+def test_validate_only_cli(tmpdir, prediction_files, monkeypatch, capsys):
+    monkeypatch.setattr(sys, 'argv', ['submitRAADC2', str(tmpdir.join('*.csv')), '-v'])
+    with pytest.raises(SystemExit) as exit_info:
+        submit.main()
+    assert exit_info.value.code == 1
+    rows = capsys.readouterr().out.splitlines()[-3:]
+    assert [row.split()[1] for row in rows] == ['fail', 'pass', 'pass']
+
+
+def test_expand_paths_no_match(tmpdir):
+    pattern = str(tmpdir.join('nomatch*.csv'))
+    with pytest.raises(ValueError, match='No prediction files matched'):
+        batch.expand_paths([pattern])
+    with pytest.raises(ValueError, match='No prediction files matched'):
+        batch.expand_paths([str(tmpdir.mkdir('empty'))])
+
+
+def test_cli_no_match(tmpdir, monkeypatch, capsys):
+    pattern = str(tmpdir.join('nomatch*.csv'))
+    monkeypatch.setattr(sys, 'argv', ['submitRAADC2', pattern, '-v'])
+    with pytest.raises(SystemExit) as exit_info:
+        submit.main()
+    assert exit_info.value.code == 1
+    assert capsys.readouterr().out == 'No prediction files matched {}\n'.format(pattern)
@@ -0,0 +1,87 @@
+import sys
+import types
+
+import pytest
+
+from submitRAADC2 import bridge, cache, daemon, submit
+import mock
+
+
+class RRuntimeError(Exception):
+    pass
+
+
+@pytest.fixture
+def pandas2ri(monkeypatch):
+    '''Stands in for rpy2, which isn't needed to test the bridge'''
+    pandas2ri = mock.MagicMock()
+    rinterface = types.SimpleNamespace(RRuntimeError=RRuntimeError)
+    monkeypatch.setitem(sys.modules, 'rpy2', mock.MagicMock())
+    monkeypatch.setitem(sys.modules, 'rpy2.rinterface', rinterface)
+    monkeypatch.setitem(sys.modules, 'rpy2.robjects', mock.MagicMock())
+    monkeypatch.setitem(sys.modules, 'rpy2.robjects.pandas2ri', pandas2ri)
+    monkeypatch.setitem(sys.modules, 'rpy2_arrow', None)
+    monkeypatch.setitem(sys.modules, 'rpy2_arrow.pyarrow_rarrow', None)
+    return pandas2ri
+
+
+def test_as_factors(predictiondf):
+    factordf = bridge._as_factors(predictiondf)
+    assert factordf['RespondingSubgroup'].dtype.name == 'category'
+    # Unique IDs gain nothing as a factor
+    assert factordf['PatientID'].dtype.name != 'category'
+    assert factordf['RespondingSubgroup'].tolist() == predictiondf['RespondingSubgroup'].tolist()
+    assert predictiondf['RespondingSubgroup'].dtype.name != 'category'
+
+
+def test_bridge_method_without_arrow(pandas2ri):
+    assert not bridge.arrow_available()
+    assert bridge.bridge_method() == 'pandas2ri'
+
+
+def test_to_r_pandas2ri(pandas2ri, predictiondf):
+    assert bridge.to_r(predictiondf) is pandas2ri.py2ri.return_value
+    pandas2ri.activate.assert_called_once_with()
+    pandas2ri.deactivate.assert_called_once_with()
+    converteddf = pandas2ri.py2ri.call_args[0][0]
+    assert converteddf['RespondingSubgroup'].dtype.name == 'category'
+
+
+def test_to_r_unknown_method(predictiondf):
+    with pytest.raises(ValueError):
+        bridge.to_r(predictiondf, method='feather')
+
+
+def test_submit_raadc2_converts_once(pandas2ri, predictiondf, team_info):
+    r_package = mock.MagicMock()
+    r_package._confirm_prompt.return_value = [1]
+    r_package._create_submission.return_value = ['prediction.csv']
+    with mock.patch.object(submit, 'r_package', return_value=r_package), \
+         mock.patch.object(submit, 'synapse_login'), \
+         mock.patch.object(submit, '_lookup_owner_id', return_value='4444'), \
+         mock.patch.object(submit, 'get_team_info', return_value=team_info), \
+         mock.patch.object(submit, 'check_eligibility', return_value=True), \
+         mock.patch.object(cache, 'default_team_index', return_value=None), \
+         mock.patch('os.path.getsize', return_value=0):
+        submit.submit_raadc2(predictiondf, dry_run=True, engine='r')
+    pandas2ri.py2ri.assert_called_once()
+    r_predictiondf = pandas2ri.py2ri.return_value
+    r_package.validate_predictions.assert_called_once_with(r_predictiondf)
+    r_package._create_submission.assert_called_once_with(r_predictiondf)
+
+
+def test_daemon_converts_once(pandas2ri, tmpdir, predictiondf, team_info):
+    r_package = mock.MagicMock()
+    r_package._create_submission.return_value = [str(tmpdir.join('prediction.csv'))]
+    submission_daemon = daemon.SubmissionDaemon(engine='r')
+    submission_daemon.team_info = team_info
+    with mock.patch.object(submit, 'r_package', return_value=r_package), \
+         mock.patch.object(submit, 'check_eligibility', return_value=True):
+        response = submission_daemon.submit(
+            predictiondf.to_csv(index=False).encode('utf-8'), dry_run=True
+        )
+    assert response['ok']
+    pandas2ri.py2ri.assert_called_once()
+    r_predictiondf = pandas2ri.py2ri.return_value
+    r_package.validate_predictions.assert_called_once_with(r_predictiondf)
+    r_package._create_submission.assert_called_once_with(r_predictiondf)
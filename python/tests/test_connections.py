@@ -0,0 +1,93 @@
+import threading
+
+import pytest
+import mock
+import synapseclient
+
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from socketserver import ThreadingMixIn
+
+from submitRAADC2 import connections
+from submitRAADC2.submit import get_service_account
+
+
+class KeepAliveHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def do_GET(self):
+        self.send_response(200)
+        self.send_header('Content-Length', '2')
+        self.end_headers()
+        self.wfile.write(b'{}')
+
+    def log_message(self, *args):
+        pass
+
+
+class ThreadingServer(ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+
+
+@pytest.fixture
+def server():
+    server = ThreadingServer(('127.0.0.1', 0), KeepAliveHandler)
+    thread = threading.Thread(target=server.serve_forever)
+    thread.daemon = True
+    thread.start()
+    yield 'http://127.0.0.1:{port}/'.format(port=server.server_address[1])
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture(autouse=True)
+def fresh_pool():
+    connections.configure(pool_size=connections.DEFAULT_POOL_SIZE,
+                          keep_alive=True)
+    connections.reset_stats()
+    yield
+    connections.configure(pool_size=connections.DEFAULT_POOL_SIZE,
+                          keep_alive=True)
+
+
+def test_get_session_is_shared():
+    assert connections.get_session() is connections.get_session()
+
+
+def test_connections_are_reused(server):
+    session = connections.get_session()
+    for _ in range(3):
+        session.get(server)
+    stats = connections.pool_stats()
+    assert stats['requests'] == 3
+    assert stats['misses'] == 1
+    assert stats['hits'] == 2
+
+
+def test_keep_alive_disabled(server):
+    connections.configure(keep_alive=False)
+    session = connections.get_session()
+    for _ in range(3):
+        session.get(server)
+    stats = connections.pool_stats()
+    assert stats['misses'] == 3
+    assert stats['hits'] == 0
+
+
+def test_configure_pool_size():
+    connections.configure(pool_size=2)
+    adapter = connections.get_session().get_adapter('https://www.synapse.org')
+    assert adapter._pool_maxsize == 2
+
+
+def test_get_service_account_reuses_login(monkeypatch):
+    monkeypatch.setenv('EMAIL', 'service@sagebase.org')
+    monkeypatch.setenv('APIKEY', 'key')
+    with mock.patch.object(synapseclient, 'Synapse') as synapse:
+        first = get_service_account()
+        second = get_service_account()
+    assert first is second
+    synapse.assert_called_once_with(requests_session=connections.get_session())
+    first.login.assert_called_once_with('service@sagebase.org', apiKey='key')
+    stats = connections.pool_stats()
+    assert stats['login_misses'] == 1
+    assert stats['login_hits'] == 1
@@ -0,0 +1,128 @@
+import os
+import sys
+import threading
+
+from http.client import HTTPConnection
+
+import pytest
+
+from submitRAADC2 import cache, daemon, submit
+import mock
+import synapseclient
+
+syn = mock.create_autospec(synapseclient.Synapse)
+
+ids = submit.patient_ids()
+
+
+@pytest.fixture
+def socket_path(tmpdir, team_info):
+    with mock.patch.object(submit, '_lookup_owner_id', return_value='4444'), \
+         mock.patch.object(submit, 'get_team_info', return_value=team_info) as get_team_info, \
+         mock.patch.object(submit, 'check_eligibility', return_value=True), \
+         mock.patch.object(cache, 'default_team_index', return_value=None):
+        submission_daemon = daemon.SubmissionDaemon(syn=syn).start()
+        get_team_info.assert_called_once()
+        path = str(tmpdir.join('daemon.sock'))
+        server = daemon.make_server(submission_daemon, socket_path=path)
+        thread = threading.Thread(target=server.serve_forever)
+        thread.daemon = True
+        thread.start()
+        yield path
+        daemon.request('shutdown', socket_path=path)
+        thread.join(5)
+        server.server_close()
+        # Team info is looked up once for all requests
+        get_team_info.assert_called_once()
+
+
+def test_status(socket_path, team_info):
+    response = daemon.request('status', socket_path=socket_path)
+    assert response['team_info'] == team_info
+    assert response['engine'] == 'python'
+
+
+def test_validate(socket_path, tmpdir, write_predictions):
+    response = daemon.request(
+        'validate', write_predictions(tmpdir.join('good.csv')),
+        socket_path=socket_path
+    )
+    assert response['ok']
+    assert response['output'] == 'All checks passed.\n'
+
+    response = daemon.request(
+        'validate', write_predictions(tmpdir.join('bad.csv'), ids[:-2]),
+        socket_path=socket_path
+    )
+    assert not response['ok']
+    assert response['error'].startswith('Missing the following patient ID(s)')
+
+
+def test_submit(socket_path, tmpdir, write_predictions):
+    with mock.patch.object(submit, 'upload_predictions', return_value={'id': 'syn1', 'versionNumber': 1}) as upload, \
+         mock.patch.object(syn, 'submit', return_value={'id': '9999'}):
+        response = daemon.request(
+            'submit', write_predictions(tmpdir.join('first.csv')),
+            socket_path=socket_path, name='first.csv'
+        )
+        assert upload.call_args[0][1] == 'syn1234'
+    assert response['ok']
+    assert response['filename'].endswith('first.csv')
+    assert (response['entity_id'], response['submission_id']) == ('syn1', '9999')
+    assert " > submission Id: 9999" in response['output']
+
+
+def test_client_submit_dry_run(socket_path, tmpdir, monkeypatch, capsys,
+                               write_predictions):
+    prediction_path = write_predictions(tmpdir.join('first.csv'))
+    monkeypatch.setattr(sys, 'argv', ['submitRAADC2-daemon', '--socket', socket_path,
+                                      'submit', prediction_path, '--dry-run'])
+    monkeypatch.setattr('builtins.input', lambda prompt: '1')
+    with mock.patch.object(submit, 'upload_predictions') as upload:
+        with pytest.raises(SystemExit) as exit_info:
+            daemon.main()
+        upload.assert_not_called()
+    assert exit_info.value.code == 0
+    output = capsys.readouterr().out
+    assert 'All checks passed.' in output
+    assert '<pending; dry-run only>' in output
+
+
+def test_socket_user_only(socket_path):
+    assert os.stat(socket_path).st_mode & 0o077 == 0
+
+
+@pytest.fixture
+def port(team_info):
+    submission_daemon = daemon.SubmissionDaemon(syn=syn)
+    submission_daemon.team_info = team_info
+    server = daemon.make_server(submission_daemon, port=0)
+    thread = threading.Thread(target=server.serve_forever)
+    thread.daemon = True
+    thread.start()
+    yield server.server_address[1]
+    server.shutdown()
+    thread.join(5)
+    server.server_close()
+
+
+def _post(port, headers):
+    connection = HTTPConnection('127.0.0.1', port, timeout=5)
+    try:
+        connection.request('POST', '/check', body=b'', headers=headers)
+        return connection.getresponse().status
+    finally:
+        connection.close()
+
+
+def test_port_requires_token(port):
+    token_path = daemon.default_token_path()
+    assert os.stat(token_path).st_mode & 0o077 == 0
+    with mock.patch.object(submit, 'check_eligibility', return_value=True):
+        assert daemon.request('check', port=port)['eligible']
+    assert _post(port, {}) == 403
+    assert _post(port, {'Authorization': 'Bearer wrong'}) == 403
+    # Browsers can post to localhost; they always send an Origin
+    authorization = 'Bearer ' + daemon.read_token(token_path)
+    assert _post(port, {'Authorization': authorization,
+                        'Origin': 'https://example.com'}) == 403
@@ -0,0 +1,122 @@
+import hashlib
+
+import pytest
+
+from submitRAADC2 import cache, submit
+import mock
+import synapseclient
+from synapseclient.exceptions import SynapseHTTPError
+
+syn = mock.create_autospec(synapseclient.Synapse)
+
+entity = {'id': 'syn1', 'versionNumber': 1, 'etag': 'etag-1'}
+# What the upload manifest records of an entity
+recorded = {'id': 'syn1', 'versionNumber': 1}
+
+
+def _submit(*submission_ids):
+    '''Stands in for syn.submit, which reads the entity's etag'''
+    submission_ids = iter(submission_ids)
+
+    def submit(evaluation, entity, team=None, **kwargs):
+        entity['etag']
+        return {'id': next(submission_ids)}
+    return submit
+
+
+def _rest_get(*entities):
+    '''Answers entity version GETs for the given entities, 404 otherwise'''
+    by_uri = dict(('/entity/{id}/version/{version}'.format(
+        id=ent['id'], version=ent['versionNumber']), ent) for ent in entities)
+
+    def rest_get(uri):
+        if uri not in by_uri:
+            raise SynapseHTTPError('404 Not Found')
+        return by_uri[uri]
+    return rest_get
+
+
+@pytest.fixture
+def submission_file(tmpdir):
+    path = tmpdir.join('prediction.csv')
+    path.write('PatientID,RespondingSubgroup\nRAADCV00001,Tecentriq\n')
+    return str(path)
+
+
+def test_file_md5(submission_file):
+    with open(submission_file, 'rb') as f:
+        expected = hashlib.md5(f.read()).hexdigest()
+    assert cache.file_md5(submission_file, chunk_size=7) == expected
+
+
+def test_upload_manifest(tmpdir):
+    manifest = cache.UploadManifest(str(tmpdir.join('uploads.json')))
+    assert manifest.lookup('syn1234', 'abc') is None
+    manifest.add('syn1234', 'abc', dict(entity, name='prediction.csv'))
+    # Other processes see the upload through the file
+    other = cache.UploadManifest(manifest.path)
+    assert other.lookup('syn1234', 'abc') == recorded
+    assert other.lookup('syn4321', 'abc') is None
+    other.remove('syn1234', 'abc')
+    assert manifest.lookup('syn1234', 'abc') is None
+
+
+def test_resubmit_reuses_upload(submission_file, team_info):
+    with mock.patch.object(submit, 'upload_predictions', return_value=entity) as upload, \
+         mock.patch.object(syn, 'restGET', side_effect=_rest_get(entity)) as rest_get, \
+         mock.patch.object(syn, 'submit', side_effect=_submit('1', '2')) as syn_submit:
+        first = submit._store_submission(syn, team_info, submission_file,
+                                         verbose=False)
+        second = submit._store_submission(syn, team_info, submission_file,
+                                          verbose=False)
+        upload.assert_called_once()
+        # The reused entity is fetched again for its current etag
+        rest_get.assert_called_once_with('/entity/syn1/version/1')
+        assert syn_submit.call_count == 2
+        assert syn_submit.call_args[1]['entity'] == entity
+    assert first == (entity, {'id': '1'})
+    assert second == (entity, {'id': '2'})
+
+
+def test_dedupe_off(submission_file, team_info):
+    with mock.patch.object(submit, 'upload_predictions', return_value=entity) as upload, \
+         mock.patch.object(syn, 'submit', side_effect=_submit('1', '2')):
+        for _ in range(2):
+            submit._store_submission(syn, team_info, submission_file,
+                                     verbose=False, dedupe='off')
+        assert upload.call_count == 2
+
+
+def test_stale_manifest_entry_uploads_again(submission_file, team_info):
+    manifest = cache.default_upload_manifest()
+    manifest.add('syn1234', cache.file_md5(submission_file), {'id': 'syn9', 'versionNumber': 3})
+    with mock.patch.object(submit, 'upload_predictions', return_value=entity) as upload, \
+         mock.patch.object(syn, 'restGET', side_effect=_rest_get(entity)), \
+         mock.patch.object(syn, 'submit', side_effect=_submit('1')):
+        prediction_ent, submission_object = submit._store_submission(
+            syn, team_info, submission_file, verbose=False
+        )
+        upload.assert_called_once()
+    assert prediction_ent == entity
+    assert manifest.lookup('syn1234', cache.file_md5(submission_file)) == recorded
+
+
+def test_folder_md5_match(submission_file, team_info):
+    md5 = cache.file_md5(submission_file)
+    children = [{'id': 'syn7', 'versionNumber': 1}, {'id': 'syn8', 'versionNumber': 2}]
+    folder_entity = {'id': 'syn8', 'versionNumber': 2, 'etag': 'etag-8'}
+    responses = {
+        '/entity/syn7/version/1/filehandles': {'list': [{'contentMd5': 'other'}]},
+        '/entity/syn8/version/2/filehandles': {'list': [{'contentMd5': md5}]},
+        '/entity/syn8/version/2': folder_entity
+    }
+    with mock.patch.object(syn, 'getChildren', return_value=iter(children)), \
+         mock.patch.object(syn, 'restGET', side_effect=responses.get), \
+         mock.patch.object(submit, 'upload_predictions') as upload, \
+         mock.patch.object(syn, 'submit', side_effect=_submit('1')):
+        prediction_ent, _ = submit._store_submission(
+            syn, team_info, submission_file, verbose=False, dedupe='folder'
+        )
+        upload.assert_not_called()
+    assert prediction_ent == folder_entity
+    assert cache.default_upload_manifest().lookup('syn1234', md5) == {'id': 'syn8', 'versionNumber': 2}
@@ -1,8 +1,10 @@
 import pytest
 
 from submitRAADC2.submit import _get_eligibility_data, check_eligibility, _get_owner_eligibility, _team_eligibility_message, _owner_eligibility_message
+from submitRAADC2.cache import EligibilityCache, index_members
 import mock
 import synapseclient
+from synapseclient.exceptions import SynapseError
 
 syn =  mock.create_autospec(synapseclient.Synapse)
 
@@ -64,9 +66,37 @@ def test__get_owner_eligibility():
 
 #owner doesn't exist in team
 def test_nonexistent__get_owner_eligibility():
-    with pytest.raises(IndexError, match='list index out of range'):
+    with pytest.raises(SynapseError, match='not a member'):
         _get_owner_eligibility(eligibility_data, 4)
 
+def test_indexed__get_owner_eligibility():
+    members = index_members(eligibility_data)
+    assert _get_owner_eligibility(eligibility_data, '6666', members=members) == member6666
+
+def test_cached_check_eligibility():
+    eligibility_cache = EligibilityCache()
+    with mock.patch.object(syn, "restGET", return_value=eligibility_data) as syn_rest_get:
+        assert check_eligibility(syn, team_info, 4444, eligibility_cache=eligibility_cache)
+        assert not check_eligibility(syn, team_info, 5555, eligibility_cache=eligibility_cache)
+        assert syn_rest_get.call_count == 1
+        eligibility_cache.invalidate(team_info['team_id'], '9614112')
+        check_eligibility(syn, team_info, 4444, eligibility_cache=eligibility_cache)
+        assert syn_rest_get.call_count == 2
+
+def test_stale_eligibility_cache_revalidates():
+    eligibility_cache = EligibilityCache(ttl=0)
+    fetch = mock.Mock(return_value=eligibility_data)
+    data, members = eligibility_cache.get('123456', '9614112', fetch)
+    data_again, members_again = eligibility_cache.get('123456', '9614112', fetch)
+    assert fetch.call_count == 2
+    # Same eligibilityStateHash, so the member index is reused
+    assert members_again is members
+    changed = dict(eligibility_data, eligibilityStateHash=1)
+    fetch.return_value = changed
+    data, members = eligibility_cache.get('123456', '9614112', fetch)
+    assert data is changed
+    assert members is not members_again
+
 def test_eligible__team_eligibility_message():
     message = _team_eligibility_message(eligibility_data['teamEligibility'], team_info['team_name'])
     assert message == [' > Team : Your team, {}, is eligible to submit.'.format(team_info['team_name'])]
@@ -0,0 +1,70 @@
+import time
+
+from submitRAADC2 import eligibility
+import mock
+import synapseclient
+
+syn = mock.create_autospec(synapseclient.Synapse)
+
+teams = {'RAAD2 First': {'id': 1, 'name': 'RAAD2 First'},
+         'RAAD2 Second': {'id': 2, 'name': 'RAAD2 Second'}}
+
+
+def _eligibility(teamid, members, quota_filled=False):
+    return {
+        'teamId': teamid,
+        'evaluationId': '9614112',
+        'teamEligibility': {'isEligible': not quota_filled, 'isRegistered': True,
+                            'isQuotaFilled': quota_filled},
+        'membersEligibility': [
+            {'isEligible': not quota_filled, 'isRegistered': True,
+             'isQuotaFilled': quota_filled, 'principalId': principalid,
+             'hasConflictingSubmission': False}
+            for principalid in members
+        ],
+        'eligibilityStateHash': 1
+    }
+
+
+eligibility_responses = {
+    '/evaluation/9614112/team/1/submissionEligibility': _eligibility('1', [11, 12]),
+    '/evaluation/9614112/team/2/submissionEligibility': _eligibility('2', [21], quota_filled=True)
+}
+
+
+def _get_team(name):
+    if name not in teams:
+        raise ValueError("Can't find team \"{}\"".format(name))
+    return teams[name]
+
+
+def test_scan_eligibility():
+    team_index = mock.Mock()
+    team_index.team_names.return_value = ['First', 'Missing', 'Second']
+    with mock.patch.object(syn, 'getTeam', side_effect=_get_team), \
+         mock.patch.object(syn, 'restGET', side_effect=eligibility_responses.get):
+        eligibilitydf = eligibility.scan_eligibility(syn, team_index=team_index, rate=None)
+    assert list(eligibilitydf.columns) == eligibility.ELIGIBILITY_COLUMNS
+    assert eligibilitydf['team'].tolist() == ['RAAD2 First', 'RAAD2 First',
+                                              'RAAD2 Missing', 'RAAD2 Second']
+    assert eligibilitydf['member'].tolist()[:2] == ['11', '12']
+    assert eligibilitydf['isEligible'].tolist() == [True, True, None, False]
+    assert eligibilitydf['isQuotaFilled'].tolist()[3]
+    assert eligibilitydf['error'].tolist()[2] == 'Can\'t find team "RAAD2 Missing"'
+
+
+def test_scan_named_teams():
+    with mock.patch.object(syn, 'getTeam', side_effect=_get_team) as get_team, \
+         mock.patch.object(syn, 'restGET', side_effect=eligibility_responses.get):
+        eligibilitydf = eligibility.scan_eligibility(syn, teamnames=['RAAD2 Second'], rate=None)
+        get_team.assert_called_once_with('RAAD2 Second')
+    assert eligibilitydf['team_id'].tolist() == ['2']
+
+
+def test_rate_limiter():
+    limiter = eligibility.RateLimiter(rate=50)
+    start = time.monotonic()
+    for _ in range(6):
+        limiter.acquire()
+    # The first call is free, the other five wait 1/50s each
+    assert time.monotonic() - start >= 5 / 50.0 * 0.9
@@ -2,6 +2,7 @@ import pytest
 from submitRAADC2.submit import _lookup_team_info, get_team_info
 import mock
 import synapseclient
+from synapseclient.exceptions import SynapseError
 import pandas as pd
 
 syn =  mock.create_autospec(synapseclient.Synapse)
@@ -35,3 +36,33 @@ def test_call_get_team_info():
         syn_rest_get.called_once_with(22222)
         syn_get_team.called_once_with(12345)
 
+
+def test_concurrent_get_team_info():
+    teams = {teamid: {'name': 'Team {}'.format(teamid), 'id': str(teamid)}
+             for teamid in range(20)}
+    teams[3] = team_info
+    with mock.patch.object(syn, "restGET", return_value={'teamIds': list(teams)}), \
+         mock.patch.object(syn, "getTeam", side_effect=teams.get) as syn_get_team, \
+         mock.patch.object(syn, "tableQuery", return_value=team_folder):
+        get_team_info_dict = get_team_info(syn, 22222, max_workers=4)
+        assert get_team_info_dict == {'team_id':team_info['id'],'team_name':team_info['name'],'folder_id':first_folder['id'],'advanced_compute':True}
+
+
+def test_admin_team_skipped_get_team_info():
+    teams = {1: {'name': 'RAAD2 Admin', 'id': '1'},
+             2: {'name': 'RAAD2 Participants', 'id': '2'},
+             3: team_info}
+    with mock.patch.object(syn, "restGET", return_value={'teamIds': [1, 2, 3]}), \
+         mock.patch.object(syn, "getTeam", side_effect=teams.get), \
+         mock.patch.object(syn, "tableQuery", return_value=team_folder):
+        get_team_info_dict = get_team_info(syn, 22222)
+        assert get_team_info_dict['team_id'] == team_info['id']
+
+
+def test_no_team_get_team_info():
+    with mock.patch.object(syn, "restGET", return_value={'teamIds': [1]}), \
+         mock.patch.object(syn, "getTeam", return_value={'name': 'Other', 'id': '1'}), \
+         mock.patch.object(syn, "tableQuery") as syn_table_query:
+        with pytest.raises(SynapseError, match='not appear to be part of any'):
+            get_team_info(syn, 22222)
+        syn_table_query.assert_not_called()
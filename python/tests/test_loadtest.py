@@ -0,0 +1,62 @@
+from submitRAADC2 import cache, loadtest, submit
+
+
+def test_stand_in_team_info():
+    with loadtest.StandInServer() as server:
+        syn = loadtest.StandInSynapse(server.url, 7)
+        ownerid = submit._lookup_owner_id(syn)
+        team_info = submit.get_team_info(syn, ownerid)
+    assert ownerid == '7'
+    assert team_info == {'team_name': 'RAAD2 Team 7', 'team_id': '100007',
+                         'folder_id': 'syn30000007',
+                         'advanced_compute': False}
+
+
+def test_load_test_report(monkeypatch):
+    # Uploads go to the stand-in without changing the module's gateway
+    monkeypatch.setattr(submit, 'PREDICTIONS_URL', 'http://127.0.0.1:9/unused')
+    report = loadtest.run_load_test(submitters=12, concurrency=4, rows=100)
+    assert report['failures'] == 0
+    assert report['throughput'] > 0
+    for stage in loadtest.STAGES:
+        stats = report['stages'][stage]
+        assert stats['count'] == 12
+        assert stats['failures'] == 0
+        assert stats['p50'] <= stats['p95'] <= stats['p99']
+    assert 'check_eligibility' in loadtest.format_report(report)
+
+
+def test_injected_errors():
+    report = loadtest.run_load_test(submitters=5, concurrency=5, rows=10,
+                                    error_rate={'submit': 1.0})
+    assert report['failure_rate'] == 1.0
+    assert report['stages']['upload']['failures'] == 0
+    assert report['stages']['submit']['failure_rate'] == 1.0
+    assert 'HTTPError' in report['errors'][0]
+
+
+def test_gateway_errors_fail_upload_stage():
+    report = loadtest.run_load_test(submitters=5, concurrency=5, rows=10,
+                                    error_rate={'gateway': 1.0})
+    assert report['failure_rate'] == 1.0
+    assert report['stages']['upload']['failure_rate'] == 1.0
+    assert report['stages']['submit']['count'] == 0
+    assert '503' in report['errors'][0]
+
+
+def test_stand_in_reuses_upload(tmpdir):
+    path = str(tmpdir.join('prediction.csv'))
+    with open(path, 'w') as f:
+        f.write('PatientID,RespondingSubgroup\nRAADCV00001,Tecentriq\n')
+    manifest = cache.UploadManifest(str(tmpdir.join('uploads.json')))
+    with loadtest.StandInServer() as server:
+        syn = loadtest.StandInSynapse(server.url, 7)
+        team_info = submit.get_team_info(syn, '7')
+        results = [submit._store_submission(
+            syn, team_info, path, verbose=False, upload_manifest=manifest,
+            predictions_url=server.url + '/v1/predictions'
+        ) for _ in range(2)]
+    (first_ent, first_sub), (second_ent, second_sub) = results
+    # The second submission reuses the upload, with its etag fetched again
+    assert second_ent == first_ent
+    assert second_sub != first_sub
@@ -0,0 +1,51 @@
+import csv
+import os
+
+from submitRAADC2.validation import PatientIdIndex, patient_id_index, patient_ids, data_path
+
+
+def _csv_ids():
+    with open(os.path.join(data_path, 'patient_ids.csv')) as f:
+        return [l[0] for l in csv.reader(f)]
+
+
+def test_patient_ids_unchanged():
+    assert patient_ids() == _csv_ids()
+
+
+def test_patient_id_index_loaded_once():
+    assert patient_id_index() is patient_id_index()
+
+
+def test_encode():
+    codes = PatientIdIndex.encode(['RAADCV00001', 'RAADCV01020', 'RAADCV0001', 'xRAADCV00001', 'RAADCV00001x'])
+    assert codes.tolist() == [1, 1020, -1, -1, -1]
+
+
+def test_decode():
+    assert PatientIdIndex.decode([1, 1020]) == ['RAADCV00001', 'RAADCV01020']
+
+
+def test_contains():
+    index = patient_id_index()
+    ids = patient_ids()
+    assert index.contains(ids).all()
+    assert index.contains(['RAADCV99999', 'RAADCV00001x', ids[5]]).tolist() == [False, False, True]
+
+
+def test_extra():
+    index = patient_id_index()
+    ids = ['RAADCV99999', patient_ids()[0], 'foo', 'RAADCV99999']
+    assert index.extra(ids) == ['RAADCV99999', 'foo']
+
+
+def test_missing():
+    index = patient_id_index()
+    ids = patient_ids()
+    assert index.missing(ids) == []
+    assert index.missing(ids[3:-1]) == ids[:3] + ids[-1:]
+
+
+def test_positions():
+    index = PatientIdIndex([30, 10, 20])
+    assert index.positions([10, 20, 30, 40, -1]).tolist() == [1, 2, 0, -1, -1]
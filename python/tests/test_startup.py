@@ -0,0 +1,58 @@
+import subprocess
+import sys
+
+# Generous enough for slow CI machines, well under what importing
+# pandas + synapseclient + rpy2 (and starting R) costs
+IMPORT_BUDGET_SECONDS = 1.0
+
+HEAVY_MODULES = ['rpy2', 'synapseclient']
+
+
+def _run(code):
+    result = subprocess.run(
+        [sys.executable, '-c', code],
+        stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+        universal_newlines=True
+    )
+    assert result.returncode == 0, result.stderr
+    return result.stdout
+
+
+def test_build_parser_does_not_import_heavy_modules():
+    output = _run(
+        "import sys, time\n"
+        "start = time.time()\n"
+        "from submitRAADC2.submit import build_parser\n"
+        "build_parser().format_help()\n"
+        "print(time.time() - start)\n"
+        "print(','.join(m for m in ['rpy2', 'synapseclient', 'requests', 'pandas']"
+        " if m in sys.modules))\n"
+    )
+    elapsed, loaded = output.splitlines()
+    assert float(elapsed) < IMPORT_BUDGET_SECONDS
+    assert loaded == ''
+
+
+def test_validate_only_does_not_import_heavy_modules(tmpdir, write_predictions):
+    prediction_path = write_predictions(tmpdir.join('prediction.csv'))
+    output = _run(
+        "import sys\n"
+        "from submitRAADC2 import submit\n"
+        "sys.argv = ['submitRAADC2', {path!r}, '--validate_only']\n"
+        "submit.main()\n"
+        "print(','.join(m for m in {heavy!r} if m in sys.modules))\n"
+        .format(path=prediction_path, heavy=HEAVY_MODULES)
+    )
+    assert 'All checks passed.' in output
+    assert output.splitlines()[-1] == ''
+
+
+def test_package_import_does_not_import_asyncio():
+    output = _run(
+        "import sys\n"
+        "import submitRAADC2\n"
+        "print('asyncio' in sys.modules)\n"
+        "submitRAADC2.async_submit_raadc2\n"
+        "print('asyncio' in sys.modules)\n"
+    )
+    assert output.splitlines() == ['False', 'True']
@@ -0,0 +1,142 @@
+import re
+import sys
+
+import pytest
+
+from submitRAADC2 import status
+import mock
+import synapseclient
+from synapseclient.exceptions import SynapseHTTPError
+
+
+class EvaluationQueue(object):
+    '''
+    Answers the status REST calls from a queue whose submissions advance
+    through the given states, one state per poll of the listing
+    '''
+    def __init__(self, timelines, others=0):
+        self.timelines = timelines
+        self.others = ['{}'.format(subid) for subid in range(others)]
+        # Advanced by each read of the listing's first page
+        self.polls = -1
+        self.calls = []
+
+    def _status(self, subid):
+        timeline = self.timelines.get(subid, ['SCORED'])
+        return {'id': subid, 'status': timeline[min(max(self.polls, 0), len(timeline) - 1)]}
+
+    def restGET(self, uri):
+        self.calls.append(uri)
+        listing = re.match(r'/evaluation/\d+/submission/status/all\?limit=(\d+)&offset=(\d+)', uri)
+        if listing:
+            limit, offset = int(listing.group(1)), int(listing.group(2))
+            ids = self.others + sorted(self.timelines)
+            if offset == 0:
+                self.polls += 1
+            return {'totalNumberOfResults': len(ids),
+                    'results': [self._status(subid) for subid in ids[offset:offset + limit]]}
+        subid = re.match(r'/evaluation/submission/(\w+)/status', uri).group(1)
+        return self._status(subid)
+
+
+@pytest.fixture
+def sleep():
+    with mock.patch.object(status.time, 'sleep') as sleep:
+        yield sleep
+
+
+def _syn(queue):
+    syn = mock.create_autospec(synapseclient.Synapse)
+    syn.restGET.side_effect = queue.restGET
+    return syn
+
+
+def test_changes_batched(sleep):
+    queue = EvaluationQueue({
+        'a1': ['RECEIVED', 'EVALUATION_IN_PROGRESS', 'SCORED'],
+        'a2': ['RECEIVED', 'INVALID'],
+    })
+    tracker = status.SubmissionTracker(_syn(queue), ['a1', 'a2'], page_size=10)
+    changes = [(change['id'], change['status']) for change in tracker.changes()]
+    assert changes == [('a1', 'RECEIVED'), ('a2', 'RECEIVED'),
+                       ('a1', 'EVALUATION_IN_PROGRESS'), ('a2', 'INVALID'),
+                       ('a1', 'SCORED')]
+    assert tracker.done
+    # One listing call per poll covers both submissions
+    assert len(queue.calls) == 3
+    assert sleep.call_count == 2
+
+
+def test_backoff_while_unchanged(sleep):
+    queue = EvaluationQueue({'a1': ['RECEIVED'] * 4 + ['SCORED'],
+                             'a2': ['SCORED']})
+    tracker = status.SubmissionTracker(_syn(queue), ['a1', 'a2'],
+                                       min_interval=1, max_interval=3,
+                                       backoff=2)
+    list(tracker.changes())
+    assert [call[0][0] for call in sleep.call_args_list] == [1, 2, 3, 3]
+
+
+def test_listing_stops_when_all_found(sleep):
+    queue = EvaluationQueue({'a1': ['SCORED'], 'b1': ['SCORED']}, others=5)
+    tracker = status.SubmissionTracker(_syn(queue), ['a1', 'b1'], page_size=3)
+    tracker.poll()
+    # Pages at offsets 0, 3 and 6; a1 and b1 are on the last page
+    assert len(queue.calls) == 3
+    assert tracker.done
+
+
+def test_few_pending_fetched_by_id(sleep):
+    queue = EvaluationQueue({'a1': ['RECEIVED', 'SCORED']}, others=20)
+    tracker = status.SubmissionTracker(_syn(queue), ['a1'], page_size=5)
+    tracker.poll()
+    listing_calls = len(queue.calls)
+    queue.polls += 1
+    tracker.poll()
+    # Reading five pages for one submission costs more than one call
+    assert queue.calls[listing_calls:] == ['/evaluation/submission/a1/status']
+    assert tracker.statuses['a1']['status'] == 'SCORED'
+
+
+def test_listing_forbidden_falls_back(sleep):
+    queue = EvaluationQueue({'a1': ['SCORED'], 'a2': ['SCORED']})
+
+    def rest_get(uri):
+        if 'status/all' in uri:
+            raise SynapseHTTPError('403 Client Error')
+        return queue.restGET(uri)
+    syn = mock.create_autospec(synapseclient.Synapse)
+    syn.restGET.side_effect = rest_get
+    statuses = status.wait_for_submissions(syn, ['a1', 'a2'])
+    assert {subid: s['status'] for subid, s in statuses.items()} == {'a1': 'SCORED', 'a2': 'SCORED'}
+
+
+def test_wait_timeout(sleep):
+    queue = EvaluationQueue({'a1': ['RECEIVED']})
+    seen = []
+    with mock.patch.object(status.time, 'monotonic', side_effect=[0, 1, 2, 11]):
+        statuses = status.wait_for_submissions(_syn(queue), ['a1'],
+                                               callback=seen.append,
+                                               timeout=10)
+    assert [s['status'] for s in seen] == ['RECEIVED']
+    assert not status.is_terminal(statuses['a1'])
+    assert sleep.call_count == 2
+
+
+def test_format_status():
+    assert status.format_status({'id': '9999', 'status': 'SCORED'}) == 'Submission 9999: SCORED'
+
+
+def test_cli_wait_for_batch(tmpdir, monkeypatch):
+    from submitRAADC2 import batch, submit
+    report = [{'path': 'a.csv', 'entity_id': 'syn1', 'version': 1, 'submission_id': '9999', 'error': None},
+              {'path': 'b.csv', 'entity_id': None, 'version': None, 'submission_id': None, 'error': 'bad header'}]
+    monkeypatch.setattr(sys, 'argv', ['submitRAADC2', 'a.csv', 'b.csv', '--wait'])
+    syn = mock.create_autospec(synapseclient.Synapse)
+    with mock.patch.object(submit, 'synapse_login', return_value=syn), \
+         mock.patch.object(batch, 'submit_raadc2_batch', return_value=report) as submit_batch, \
+         mock.patch.object(status, 'wait_for_submissions') as wait:
+        with pytest.raises(SystemExit):
+            submit.main()
+    assert submit_batch.call_args[1]['syn'] is syn
+    wait.assert_called_once_with(syn, ['9999'], callback=status.print_status)
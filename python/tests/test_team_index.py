@@ -0,0 +1,97 @@
+import json
+
+import pytest
+from submitRAADC2.cache import TeamIndex
+from submitRAADC2.submit import _lookup_team_info
+import mock
+import synapseclient
+import pandas as pd
+
+syn = mock.create_autospec(synapseclient.Synapse)
+
+team_table = pd.DataFrame({
+    'teamName': ['First', 'Second'],
+    'folderId': ['syn12345', 'syn54321'],
+    'advancedCompute': [True, False]
+})
+
+
+class team_table_query():
+    def asDataFrame():
+        return team_table
+
+
+def _table_header(etag):
+    return {'id': 'syn17096669', 'etag': etag, 'versionNumber': 1}
+
+
+@pytest.fixture
+def index_path(tmpdir):
+    return str(tmpdir.join('team_index.json'))
+
+
+def test_lookup_queries_table_once(index_path):
+    team_index = TeamIndex(path=index_path, ttl=0)
+    with mock.patch.object(syn, "restGET", return_value=_table_header('a')) as syn_rest_get, \
+         mock.patch.object(syn, "tableQuery", return_value=team_table_query) as syn_table_query:
+        assert team_index.lookup(syn, 'First') == ('syn12345', True)
+        assert team_index.lookup(syn, 'Second') == ('syn54321', False)
+        assert syn_table_query.call_count == 1
+        assert syn_rest_get.call_count == 2
+
+
+def test_lookup_within_ttl_skips_etag_check(index_path):
+    team_index = TeamIndex(path=index_path, ttl=3600)
+    with mock.patch.object(syn, "restGET", return_value=_table_header('a')) as syn_rest_get, \
+         mock.patch.object(syn, "tableQuery", return_value=team_table_query):
+        team_index.lookup(syn, 'First')
+        team_index.lookup(syn, 'Second')
+        assert syn_rest_get.call_count == 1
+
+
+def test_etag_change_refreshes(index_path):
+    team_index = TeamIndex(path=index_path, ttl=0)
+    with mock.patch.object(syn, "restGET", side_effect=[_table_header('a'), _table_header('b')]), \
+         mock.patch.object(syn, "tableQuery", return_value=team_table_query) as syn_table_query:
+        team_index.lookup(syn, 'First')
+        team_index.lookup(syn, 'First')
+        assert syn_table_query.call_count == 2
+
+
+def test_index_persists_to_disk(index_path):
+    with mock.patch.object(syn, "restGET", return_value=_table_header('a')), \
+         mock.patch.object(syn, "tableQuery", return_value=team_table_query) as syn_table_query:
+        TeamIndex(path=index_path).lookup(syn, 'First')
+        assert TeamIndex(path=index_path).lookup(syn, 'Second') == ('syn54321', False)
+        assert syn_table_query.call_count == 1
+    with open(index_path) as f:
+        assert json.load(f)['teams']['First'] == ['syn12345', True]
+
+
+def test_max_age_evicts(index_path):
+    with mock.patch.object(syn, "restGET", return_value=_table_header('a')), \
+         mock.patch.object(syn, "tableQuery", return_value=team_table_query) as syn_table_query:
+        TeamIndex(path=index_path).lookup(syn, 'First')
+        TeamIndex(path=index_path, max_age=-1).lookup(syn, 'First')
+        assert syn_table_query.call_count == 2
+
+
+def test_unknown_team(index_path):
+    team_index = TeamIndex(path=index_path)
+    with mock.patch.object(syn, "restGET", return_value=_table_header('a')), \
+         mock.patch.object(syn, "tableQuery", return_value=team_table_query):
+        assert team_index.lookup(syn, 'Third') is None
+
+
+def test__lookup_team_info_uses_index(index_path):
+    team_index = TeamIndex(path=index_path)
+    with mock.patch.object(syn, "restGET", return_value=_table_header('a')), \
+         mock.patch.object(syn, "tableQuery", return_value=team_table_query):
+        assert _lookup_team_info(syn, 'RAAD2 Second', team_index=team_index) == ('syn54321', False)
+
+
+def test_team_names(index_path):
+    team_index = TeamIndex(path=index_path)
+    with mock.patch.object(syn, "restGET", return_value=_table_header('a')), \
+         mock.patch.object(syn, "tableQuery", return_value=team_table_query):
+        assert team_index.team_names(syn) == ['First', 'Second']
@@ -0,0 +1,120 @@
+import json
+import sys
+import threading
+
+import pytest
+
+from submitRAADC2 import batch, connections, submit, tracing
+import mock
+import synapseclient
+
+
+def test_span_without_profiler():
+    with tracing.span('validate') as span:
+        tracing.add_bytes(10)
+    assert span is None
+
+
+def test_profiler_records_spans():
+    profiler = tracing.Profiler()
+    with tracing.profile(profiler):
+        with tracing.span('upload', compression='gzip') as span:
+            tracing.add_bytes(100)
+            tracing.add_bytes(23)
+    assert tracing.current_profiler() is None
+    assert profiler.spans == [span]
+    assert span.bytes == 123
+    assert span.seconds >= 0
+    assert span.metadata == {'compression': 'gzip'}
+
+
+def test_rest_calls_counted():
+    profiler = tracing.Profiler()
+    with tracing.profile(profiler):
+        with tracing.span('get_team_info') as span:
+            for name in ('requests', 'requests'):
+                connections._count(name)
+    assert span.rest_calls == 2
+
+
+def test_hooks():
+    started, ended = [], []
+    profiler = tracing.Profiler(on_start=[started.append], on_end=[ended.append])
+    with profiler.span('submit'):
+        assert [span.name for span in started] == ['submit']
+        assert ended == []
+    assert [span.name for span in ended] == ['submit']
+
+
+def test_span_error_recorded():
+    profiler = tracing.Profiler()
+    with pytest.raises(ValueError):
+        with profiler.span('validate'):
+            raise ValueError('bad header')
+    assert profiler.spans[0].error == "ValueError('bad header')"
+
+
+def test_trace_events():
+    profiler = tracing.Profiler()
+    with profiler.span('validate'):
+        pass
+    with profiler.span('write_submission') as span:
+        span.add_bytes(5)
+    events = profiler.trace_events()['traceEvents']
+    assert [event['name'] for event in events] == ['validate', 'write_submission']
+    assert all(event['ph'] == 'X' for event in events)
+    assert events[1]['args']['bytes'] == 5
+    assert 'write_submission' in profiler.summary()
+
+
+def test_profile_cli(tmpdir, monkeypatch, capsys, write_predictions):
+    prediction_path = write_predictions(tmpdir.join('prediction.csv'))
+    trace_path = str(tmpdir.join('trace.json'))
+    monkeypatch.setattr(sys, 'argv', ['submitRAADC2', prediction_path, '-v',
+                                      '--profile', trace_path])
+    submit.main()
+    output = capsys.readouterr().out
+    assert 'All checks passed.' in output
+    assert 'validate' in output.split('All checks passed.')[1]
+    with open(trace_path) as f:
+        events = json.load(f)['traceEvents']
+    assert [event['name'] for event in events] == ['validate']
+
+
+def test_rest_calls_counted_per_thread():
+    profiler = tracing.Profiler()
+    started, other_done = threading.Event(), threading.Event()
+
+    def other_thread():
+        started.wait(5)
+        for _ in range(5):
+            connections._count('requests')
+        other_done.set()
+    thread = threading.Thread(target=other_thread)
+    thread.start()
+    with tracing.profile(profiler):
+        with tracing.span('get_team_info') as span:
+            connections._count('requests')
+            started.set()
+            other_done.wait(5)
+    thread.join()
+    assert span.rest_calls == 1
+
+
+def test_batch_worker_spans_profiled(tmpdir, team_info, write_predictions):
+    syn = mock.create_autospec(synapseclient.Synapse)
+    ids = submit.patient_ids()
+    paths = [write_predictions(tmpdir.join('first.csv')),
+             write_predictions(tmpdir.join('second.csv'), ids=ids[::-1])]
+    profiler = tracing.Profiler()
+    with mock.patch.object(submit, 'get_team_info', return_value=team_info), \
+         mock.patch.object(submit, 'check_eligibility', return_value=True), \
+         mock.patch.object(submit, '_lookup_owner_id', return_value='4444'), \
+         mock.patch.object(submit, 'upload_predictions', return_value={'id': 'syn1', 'versionNumber': 1}), \
+         mock.patch.object(syn, 'submit', return_value={'id': '9999'}):
+        with tracing.profile(profiler):
+            batch.submit_raadc2_batch(paths, syn=syn, confirm=False, dedupe='off')
+    names = [span.name for span in profiler.spans]
+    for name in ('read_csv', 'validate', 'get_team_info', 'write_submission', 'upload', 'submit'):
+        assert name in names
+    assert names.count('upload') == 2
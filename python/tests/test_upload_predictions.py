@@ -0,0 +1,180 @@
+import base64
+import gzip
+import hashlib
+import json
+import subprocess
+import sys
+
+import pytest
+
+from submitRAADC2 import loadtest, submit
+
+resource = pytest.importorskip('resource')
+
+MB = 2**20
+
+
+@pytest.fixture
+def gateway(monkeypatch):
+    monkeypatch.setattr(submit, '_uncompressed_gateways', set())
+    with loadtest.StandInServer(record_uploads=True) as server:
+        yield server
+
+
+def _gateway_url(server):
+    return server.url + '/v1/predictions'
+
+
+def _write_file(path, size):
+    md5 = hashlib.md5()
+    block = b'RAADCV00001,Tecentriq\n' * (MB // 22)
+    with open(path, 'wb') as f:
+        written = 0
+        while written < size:
+            data = block[:size - written]
+            f.write(data)
+            md5.update(data)
+            written += len(data)
+    return md5.hexdigest()
+
+
+def test_prediction_payload_matches_json_body(tmpdir):
+    path = str(tmpdir.join('prediction.csv'))
+    _write_file(path, 1000)
+    payload = submit._PredictionPayload(path, 'syn1234', chunk_size=3 * 7)
+    body = b''.join(payload)
+    with open(path, 'rb') as f:
+        expected = json.dumps({
+            'submission_folder': 'syn1234',
+            'data': base64.b64encode(f.read()).decode('utf-8')
+        }).encode('utf-8')
+    assert body == expected
+    assert len(payload) == len(expected)
+
+
+def test_prediction_payload_chunk_size():
+    with pytest.raises(ValueError, match='multiple of 3'):
+        submit._PredictionPayload(__file__, 'syn1234', chunk_size=1024)
+
+
+@pytest.mark.parametrize('stream', [True, False])
+def test_upload_predictions_round_trip(tmpdir, gateway, stream):
+    path = str(tmpdir.join('prediction.csv'))
+    md5 = _write_file(path, MB + 1)
+    entity = submit.upload_predictions(path, 'syn1234', stream=stream,
+                                       url=_gateway_url(gateway))
+    assert entity == {'id': 'syn20000000', 'versionNumber': 1,
+                      'etag': 'syn20000000.1'}
+    assert gateway.uploads == [
+        {'submission_folder': 'syn1234', 'md5': md5, 'chunked': False,
+         'content_encoding': None}
+    ]
+
+
+def _upload_peak_rss(path, url):
+    '''Uploads in a fresh interpreter and returns its peak RSS in bytes'''
+    code = (
+        "import resource, sys\n"
+        "from submitRAADC2 import submit\n"
+        "submit.upload_predictions({path!r}, 'syn1234', url={url!r})\n"
+        "rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss\n"
+        # ru_maxrss is in KB on Linux and in bytes on macOS
+        "print(rss if sys.platform == 'darwin' else rss * 1024)\n"
+    ).format(url=url, path=path)
+    output = subprocess.check_output([sys.executable, '-c', code])
+    return int(output.decode('utf-8').split()[-1])
+
+
+def test_upload_predictions_memory_is_flat(tmpdir, gateway):
+    small_path = str(tmpdir.join('small.csv'))
+    large_path = str(tmpdir.join('large.csv'))
+    _write_file(small_path, MB)
+    _write_file(large_path, 64 * MB)
+    url = _gateway_url(gateway)
+    small_rss = _upload_peak_rss(small_path, url)
+    large_rss = _upload_peak_rss(large_path, url)
+    assert len(gateway.uploads) == 2
+    # Buffering the upload would cost ~4x the file size (~250MB here)
+    assert large_rss - small_rss < 16 * MB
+
+
+@pytest.mark.parametrize('compression, level', [
+    ('gzip', None), ('gzip', 1), ('gzip', 9), ('zstd', None)
+])
+def test_compressed_upload_round_trip(tmpdir, gateway, compression, level):
+    path = str(tmpdir.join('prediction.csv'))
+    md5 = _write_file(path, MB + 1)
+    entity = submit.upload_predictions(path, 'syn1234', compression=compression,
+                                       compression_level=level,
+                                       url=_gateway_url(gateway))
+    assert entity == {'id': 'syn20000000', 'versionNumber': 1,
+                      'etag': 'syn20000000.1'}
+    upload = gateway.uploads[0]
+    assert upload['md5'] == md5
+    # zstd falls back to gzip when zstandard isn't installed
+    assert upload['content_encoding'] in (compression, 'gzip')
+
+
+def test_compressed_payload_is_smaller(tmpdir):
+    path = str(tmpdir.join('prediction.csv'))
+    _write_file(path, MB)
+    payload = submit._PredictionPayload(path, 'syn1234')
+    content_encoding, body = submit._compress_payload(payload, 'gzip', None)
+    with body:
+        compressed = body.read()
+    assert content_encoding == 'gzip'
+    assert len(compressed) < len(payload) / 10
+    assert gzip.decompress(compressed) == b''.join(payload)
+
+
+def test_compression_falls_back(tmpdir, gateway):
+    path = str(tmpdir.join('prediction.csv'))
+    md5 = _write_file(path, 1000)
+    url = _gateway_url(gateway)
+    gateway.accept_encodings = {None}
+    for entity_id in ['syn20000000', 'syn20000001']:
+        entity = submit.upload_predictions(path, 'syn1234', compression='gzip', url=url)
+        assert entity == {'id': entity_id, 'versionNumber': 1,
+                          'etag': entity_id + '.1'}
+    assert [upload['content_encoding'] for upload in gateway.uploads] == [None, None]
+    assert all(upload['md5'] == md5 for upload in gateway.uploads)
+    assert url in submit._uncompressed_gateways
+
+
+def test_unknown_compression(tmpdir):
+    with pytest.raises(ValueError, match="Unknown compression 'brotli'"):
+        submit._compressor('brotli', None)
+
+
+def test_compression_failure_not_retried(tmpdir, gateway):
+    path = str(tmpdir.join('prediction.csv'))
+    _write_file(path, 1000)
+    url = _gateway_url(gateway)
+    gateway.accept_encodings = {None}
+    gateway.reject_encoding = (504, {'reason': 'Gateway Timeout'})
+    # The gateway may have stored the file, so it isn't sent again
+    with pytest.raises(Exception, match='status 504'):
+        submit.upload_predictions(path, 'syn1234', compression='gzip', url=url)
+    assert gateway.uploads == []
+    assert url not in submit._uncompressed_gateways
+
+
+def test_unrelated_400_keeps_compression(tmpdir, gateway):
+    path = str(tmpdir.join('prediction.csv'))
+    _write_file(path, 1000)
+    url = _gateway_url(gateway)
+    gateway.accept_encodings = set()
+    gateway.reject_encoding = (400, {'reason': 'Invalid CSV'})
+    with pytest.raises(Exception, match='status 400'):
+        submit.upload_predictions(path, 'syn1234', compression='gzip', url=url)
+    assert url not in submit._uncompressed_gateways
+
+
+def test_400_naming_encoding_disables_compression(tmpdir, gateway):
+    path = str(tmpdir.join('prediction.csv'))
+    _write_file(path, 1000)
+    url = _gateway_url(gateway)
+    gateway.accept_encodings = {None}
+    gateway.reject_encoding = (400, {'reason': 'Unsupported Content-Encoding: gzip'})
+    submit.upload_predictions(path, 'syn1234', compression='gzip', url=url)
+    assert url in submit._uncompressed_gateways
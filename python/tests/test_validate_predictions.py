@@ -0,0 +1,227 @@
+import pytest
+
+from submitRAADC2.validation import validate_predictions, validate_prediction_file, patient_ids
+from submitRAADC2.validation import IncrementalValidator
+import numpy as np
+import pandas as pd
+
+ids = patient_ids()
+
+
+def _predictions(ids=ids, n_tecentriq=500):
+    subgroups = ['Tecentriq'] * n_tecentriq + ['Chemo'] * (len(ids) - n_tecentriq)
+    return pd.DataFrame({'PatientID': ids, 'RespondingSubgroup': subgroups})
+
+
+def test_valid_validate_predictions():
+    assert validate_predictions(_predictions())
+
+
+def test_headers_validate_predictions():
+    predictiondf = _predictions().rename(columns={'PatientID': 'patient'})
+    with pytest.raises(ValueError, match='Prediction headers not of the format'):
+        validate_predictions(predictiondf)
+
+
+def test_id_format_validate_predictions():
+    predictiondf = _predictions(ids=['RAADC00001'] + ids[1:])
+    with pytest.raises(ValueError, match='Unexpected value in PatientID column'):
+        validate_predictions(predictiondf)
+
+
+def test_blank_id_validate_predictions(tmpdir):
+    predictiondf = _predictions(ids=ids + [np.nan], n_tecentriq=501)
+    with pytest.raises(ValueError, match='Unexpected value in PatientID column'):
+        validate_predictions(predictiondf)
+    path = str(tmpdir.join('prediction.csv'))
+    predictiondf.to_csv(path, index=False)
+    with pytest.raises(ValueError, match='Unexpected value in PatientID column'):
+        validate_predictions(pd.read_csv(path))
+
+
+def test_extra_ids_validate_predictions():
+    predictiondf = _predictions(ids=['RAADCV99999', 'RAADCV99998'] + ids[2:])
+    with pytest.raises(ValueError) as err:
+        validate_predictions(predictiondf)
+    assert str(err.value) == (
+        "Unexpected ID(s) in PatientID column:\n\n"
+        "  RAADCV99999,RAADCV99998\n\n"
+        "IDs for predictions should only match PatientID values \n"
+        "from the provided test data"
+    )
+
+
+def test_missing_ids_validate_predictions():
+    predictiondf = _predictions(ids=ids[:-1])
+    with pytest.raises(ValueError) as err:
+        validate_predictions(predictiondf)
+    assert str(err.value) == (
+        "Missing the following patient ID(s):\n\n"
+        "{}\n\n"
+        "IDs for predictions should match all PatientID values \n"
+        "from the provided test data".format(ids[-1])
+    )
+
+
+def test_values_validate_predictions():
+    predictiondf = _predictions()
+    predictiondf.loc[0, 'RespondingSubgroup'] = 'Placebo'
+    with pytest.raises(ValueError, match='Prediction values should be converted'):
+        validate_predictions(predictiondf)
+
+
+def test_proportion_validate_predictions():
+    with pytest.raises(ValueError, match='Proportion in subgroup is not between'):
+        validate_predictions(_predictions(n_tecentriq=100))
+    assert validate_predictions(_predictions(n_tecentriq=200))
+
+
+def _prediction_file(tmpdir, predictiondf):
+    path = str(tmpdir.join('prediction.csv'))
+    predictiondf.to_csv(path, index=False)
+    return path
+
+
+def test_valid_validate_prediction_file(tmpdir):
+    path = _prediction_file(tmpdir, _predictions())
+    assert validate_prediction_file(path, chunksize=64)
+
+
+def test_headers_validate_prediction_file(tmpdir):
+    path = _prediction_file(tmpdir, _predictions().rename(columns={'PatientID': 'patient'}))
+    with pytest.raises(ValueError, match='Prediction headers not of the format'):
+        validate_prediction_file(path)
+
+
+def test_bad_id_rows_validate_prediction_file(tmpdir):
+    bad_ids = list(ids)
+    bad_ids[100] = 'RAADC00001'
+    bad_ids[900] = ''
+    path = _prediction_file(tmpdir, _predictions(ids=bad_ids))
+    # Fails on the first bad chunk, rows 65-128
+    with pytest.raises(ValueError) as err:
+        validate_prediction_file(path, chunksize=64)
+    assert str(err.value).startswith('Unexpected value in PatientID column')
+    assert str(err.value).endswith('Row(s): 101')
+
+
+def test_extra_ids_validate_prediction_file(tmpdir):
+    path = _prediction_file(tmpdir, _predictions(ids=['RAADCV99999'] + ids[1:]))
+    with pytest.raises(ValueError) as err:
+        validate_prediction_file(path, chunksize=64)
+    assert str(err.value).startswith('Unexpected ID(s) in PatientID column:\n\n  RAADCV99999\n')
+    assert str(err.value).endswith('Row(s): 1')
+
+
+def test_values_validate_prediction_file(tmpdir):
+    predictiondf = _predictions()
+    predictiondf.loc[[10, 20], 'RespondingSubgroup'] = 'Placebo'
+    path = _prediction_file(tmpdir, predictiondf)
+    with pytest.raises(ValueError) as err:
+        validate_prediction_file(path, chunksize=64)
+    assert str(err.value) == ('Prediction values should be converted to Chemo, Tecentriq'
+                              '\n\nRow(s): 11,21')
+
+
+@pytest.mark.parametrize('predictiondf', [
+    _predictions(ids=ids[:-1]),
+    _predictions(n_tecentriq=900),
+    _predictions(n_tecentriq=len(ids)),
+])
+def test_same_message_as_validate_predictions(tmpdir, predictiondf):
+    path = _prediction_file(tmpdir, predictiondf)
+    with pytest.raises(ValueError) as expected:
+        validate_predictions(predictiondf)
+    with pytest.raises(ValueError) as err:
+        validate_prediction_file(path, chunksize=64)
+    assert str(err.value) == str(expected.value)
+
+
+def _message(validate, predictiondf):
+    try:
+        validate(predictiondf)
+    except ValueError as e:
+        return str(e)
+    return None
+
+
+def test_incremental_rechecks_changed_rows():
+    validator = IncrementalValidator()
+    predictiondf = _predictions()
+    assert validator.validate(predictiondf)
+    assert validator.rows_checked == len(ids)
+    predictiondf.loc[[3, 7], 'RespondingSubgroup'] = 'Chemo'
+    assert validator.validate(predictiondf)
+    assert validator.rows_checked == 2
+    assert validator.validate(predictiondf)
+    assert validator.rows_checked == 0
+
+
+def test_incremental_error_and_fix():
+    validator = IncrementalValidator()
+    predictiondf = _predictions()
+    validator.validate(predictiondf)
+    predictiondf.loc[5, 'PatientID'] = 'RAADCV99999'
+    with pytest.raises(ValueError) as err:
+        validator.validate(predictiondf)
+    assert str(err.value) == _message(validate_predictions, predictiondf)
+    assert validator.rows_checked == 1
+    predictiondf.loc[5, 'PatientID'] = ids[5]
+    assert validator.validate(predictiondf)
+
+
+def test_incremental_matches_validate_predictions():
+    # Random edits, appends and truncations, checked against a full
+    # validation after each one
+    rng = np.random.RandomState(0)
+    validator = IncrementalValidator()
+    predictiondf = _predictions()
+    ids_pool = ids[:5] + ['RAADCV99999', 'RAADC00001', 'RAADCV00002']
+    values_pool = ['Tecentriq', 'Chemo', 'Placebo', None]
+    for step in range(60):
+        action = rng.randint(4)
+        if action == 0:
+            rows = rng.choice(len(predictiondf), 3, replace=False)
+            predictiondf.iloc[rows, 0] = rng.choice(ids_pool, 3)
+        elif action == 1:
+            rows = rng.choice(len(predictiondf), 3, replace=False)
+            predictiondf.iloc[rows, 1] = [values_pool[i] for i in rng.randint(4, size=3)]
+        elif action == 2:
+            predictiondf = pd.concat([predictiondf, predictiondf.sample(5, random_state=rng)],
+                                     ignore_index=True)
+        else:
+            predictiondf = predictiondf.iloc[:-5].reset_index(drop=True)
+        if step % 10 == 9:
+            # Changes most rows, so the update is vectorized
+            predictiondf = _predictions(ids=ids[::-1] if step % 20 == 9 else ids)
+        assert (_message(validator.validate, predictiondf) ==
+                _message(validate_predictions, predictiondf))
+
+
+def test_submit_raadc2_validates_incrementally(capsys):
+    from submitRAADC2 import submit
+    predictiondf = _predictions()
+    submit.submit_raadc2(predictiondf, validate_only=True, incremental=True)
+    predictiondf.loc[0, 'RespondingSubgroup'] = 'Chemo'
+    submit.submit_raadc2(predictiondf, validate_only=True, incremental=True)
+    assert submit.incremental_validator().rows_checked == 1
+    assert capsys.readouterr().out.count('All checks passed.') == 2
+
+
+def test_submit_raadc2_incremental_opt_in(monkeypatch):
+    from submitRAADC2 import submit, validation
+    monkeypatch.setattr(validation, '_incremental_validator', None)
+    submit.submit_raadc2(_predictions(), validate_only=True)
+    # No copies of the frame are kept by default
+    assert validation._incremental_validator is None
+
+
+def test_incremental_reset_releases_copies():
+    validator = IncrementalValidator()
+    predictiondf = _predictions()
+    validator.validate(predictiondf)
+    validator.reset()
+    assert validator._columns is None
+    predictiondf.loc[0, 'RespondingSubgroup'] = 'Chemo'
+    validator.validate(predictiondf)
+    assert validator.rows_checked == len(predictiondf)
@@ -0,0 +1,62 @@
+import gzip
+import sys
+
+import pytest
+
+from submitRAADC2 import batch, submit
+from submitRAADC2.submit import write_submission, check_submission_format
+import pandas as pd
+
+
+def test_default_csv(predictiondf):
+    path = write_submission(predictiondf)
+    assert path.endswith('prediction.csv')
+    with open(path) as f:
+        assert f.readline().strip() == 'PatientID,RespondingSubgroup'
+        assert f.readline().strip() == '{},Tecentriq'.format(predictiondf['PatientID'][0])
+    pd.testing.assert_frame_equal(pd.read_csv(path), predictiondf)
+
+
+def test_gzip_csv(tmpdir, predictiondf):
+    path = write_submission(predictiondf, str(tmpdir.join('prediction.csv.gz')),
+                            file_format='csv.gz')
+    with gzip.open(path, 'rt') as f:
+        assert f.readline().strip() == 'PatientID,RespondingSubgroup'
+    pd.testing.assert_frame_equal(pd.read_csv(path), predictiondf)
+
+
+@pytest.mark.parametrize('file_format', ['parquet', 'feather'])
+def test_columnar(tmpdir, file_format, predictiondf):
+    pytest.importorskip('pyarrow')
+    path = write_submission(predictiondf, file_format=file_format,
+                            submission_filepath=str(tmpdir.join('prediction')))
+    read = pd.read_parquet if file_format == 'parquet' else pd.read_feather
+    pd.testing.assert_frame_equal(read(path).astype(str), predictiondf)
+
+
+def test_unknown_format(predictiondf):
+    with pytest.raises(ValueError, match="Unknown submission format 'xlsx'"):
+        write_submission(predictiondf, file_format='xlsx')
+
+
+def test_check_submission_format():
+    check_submission_format('csv')
+    check_submission_format('parquet', dry_run=True)
+    with pytest.raises(ValueError, match="'parquet' submission files can't be scored"):
+        check_submission_format('parquet')
+
+
+def test_batch_rejects_unscored_format(tmpdir):
+    with pytest.raises(ValueError, match="'feather' submission files"):
+        batch.submit_raadc2_batch([str(tmpdir.join('*.csv'))],
+                                  file_format='feather')
+
+
+def test_cli_rejects_unscored_format(tmpdir, monkeypatch, capsys):
+    prediction_path = str(tmpdir.join('prediction.csv'))
+    monkeypatch.setattr(sys, 'argv', ['submitRAADC2', prediction_path,
+                                      '--format', 'csv.gz'])
+    with pytest.raises(SystemExit) as exit_info:
+        submit.main()
+    assert exit_info.value.code == 1
+    assert "'csv.gz' submission files can't be scored" in capsys.readouterr().out